@@ -1,10 +1,10 @@
 import streamlit as st
 import json
-from db import init_db, get_all_tickers, get_unique_sectors, get_latest_metrics, get_all_latest_metrics, save_metrics, get_metadata, set_metadata, get_stale_tickers, prune_old_metrics, get_price_history, save_price_history
+from db import init_db, get_all_tickers, get_unique_sectors, get_latest_metrics, get_all_latest_metrics, get_metrics_version, save_metrics, subscribe_metrics, get_metadata, set_metadata, get_stale_tickers, prune_old_metrics, get_price_history, get_price_histories, save_price_history, RSI_HISTORY_MAX_AGE_HOURS, INDICATOR_HISTORY_MAX_AGE_HOURS
 import logging
 logging.basicConfig(level=logging.INFO)
 logging.info("Successfully imported get_all_latest_metrics")
-from processor import get_float, process_stock, DEFAULT_LOGIC, PRESETS, CONDITIONS, format_large, get_cap_category
+from processor import get_float, process_stock, universe_results, compile_config, process_configs, result_flags, result_positives, flag_counts, DEFAULT_LOGIC, PRESETS, CONDITIONS, format_large, get_cap_category
 import pandas as pd
 import numpy as np  # For np.nan
 import io  # For CSV export
@@ -12,6 +12,12 @@ import re
 import time
 import random
 from fetcher import StockFetcher
+from executor import FetchExecutor, get_shared_limiter
+from indicators import attach_indicators
+from metrics_schema import format_metric, is_missing, metrics_record, present
+from query import parse_query, quote
+from ranking import RankIndex, top_k
+from universe import LiveUniverse
 from datetime import datetime, timedelta
 from datetime import time as dt_time
 import pytz
@@ -136,33 +142,46 @@ sample_metrics = [
         'fetch_id': None
     }
 ]
-def display_ticker_summary(ticker):
+def load_summary_data(ticker):
+    """
+    Returns (metrics, history) for the summary panel, downloading at most one 1y history per ticker.
+    Stale metrics reuse stored closes for RSI when fresh enough; otherwise the history downloaded
+    for RSI is persisted and doubles as the 1Y price chart.
+    """
     metrics = get_latest_metrics(ticker)
+    history = get_price_history(ticker)
+    fetcher = StockFetcher(limiter=get_shared_limiter())
     if not metrics or datetime.now() - datetime.fromisoformat(metrics['fetch_timestamp']) > timedelta(hours=24):
         with st.spinner("Fetching data..."):
-            fetcher = StockFetcher()
-            new_metrics = fetcher.fetch_metrics(ticker)
+            stored = get_price_history(ticker, max_age_hours=RSI_HISTORY_MAX_AGE_HOURS) if history else None
+            new_metrics, new_history = fetcher.fetch_metrics_with_history(ticker, history=stored)
+            if new_history and not stored:
+                save_price_history(ticker, new_history)
+                history = new_history
+                logging.info(f"Fetched and saved history for {ticker}")
             if new_metrics:
                 save_metrics(new_metrics)
                 metrics = get_latest_metrics(ticker)
                 logging.info(f"Fetched and saved metrics for {ticker}")
-            time.sleep(random.randint(5, 10))
+    if metrics and not history:
+        with st.spinner("Fetching price history..."):
+            history = fetcher.fetch_history(ticker)
+            if history:
+                save_price_history(ticker, history)
+                logging.info(f"Fetched and saved history for {ticker}")
+    if metrics:
+        attach_indicators([metrics], {ticker: history})
+    return metrics, history
+
+def display_ticker_summary(ticker):
+    metrics, history = load_summary_data(ticker)
     if metrics:
         if 'weights' not in st.session_state or 'selected_metrics' not in st.session_state or 'logic' not in st.session_state:
             logging.info("Using fallback config for summary processing")
-        processed = process_stock(metrics, st.session_state.get('weights', default_weights), st.session_state.get('selected_metrics', default_metrics), st.session_state.get('logic', DEFAULT_LOGIC))
-        history = get_price_history(ticker)
-        if not history:
-            with st.spinner("Fetching price history..."):
-                fetcher = StockFetcher()
-                history = fetcher.fetch_history(ticker)
-                if history:
-                    save_price_history(ticker, history)
-                    logging.info(f"Fetched and saved history for {ticker}")
-                time.sleep(random.randint(5, 10))
+        processed = process_stock(metrics, st.session_state.get('weights', default_weights), st.session_state.get('selected_metrics', default_metrics), st.session_state.get('logic', DEFAULT_LOGIC), st.session_state.get('custom_flags'))
         with st.expander(f"Summary for {ticker}"):
             # List all metrics in two columns, rounded to 2 decimals where float, skip internals
-            skip_keys = {'fetch_timestamp', 'fetch_id'}
+            skip_keys = {'fetch_timestamp', 'fetch_id', 'fundamentals_timestamp'}
             large_value_keys = ['Market Cap', 'EV', 'Total Cash', 'Total Debt', 'FCF Actual', 'EBITDA Actual', 'Average Volume']
             metric_items = [(k, v) for k, v in metrics.items() if k not in skip_keys]
             col1, col2 = st.columns(2)
@@ -170,18 +189,18 @@ def display_ticker_summary(ticker):
             for i, (key, val) in enumerate(metric_items):
                 col = col1 if i < half else col2
                 with col:
-                    if val == 'N/A':
+                    if isinstance(val, str):
+                        display_val = val
+                    elif is_missing(val):
                         display_val = 'N/A'
                     elif key in large_value_keys:
                         display_val = format_large(round(float(val), 2))
-                    elif isinstance(val, (int, float)):
-                        display_val = f"{round(float(val), 2)}"
                     else:
-                        display_val = val
+                        display_val = format_metric(val)
                     st.write(f"**{key}:** {display_val}")
-            st.write(f"**Flags:** {', '.join(processed['flags'])}")
+            st.write(f"**Flags:** {', '.join(result_flags(processed))}")
             st.subheader("Positives")
-            positives = processed['positives']
+            positives = result_positives(processed)
             if isinstance(positives, str):
                 positives_list = positives.split('; ')
             else:
@@ -194,7 +213,7 @@ def display_ticker_summary(ticker):
             current = get_float(metrics, 'Current Price')
             low = get_float(metrics, '52W Low')
             high = get_float(metrics, '52W High')
-            if current != 'N/A' and low != 'N/A' and high != 'N/A':
+            if present(metrics, 'Current Price', '52W Low', '52W High'):
                 st.metric("Current Price", f"${current:.2f}")
                 range_ = high - low
                 if range_ > 0:
@@ -214,45 +233,11 @@ def display_ticker_summary(ticker):
 
                 # Rankings by Preset
                 st.subheader("Rankings by Preset")
-                now = datetime.now()
-                if 'rankings' not in st.session_state:
-                    st.session_state.rankings = {}
-                if 'rankings' not in st.session_state or ticker not in st.session_state.rankings or (now - st.session_state.rankings[ticker]['timestamp']) > timedelta(hours=12):
-                    start_time = time.time()
-                    all_metrics = load_all_metrics()
-                    rankings = {}
-                    target_cap = processed['cap_category']
-                    target_sector = metrics.get('Sector', 'N/A')
-                    cap_header = target_cap if target_cap != 'N/A' else 'Unknown'
-                    sector_header = target_sector if target_sector != 'N/A' else 'Unknown'
-                    for preset in ['Value', 'Growth', 'Momentum', 'Quality']:
-                        logic = PRESETS[preset]
-                        processed_all = [process_stock(m, weights=default_weights, selected_metrics=default_metrics, logic=logic) for m in all_metrics]
-                        # All
-                        sorted_all = sorted(processed_all, key=lambda x: x['final_score'], reverse=True)
-                        rank_all = next((i+1 for i, p in enumerate(sorted_all) if p['metrics']['Ticker'] == ticker), None)
-                        rankings[f"{preset}_All"] = f"{rank_all}/{len(sorted_all)}" if rank_all else 'N/A'
-                        # Market Cap
-                        filtered_cap = [p for p in processed_all if p['cap_category'] == target_cap]
-                        if filtered_cap:
-                            sorted_cap = sorted(filtered_cap, key=lambda x: x['final_score'], reverse=True)
-                            rank_cap = next((i+1 for i, p in enumerate(sorted_cap) if p['metrics']['Ticker'] == ticker), None)
-                            rankings[f"{preset}_{cap_header}"] = f"{rank_cap}/{len(sorted_cap)}" if rank_cap else 'N/A'
-                        else:
-                            rankings[f"{preset}_Market Cap"] = 'N/A'
-                        # Sector
-                        filtered_sector = [p for p in processed_all if p['metrics'].get('Sector', 'N/A') == target_sector]
-                        if filtered_sector:
-                            sorted_sector = sorted(filtered_sector, key=lambda x: x['final_score'], reverse=True)
-                            rank_sector = next((i+1 for i, p in enumerate(sorted_sector) if p['metrics']['Ticker'] == ticker), None)
-                            rankings[f"{preset}_{sector_header}"] = f"{rank_sector}/{len(filtered_sector)}" if rank_sector else 'N/A'
-                        else:
-                            rankings[f"{preset}_Sector"] = 'N/A'
-                    st.session_state.rankings[ticker] = {'data': rankings, 'timestamp': now}
-                    compute_time = time.time() - start_time
-                    logging.info(f"Computed rankings for {ticker} in {compute_time:.2f}s")
-                else:
-                    rankings = st.session_state.rankings[ticker]['data']
+                target_cap = processed['cap_category']
+                target_sector = metrics.get('Sector', 'N/A')
+                cap_header = target_cap if target_cap != 'N/A' else 'Unknown'
+                sector_header = target_sector if target_sector != 'N/A' else 'Unknown'
+                rankings = compute_preset_rankings(ticker, target_cap, target_sector, cap_header, sector_header)
 
                 # Create 4x3 grid
                 data = {
@@ -267,9 +252,73 @@ db_empty = len(get_all_tickers()) == 0
 if db_empty:
     st.warning("DB failed/empty. Retried. Showing samples. Restart to retry.")
 
-@st.cache_data
 def load_all_metrics():
-    return get_all_latest_metrics()
+    metrics_list = get_all_latest_metrics()
+    # Technicals (SMAs, volatility, drawdown, distance from high) from stored closes in one vectorized pass
+    histories = get_price_histories([m['Ticker'] for m in metrics_list], max_age_hours=INDICATOR_HISTORY_MAX_AGE_HOURS)
+    return attach_indicators(metrics_list, histories)
+
+SAMPLE_SOURCE = 'sample'  # Universe of the built-in sample data (empty DB)
+DB_STATE_TTL = 60  # Seconds between DB checks for writes that bypass this process's save_metrics events
+
+@st.cache_data(ttl=DB_STATE_TTL)
+def db_state():
+    return get_metrics_version()
+
+@st.cache_resource
+def get_live_universe(source):
+    """
+    Process-wide LiveUniverse shared read-only by every session. For the DB it is subscribed to save_metrics,
+    so rows saved by fetch_bg, custom-set fetches or Manage are patched in without a full reload.
+    """
+    if source == SAMPLE_SOURCE:
+        return LiveUniverse(lambda: [metrics_record(m) for m in sample_metrics], name=SAMPLE_SOURCE)
+    live = LiveUniverse(load_all_metrics)
+    subscribe_metrics(live.on_change)
+    return live
+
+def live_universe():
+    return get_live_universe(SAMPLE_SOURCE if db_empty else 'db')
+
+def current_universe():
+    return live_universe().current(None if db_empty else db_state())
+
+RANKING_PRESETS = ['Value', 'Growth', 'Momentum', 'Quality']
+DATASET_SCREENS = {  # Built-in datasets as screen queries (see query.py)
+    "Large Cap": "Market Cap > 10B",
+    "Mid Cap": "Market Cap >= 2B and Market Cap <= 10B",
+    "Small Cap": "Market Cap < 2B",
+    "Value": "flags has Undervalued or P/B < 2",
+    "Growth": "flags has GARP or PEG < 1",
+}
+
+@st.cache_resource(max_entries=2)
+def get_rank_index(version, _store):
+    """
+    RankIndex of all RANKING_PRESETS over a universe version, built once with one process_configs pass and shared across sessions.
+    """
+    store = _store
+    plans = {preset: compile_config(default_weights, default_metrics, PRESETS[preset]) for preset in RANKING_PRESETS}
+    scores = process_configs(store.frame, plans)
+    return RankIndex(
+        list(store.text['Ticker']),
+        {preset: list(scores[preset]) for preset in RANKING_PRESETS},
+        {'cap': store.labels('cap'), 'sector': store.labels('sector')}
+    )
+
+def compute_preset_rankings(ticker, target_cap, target_sector, cap_header, sector_header):
+    """
+    Returns the "Rankings by Preset" grid data: '<preset>_All', '<preset>_<cap_header>' and '<preset>_<sector_header>'
+    -> 'rank/size' (or 'N/A'), looked up in the cached RankIndex.
+    """
+    store = current_universe()
+    index = get_rank_index(store.version, store)
+    rankings = {}
+    for preset in RANKING_PRESETS:
+        for header, group, label in [('All', None, None), (cap_header, 'cap', target_cap), (sector_header, 'sector', target_sector)]:
+            rank = index.rank(ticker, preset, group, label)
+            rankings[f"{preset}_{header}"] = f"{rank[0]}/{rank[1]}" if rank else 'N/A'
+    return rankings
 
 # Auto-fetch logic with polling
 def get_last_close_date(now=datetime.now(pytz.timezone('US/Eastern'))):
@@ -292,8 +341,10 @@ def fetch_bg():
         stale_tickers = get_stale_tickers()
         last_close_date = get_last_close_date(now_et)
         to_fetch = []
+        previous = {}  # Last stored metrics, for quote-tier refreshes
         for t in stale_tickers:
             metrics = get_latest_metrics(t)
+            previous[t] = metrics
             if metrics is None:
                 to_fetch.append((t, 'initial'))
             else:
@@ -307,39 +358,33 @@ def fetch_bg():
             # Schedule next poll in 15 mins
             threading.Timer(15 * 60, fetch_bg).start()
             return
-        fetcher = StockFetcher()
+        # Stored closes feed RSI; downloaded ones refresh PriceHistory for the summary chart
+        executor = FetchExecutor(history_source=get_price_histories, history_sink=save_price_history)
         chunk_size = 30  # Process in chunks of 30
-        batch_size = random.randint(3, 5)
         total_to_fetch = len(to_fetch)
-        logging.info(f"Processing {total_to_fetch} tickers to fetch in chunks of {chunk_size}.")
+        logging.info(f"Processing {total_to_fetch} tickers to fetch in chunks of {chunk_size} with {executor.workers} workers.")
         for i in range(0, total_to_fetch, chunk_size):
             chunk = to_fetch[i:i + chunk_size]
+            fetch_types = dict(chunk)
             processed_tickers = []
-            for j in range(0, len(chunk), batch_size):
-                batch = chunk[j:j + batch_size]
-                for t, fetch_type in batch:
-                    try:
-                        metrics = fetcher.fetch_metrics(t)
-                        if metrics:
-                            save_metrics(metrics)
-                            if fetch_type == 'initial':
-                                logging.info(f"Fetched initial metrics for {t}.")
-                            else:
-                                logging.info(f"Fetched and updated {t}.")
-                            processed_tickers.append(t)
-                    except Exception as e:
-                        logging.error(f"Error fetching {t}: {e}")
-                    time.sleep(random.randint(10, 30))  # Sleep per ticker
-                time.sleep(random.randint(30, 60))  # Sleep per batch
+            # Pacing comes from the shared token bucket in FetchExecutor, not per-ticker sleeps;
+            # fundamentals are re-fetched every FULL_REFRESH_DAYS, in between only quotes
+            for t, metrics in executor.iter_tiered([t for t, _ in chunk], previous):
+                try:
+                    if metrics:
+                        save_metrics(metrics)
+                        if fetch_types[t] == 'initial':
+                            logging.info(f"Fetched initial metrics for {t}.")
+                        else:
+                            logging.info(f"Fetched and updated {t}.")
+                        processed_tickers.append(t)
+                except Exception as e:
+                    logging.error(f"Error fetching {t}: {e}")
             # After chunk, prune old metrics for processed tickers
             if processed_tickers:
                 prune_old_metrics(tickers=processed_tickers)
                 logging.info(f"Pruned old metrics for chunk of {len(processed_tickers)} tickers.")
-            # If more chunks and total >50, sleep before next chunk
-            if i + chunk_size < total_to_fetch and total_to_fetch > 50:
-                sleep_time = random.randint(15 * 60, 30 * 60)
-                logging.info(f"More chunks remaining, sleeping {sleep_time}s before next chunk.")
-                time.sleep(sleep_time)
+        logging.info(f"Background refresh done: {executor.throughput_summary()}")
         set_metadata('last_fetch_time', datetime.now().isoformat())
     # Schedule next poll in 15 mins
     threading.Timer(15 * 60, fetch_bg).start()
@@ -364,32 +409,14 @@ else:
 
 if 'selected_ticker' in st.session_state:
     ticker = st.session_state.selected_ticker
-    metrics = get_latest_metrics(ticker)
-    if not metrics or datetime.now() - datetime.fromisoformat(metrics['fetch_timestamp']) > timedelta(hours=24):
-        with st.spinner("Fetching data..."):
-            fetcher = StockFetcher()
-            new_metrics = fetcher.fetch_metrics(ticker)
-            if new_metrics:
-                save_metrics(new_metrics)
-                metrics = get_latest_metrics(ticker)
-                logging.info(f"Fetched and saved metrics for {ticker}")
-            time.sleep(random.randint(5, 10))
+    metrics, history = load_summary_data(ticker)
     if metrics:
             if 'weights' not in st.session_state or 'selected_metrics' not in st.session_state or 'logic' not in st.session_state:
                 logging.info("Using fallback config for summary processing")
-            processed = process_stock(metrics, st.session_state.get('weights', default_weights), st.session_state.get('selected_metrics', default_metrics), st.session_state.get('logic', DEFAULT_LOGIC))
-            history = get_price_history(ticker)
-            if not history:
-                with st.spinner("Fetching price history..."):
-                    fetcher = StockFetcher()
-                    history = fetcher.fetch_history(ticker)
-                    if history:
-                        save_price_history(ticker, history)
-                        logging.info(f"Fetched and saved history for {ticker}")
-                    time.sleep(random.randint(5, 10))
+            processed = process_stock(metrics, st.session_state.get('weights', default_weights), st.session_state.get('selected_metrics', default_metrics), st.session_state.get('logic', DEFAULT_LOGIC), st.session_state.get('custom_flags'))
             with st.expander(f"Summary for {ticker}"):
                 # List all metrics in two columns, rounded to 2 decimals where float, skip internals
-                skip_keys = {'fetch_timestamp', 'fetch_id'}
+                skip_keys = {'fetch_timestamp', 'fetch_id', 'fundamentals_timestamp'}
                 large_value_keys = ['Market Cap', 'EV', 'Total Cash', 'Total Debt', 'FCF Actual', 'EBITDA Actual', 'Average Volume']
                 metric_items = [(k, v) for k, v in metrics.items() if k not in skip_keys]
                 col1, col2 = st.columns(2)
@@ -397,18 +424,18 @@ if 'selected_ticker' in st.session_state:
                 for i, (key, val) in enumerate(metric_items):
                     col = col1 if i < half else col2
                     with col:
-                        if val == 'N/A':
+                        if isinstance(val, str):
+                            display_val = val
+                        elif is_missing(val):
                             display_val = 'N/A'
                         elif key in large_value_keys:
                             display_val = format_large(round(float(val), 2))
-                        elif isinstance(val, (int, float)):
-                            display_val = f"{round(float(val), 2)}"
                         else:
-                            display_val = val
+                            display_val = format_metric(val)
                         st.write(f"**{key}:** {display_val}")
-                st.write(f"**Flags:** {', '.join(processed['flags'])}")
+                st.write(f"**Flags:** {', '.join(result_flags(processed))}")
                 st.subheader("Positives")
-                positives = processed['positives']
+                positives = result_positives(processed)
                 if isinstance(positives, str):
                     positives_list = positives.split('; ')
                 else:
@@ -421,7 +448,7 @@ if 'selected_ticker' in st.session_state:
                 current = get_float(metrics, 'Current Price')
                 low = get_float(metrics, '52W Low')
                 high = get_float(metrics, '52W High')
-                if current != 'N/A' and low != 'N/A' and high != 'N/A':
+                if present(metrics, 'Current Price', '52W Low', '52W High'):
                     st.metric("Current Price", f"${current:.2f}")
                     range_ = high - low
                     if range_ > 0:
@@ -441,45 +468,11 @@ if 'selected_ticker' in st.session_state:
 
                     # Rankings by Preset
                     st.subheader("Rankings by Preset")
-                    now = datetime.now()
-                    if 'rankings' not in st.session_state:
-                        st.session_state.rankings = {}
-                    if 'rankings' not in st.session_state or ticker not in st.session_state.rankings or (now - st.session_state.rankings[ticker]['timestamp']) > timedelta(hours=12):
-                        start_time = time.time()
-                        all_metrics = load_all_metrics()
-                        rankings = {}
-                        target_cap = processed['cap_category']
-                        target_sector = metrics.get('Sector', 'N/A')
-                        cap_header = target_cap if target_cap != 'N/A' else 'Unknown'
-                        sector_header = target_sector if target_sector != 'N/A' else 'Unknown'
-                        for preset in ['Value', 'Growth', 'Momentum', 'Quality']:
-                            logic = PRESETS[preset]
-                            processed_all = [process_stock(m, weights=default_weights, selected_metrics=default_metrics, logic=logic) for m in all_metrics]
-                            # All
-                            sorted_all = sorted(processed_all, key=lambda x: x['final_score'], reverse=True)
-                            rank_all = next((i+1 for i, p in enumerate(sorted_all) if p['metrics']['Ticker'] == ticker), None)
-                            rankings[f"{preset}_All"] = f"{rank_all}/{len(sorted_all)}" if rank_all else 'N/A'
-                            # Market Cap
-                            filtered_cap = [p for p in processed_all if p['cap_category'] == target_cap]
-                            if filtered_cap:
-                                sorted_cap = sorted(filtered_cap, key=lambda x: x['final_score'], reverse=True)
-                                rank_cap = next((i+1 for i, p in enumerate(sorted_cap) if p['metrics']['Ticker'] == ticker), None)
-                                rankings[f"{preset}_{cap_header}"] = f"{rank_cap}/{len(sorted_cap)}" if rank_cap else 'N/A'
-                            else:
-                                rankings[f"{preset}_Market Cap"] = 'N/A'
-                            # Sector
-                            filtered_sector = [p for p in processed_all if p['metrics'].get('Sector', 'N/A') == target_sector]
-                            if filtered_sector:
-                                sorted_sector = sorted(filtered_sector, key=lambda x: x['final_score'], reverse=True)
-                                rank_sector = next((i+1 for i, p in enumerate(sorted_sector) if p['metrics']['Ticker'] == ticker), None)
-                                rankings[f"{preset}_{sector_header}"] = f"{rank_sector}/{len(sorted_sector)}" if rank_sector else 'N/A'
-                            else:
-                                rankings[f"{preset}_Sector"] = 'N/A'
-                        st.session_state.rankings[ticker] = {'data': rankings, 'timestamp': now}
-                        compute_time = time.time() - start_time
-                        logging.info(f"Computed rankings for {ticker} in {compute_time:.2f}s")
-                    else:
-                        rankings = st.session_state.rankings[ticker]['data']
+                    target_cap = processed['cap_category']
+                    target_sector = metrics.get('Sector', 'N/A')
+                    cap_header = target_cap if target_cap != 'N/A' else 'Unknown'
+                    sector_header = target_sector if target_sector != 'N/A' else 'Unknown'
+                    rankings = compute_preset_rankings(ticker, target_cap, target_sector, cap_header, sector_header)
 
                     # Create 4x3 grid
                     data = {
@@ -554,15 +547,14 @@ with st.sidebar:
     show_all = st.checkbox("Show All (Ignore Top N)", value=st.session_state.get('show_all', False), key='show_all')
     exclude_negative = st.checkbox("Exclude Negative Flags (e.g., Value Trap, Debt Burden)", value=st.session_state.get('exclude_negative', False), key='exclude_negative')
 
-    # Flag filtering
-    require_flags = st.multiselect("Require Flags", list(CONDITIONS.keys()), default=st.session_state.get('require_flags', []), key='require_flags')
-    match_type = st.radio("Match", ["Any", "All"], index=0 if st.session_state.get('match_type', "Any") == "Any" else 1, key='match_type')
+    # Flag filtering (built-in flags plus the selected config's custom flags)
+    flag_options = list(CONDITIONS.keys()) + list(st.session_state.configs.get(config_name, {}).get('flags', {}))
+    if any(f not in flag_options for f in st.session_state.get('require_flags', [])):  # Custom flags of another config
+        st.session_state.require_flags = [f for f in st.session_state.require_flags if f in flag_options]
+    require_flags = st.multiselect("Require Flags", flag_options, default=st.session_state.get('require_flags', []), key='require_flags')
+    match_options = ["Any", "All", "None"]
+    match_type = st.radio("Match", match_options, index=match_options.index(st.session_state.get('match_type', "Any")), key='match_type')
 
-# Get metrics and process on the fly
-if db_empty:
-    metrics_list = sample_metrics
-else:
-    metrics_list = load_all_metrics()
 
 # Set config
 if config_name in PRESETS:
@@ -577,19 +569,35 @@ else:
 weights = config['weights']
 selected_metrics = config['metrics']
 logic = config['logic']
+custom_flags = config.get('flags', {})
 
 # Store config in session_state for summary access
 st.session_state.weights = weights
 st.session_state.selected_metrics = selected_metrics
 st.session_state.logic = logic
+st.session_state.custom_flags = custom_flags
+
+try:
+    plan = compile_config(weights, selected_metrics, logic, custom_flags)
+except ValueError as e:
+    st.error(f"Config '{config_name}' is invalid: {e}. Fix it on the Customize page.")
+    st.stop()
 
-results = []
 with st.spinner('Processing stocks...'):
-    progress = st.progress(0)
-    for i, metrics in enumerate(metrics_list):
-        r = process_stock(metrics, weights, selected_metrics, logic)
-        results.append(r)
-        progress.progress((i+1)/len(metrics_list))
+    # Shared universe store (one copy per process) and this config's scores, kept current by ingest events
+    store, scored = live_universe().scores(plan, None if db_empty else db_state())
+st.session_state.universe_store = store  # For the Customize page's live preview (a reference to the shared store)
+final_scores = scored['final_score'].to_numpy()
+flag_masks = scored['flag_mask'].to_numpy()
+
+# Per-flag counts for the sidebar, cached per session until the universe or config changes
+counts_key = (store.version, plan.key)
+if st.session_state.get('flag_counts', (None, None))[0] != counts_key:
+    st.session_state.flag_counts = (counts_key, flag_counts(flag_masks, plan.flag_bits))
+with st.sidebar.expander("Flag Counts"):
+    for flag, _ in plan.flags:
+        st.write(f"{flag}: {st.session_state.flag_counts[1][flag]}")
+screen = []  # Query clauses for the dataset, search and flag filters below, run as one query (see query.py)
 
 # Apply filters based on dataset
 if dataset in st.session_state.get('custom_sets', {}):
@@ -615,42 +623,65 @@ if dataset in st.session_state.get('custom_sets', {}):
     if skipped:
         st.warning(f"Tickers {', '.join(skipped)} not found in database or fetch failed and will be skipped. Use Manage page to add new tickers.")
     valid_tickers = [t for t in custom_tickers if get_latest_metrics(t)]
-    results = [r for r in results if r['metrics']['Ticker'] in valid_tickers]
-elif dataset == "Large Cap":
-    results = [r for r in results if get_float(r['metrics'], "Market Cap") > 10e9]
-elif dataset == "Mid Cap":
-    results = [r for r in results if 2e9 <= get_float(r['metrics'], "Market Cap") <= 10e9]
-elif dataset == "Small Cap":
-    results = [r for r in results if get_float(r['metrics'], "Market Cap") < 2e9]
-elif dataset == "Value":
-    results = [r for r in results if "Undervalued" in r['flags'] or get_float(r['metrics'], "P/B") < 2]
-elif dataset == "Growth":
-    results = [r for r in results if "GARP" in r['flags'] or get_float(r['metrics'], "PEG") < 1]
+    screen.append(f"ticker in ({', '.join(quote(t) for t in valid_tickers)})")
+elif dataset in DATASET_SCREENS:
+    screen.append(DATASET_SCREENS[dataset])
 elif dataset == "Sector":
-    results = [r for r in results if r['metrics'].get("Sector", "N/A") == selected_sector]
+    screen.append(f"sector = {quote(selected_sector)}")
 
 
 # Additional filters
 search = st.text_input("Search Ticker/Company", value=st.session_state.get('search', ""), key='search')
 if search:
-    results = [r for r in results if search.lower() in r['metrics']['Ticker'].lower() or search.lower() in r['metrics']['Company Name'].lower()]
+    screen.append(f"ticker contains {quote(search)} or name contains {quote(search)}")
 
 # Apply flag filters
 if require_flags:
-    if match_type == "Any":
-        results = [r for r in results if any(flag in r['flags'] for flag in require_flags)]
-    else:
-        results = [r for r in results if all(flag in r['flags'] for flag in require_flags)]
-    logging.info(f"Applied flag filter: {require_flags} with {match_type} logic, {len(results)} results remaining.")
+    screen.append(f"flags has {match_type.lower()} ({', '.join(quote(flag) for flag in require_flags)})")
 
 # Exclude negative flags if checked
-negative_flags = {"Value Trap", "High-Risk Growth", "Debt Burden"}  # Define negatives
+negative_flags = ["Value Trap", "High-Risk Growth", "Debt Burden"]  # Define negatives
+negative_flags += [flag for flag, boost in plan.flags if flag in custom_flags and boost < 0]  # Penalizing custom flags
 if exclude_negative:
-    results = [r for r in results if not any(flag in negative_flags for flag in r['flags'])]
-
-# Rank by final_score desc
-results.sort(key=lambda x: x['final_score'], reverse=True)
-top_results = results if show_all else results[:num_top]
+    screen.append(f"flags has none ({', '.join(quote(flag) for flag in negative_flags)})")
+
+# Free-form screen query, shareable as text or through the page URL (?q=...)
+if 'screen_query' not in st.session_state and 'q' in st.query_params:
+    st.session_state.screen_query = st.query_params['q']
+screen_query = st.text_input("Screen Query", key='screen_query', placeholder='sector = "Technology" and P/E < 20 and flags has GARP',
+                             help='Metrics (P/E < 20, Market Cap >= 2B, Total Cash > Total Debt, RSI is missing), '
+                                  'sector/industry/cap/ticker/name = "..." or in (...), name contains "...", '
+                                  'flags has GARP; combine with and, or, not and parentheses.')
+if screen_query:
+    st.query_params['q'] = screen_query
+elif 'q' in st.query_params:
+    del st.query_params['q']
+
+def run_screen(clauses):
+    """
+    Sorted rows of store matching every clause (all rows without clauses) and the combined query.
+    """
+    if not clauses:
+        return np.arange(len(store)), None
+    query = parse_query(' and '.join(f"({clause})" for clause in clauses))
+    return query.select(store, flag_masks, plan.flag_bits), query
+
+try:
+    if screen_query:
+        parse_query(screen_query)  # Syntax errors point into the text as typed
+    rows, screen_used = run_screen(screen + ([screen_query] if screen_query else []))
+except ValueError as e:
+    st.error(f"Invalid screen query: {e}")
+    rows, screen_used = run_screen(screen)
+if screen_used is not None:
+    logging.info(f"Applied screen: {screen_used}, {len(rows)} results remaining.")
+    with st.expander("Share Screen"):
+        st.code(str(screen_used), language=None)
+
+# Rank by final_score desc (ties keep load order): partial top-N selection, full ordering only for Show All;
+# result dicts only for the rows shown
+top_rows = rows[top_k([final_scores[rows]], None if show_all else num_top)]
+top_results = universe_results([store.record(i) for i in top_rows], scored.iloc[top_rows], plan)
 
 # Disclaimer for search
 if search and not top_results:
@@ -661,27 +692,27 @@ if top_results:
     df_data = []
     for res in top_results:
         m = res['metrics']
-        positives_str = '; '.join(res['positives'])
+        positives_str = '; '.join(result_positives(res))  # Text only for the rows shown/exported
         
         df_data.append({
             "Company (Ticker)": f"{m['Company Name']} ({m['Ticker']})",
             "Score": f"{round(res['final_score'], 2)}",
-            "Price": f"{round(get_float(m, 'Current Price'), 2)}" if m['Current Price'] != 'N/A' else 'N/A',
-            "52W High/Low": f"{round(get_float(m, '52W High'), 2)} / {round(get_float(m, '52W Low'), 2)}" if m['52W High'] != 'N/A' else 'N/A',
-            "MC": format_large(get_float(m, 'Market Cap')) if m['Market Cap'] != 'N/A' else 'N/A',
-            "EV": format_large(get_float(m, 'EV')) if m['EV'] != 'N/A' else 'N/A',
-            "Total Cash": format_large(get_float(m, 'Total Cash')) if m['Total Cash'] != 'N/A' else 'N/A',
-            "Total Debt": format_large(get_float(m, 'Total Debt')) if m['Total Debt'] != 'N/A' else 'N/A',
-            "P/E": f"{round(get_float(m, 'P/E'), 2)}" if m['P/E'] != 'N/A' else 'N/A',
-            "ROE %": f"{round(get_float(m, 'ROE'), 2)}" if m['ROE'] != 'N/A' else 'N/A',
-            "P/B": f"{round(get_float(m, 'P/B'), 2)}" if m['P/B'] != 'N/A' else 'N/A',
-            "PEG": f"{round(get_float(m, 'PEG'), 2)}" if m['PEG'] != 'N/A' else 'N/A',
-            "Gross Margin %": f"{round(get_float(m, 'Gross Margin'), 2)}" if m['Gross Margin'] != 'N/A' else 'N/A',
-            "Net Margin %": f"{round(get_float(m, 'Net Profit Margin'), 2)}" if m['Net Profit Margin'] != 'N/A' else 'N/A',
-            "FCF/EV %": f"{round(get_float(m, 'FCF % EV TTM'), 2)}" if m['FCF % EV TTM'] != 'N/A' else 'N/A',
-            "P/FCF": f"{round(get_float(m, 'P/FCF'), 2)}" if m.get('P/FCF', 'N/A') != 'N/A' else 'N/A',
-            "D/E": f"{round(get_float(m, 'D/E'), 2)}" if m['D/E'] != 'N/A' else 'N/A',
-            "Flags": ", ".join(res['flags']),
+            "Price": format_metric(m['Current Price']),
+            "52W High/Low": f"{format_metric(m['52W High'])} / {format_metric(m['52W Low'])}" if not is_missing(m['52W High']) else 'N/A',
+            "MC": format_large(m['Market Cap']) if not is_missing(m['Market Cap']) else 'N/A',
+            "EV": format_large(m['EV']) if not is_missing(m['EV']) else 'N/A',
+            "Total Cash": format_large(m['Total Cash']) if not is_missing(m['Total Cash']) else 'N/A',
+            "Total Debt": format_large(m['Total Debt']) if not is_missing(m['Total Debt']) else 'N/A',
+            "P/E": format_metric(m['P/E']),
+            "ROE %": format_metric(m['ROE']),
+            "P/B": format_metric(m['P/B']),
+            "PEG": format_metric(m['PEG']),
+            "Gross Margin %": format_metric(m['Gross Margin']),
+            "Net Margin %": format_metric(m['Net Profit Margin']),
+            "FCF/EV %": format_metric(m['FCF % EV TTM']),
+            "P/FCF": format_metric(m.get('P/FCF')),
+            "D/E": format_metric(m['D/E']),
+            "Flags": ", ".join(result_flags(res)),
             "Positives": positives_str,
         })
     df = pd.DataFrame(df_data)
@@ -0,0 +1,200 @@
+import json
+import math
+import operator
+
+import numpy as np
+
+from metrics_schema import NUMERIC_FIELDS, get_float, is_missing, scoring_column
+
+# Declarative flag conditions (see processor.FLAG_RULES), plain JSON so they can be saved with configs:
+# - comparison: [field, op, operand], op one of COMPARISONS; operand a number, another field name, or
+#   {"field": name, "times": number} for a scaled field, e.g. ["Current Price", ">", {"field": "52W High", "times": 0.9}]
+# - presence: [field, "present"] or [field, "missing"]
+# - groups: {"all": [conditions]}, {"any": [conditions]}, {"not": condition}
+# Fields are NUMERIC_FIELDS metrics compared by their scoring values (get_float/scoring_column), so a missing
+# value counts per its MISSING_POLICY: 0.0, or NaN, which fails every comparison (!= included) and every "not"
+# over a comparison of that field: a stock without the data never matches through it.
+COMPARISONS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge, '==': operator.eq, '!=': operator.ne}
+PRESENCE = ('present', 'missing')
+GROUPS = ('all', 'any', 'not')
+
+def _check_field(field):
+    if not isinstance(field, str) or field not in NUMERIC_FIELDS:
+        raise ValueError(f"Unknown metric {field!r} in condition")
+
+def _check_number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"Condition values must be finite numbers, got {value!r}")
+
+def validate_condition(rule):
+    """
+    Checks a declarative condition (format above). Raises ValueError naming the first problem found.
+    """
+    if isinstance(rule, dict):
+        if len(rule) != 1 or next(iter(rule)) not in GROUPS:
+            raise ValueError(f"Condition groups need exactly one of {', '.join(GROUPS)}, got {list(rule)}")
+        (kind, children), = rule.items()
+        if kind == 'not':
+            validate_condition(children)
+            return
+        if not isinstance(children, (list, tuple)) or not children:
+            raise ValueError(f"'{kind}' needs a non-empty list of conditions")
+        for child in children:
+            validate_condition(child)
+        return
+    if not isinstance(rule, (list, tuple)) or len(rule) not in (2, 3):
+        raise ValueError(f"Expected a condition like [\"P/E\", \"<\", 15] or a group like {{\"all\": [...]}}, got {rule!r}")
+    _check_field(rule[0])
+    if len(rule) == 2:
+        if rule[1] not in PRESENCE:
+            raise ValueError(f"Expected 'present' or 'missing' after {rule[0]!r}, got {rule[1]!r}")
+        return
+    field, op, operand = rule
+    if op not in COMPARISONS:
+        raise ValueError(f"Unknown operator {op!r}; use one of {' '.join(COMPARISONS)}")
+    if isinstance(operand, str):
+        _check_field(operand)
+    elif isinstance(operand, dict):
+        if set(operand) != {'field', 'times'}:
+            raise ValueError(f"Scaled operands need 'field' and 'times', got {list(operand)}")
+        _check_field(operand['field'])
+        _check_number(operand['times'])
+    else:
+        _check_number(operand)
+
+def canonical_condition(rule):
+    """
+    Canonical JSON of a condition, equal for equal conditions (e.g. to hash configs holding custom flags).
+    """
+    return json.dumps(rule, sort_keys=True)
+
+def describe_condition(rule):
+    """
+    Readable form of a condition, e.g. 'P/E < 15 and ROE > 15'.
+    """
+    if isinstance(rule, dict):
+        (kind, children), = rule.items()
+        if kind == 'not':
+            return f"not ({describe_condition(children)})"
+        parts = [describe_condition(child) for child in children]
+        parts = [f"({part})" if isinstance(child, dict) and len(children) > 1 else part for part, child in zip(parts, children)]
+        return f" {'and' if kind == 'all' else 'or'} ".join(parts)
+    if len(rule) == 2:
+        return f"{rule[0]} {rule[1]}"
+    field, op, operand = rule
+    if isinstance(operand, dict):
+        operand = f"{operand['times']} x {operand['field']}"
+    return f"{field} {op} {operand}"
+
+def _column(frame, field, cache):
+    values = cache.get(field)
+    if values is None:
+        values = cache[field] = scoring_column(frame, field)
+    return values
+
+def _compared_fields(rule):
+    """
+    Fields a condition compares (not those it only checks for presence), on either side of a comparison.
+    """
+    if isinstance(rule, dict):
+        (kind, children), = rule.items()
+        return _compared_fields(children) if kind == 'not' else {f for child in children for f in _compared_fields(child)}
+    if len(rule) == 2:
+        return set()
+    operand = rule[2]
+    if isinstance(operand, dict):
+        return {rule[0], operand['field']}
+    return {rule[0], operand} if isinstance(operand, str) else {rule[0]}
+
+def _known(values):
+    return ~np.isnan(values)
+
+def _compile(rule):
+    """
+    Returns (test, mask) closures for a validated condition: test(metrics) -> bool for one metrics record,
+    mask(frame, cache) -> bool array over a metrics frame (cache: field -> scoring column, shared between conditions).
+    Groups evaluate their parts in order and stop early: test like Python's and/or, mask once no row can change
+    (no row left for 'all', every row matched for 'any').
+    """
+    if isinstance(rule, dict):
+        (kind, children), = rule.items()
+        if kind == 'not':
+            test, mask = _compile(children)
+            fields = sorted(_compared_fields(children))  # Rows missing any of them stay unmatched
+            def not_mask(frame, cache):
+                result = ~mask(frame, cache)
+                for field in fields:
+                    result &= _known(_column(frame, field, cache))
+                return result
+            return (lambda m: not test(m) and all(get_float(m, field) == get_float(m, field) for field in fields)), not_mask
+        parts = [_compile(child) for child in children]
+        tests = [test for test, _ in parts]
+        masks = [mask for _, mask in parts]
+        if kind == 'all':
+            def all_mask(frame, cache):
+                result = masks[0](frame, cache)
+                for mask in masks[1:]:
+                    if not result.any():
+                        break
+                    result = result & mask(frame, cache)
+                return result
+            return (lambda m: all(test(m) for test in tests)), all_mask
+        def any_mask(frame, cache):
+            result = masks[0](frame, cache)
+            for mask in masks[1:]:
+                if result.all():
+                    break
+                result = result | mask(frame, cache)
+            return result
+        return (lambda m: any(test(m) for test in tests)), any_mask
+
+    field = rule[0]
+    if len(rule) == 2:
+        want = rule[1] == 'present'
+        def presence_mask(frame, cache):
+            if field not in frame:
+                return np.full(len(frame), not want)
+            available = frame[field].notna().to_numpy()
+            return available if want else ~available
+        return (lambda m: is_missing(m.get(field)) != want), presence_mask
+
+    _, op, operand = rule
+    compare = COMPARISONS[op]
+    def scalar(a, b):
+        return a == a and b == b and compare(a, b)  # NaN (excluded missing) fails, != included
+    def column(a, b):
+        return compare(a, b) & _known(a) & _known(b)
+    if isinstance(operand, str):
+        return ((lambda m: scalar(get_float(m, field), get_float(m, operand))),
+                (lambda frame, cache: column(_column(frame, field, cache), _column(frame, operand, cache))))
+    if isinstance(operand, dict):
+        other, times = operand['field'], operand['times']
+        return ((lambda m: scalar(get_float(m, field), times * get_float(m, other))),
+                (lambda frame, cache: column(_column(frame, field, cache), times * _column(frame, other, cache))))
+    return ((lambda m: scalar(get_float(m, field), operand)),
+            (lambda frame, cache: column(_column(frame, field, cache), operand)))
+
+class Condition:
+    """
+    A declarative condition compiled once. Call it with a metrics record to test one stock (as the old per-stock
+    lambdas did), or use mask(frame) to test every row of a metrics frame with column operations.
+    Raises ValueError for invalid conditions (see validate_condition).
+    """
+    def __init__(self, rule):
+        validate_condition(rule)
+        self.key = canonical_condition(rule)
+        self.rule = json.loads(self.key)  # Own copy, e.g. to save with a config
+        self._test, self._mask = _compile(self.rule)
+
+    def __call__(self, metrics):
+        return self._test(metrics)
+
+    def mask(self, frame, cache=None):
+        """
+        Boolean array: the condition per row of frame. cache: optional dict reused across conditions over the
+        same frame, so each metric column is filled once.
+        """
+        return self._mask(frame, {} if cache is None else cache)
+
+    def __repr__(self):
+        return f"Condition({describe_condition(self.rule)})"
@@ -1,6 +1,6 @@
 from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, Text, desc, func, and_, or_, cast, DateTime
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship, joinedload
+from sqlalchemy.orm import sessionmaker, relationship, joinedload, aliased
 from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.sql import text
 from sqlalchemy.exc import OperationalError
@@ -9,10 +9,13 @@ import json
 import os
 import time
 import random
+import threading
 import streamlit as st
 from streamlit.errors import StreamlitSecretNotFoundError
 import logging
 
+from metrics_schema import MISSING_TEXT, is_missing, metrics_record
+
 logging.basicConfig(level=logging.INFO)
 
 DATABASE_URL = os.getenv('DATABASE_URL')
@@ -52,6 +55,9 @@ for attempt in range(retries):
 Base = declarative_base()
 Session = sessionmaker(bind=engine)
 
+RSI_HISTORY_MAX_AGE_HOURS = 12  # Stored closes older than this may miss the last close, so RSI is re-downloaded
+INDICATOR_HISTORY_MAX_AGE_HOURS = 7 * 24  # Technical indicators tolerate a few missed sessions
+
 class Stock(Base):
     __tablename__ = 'Stocks'
     ticker = Column(String, primary_key=True, autoincrement=False)
@@ -94,11 +100,24 @@ class MetricFetch(Base):
     analyst_mean = Column(Float)
     target_price = Column(Float)
     sentiment = Column(String)
+    fundamentals_timestamp = Column(String)  # Full-tier fetch whose fundamentals this row carries (quote rows copy it forward)
 
     stock = relationship("Stock", back_populates="metric_fetches")
 
 Stock.metric_fetches = relationship("MetricFetch", back_populates="stock")
 
+# Metrics record field -> MetricFetch column (numeric fields are Float columns, NULL when missing)
+METRIC_COLUMNS = {
+    'P/E': 'pe', 'ROE': 'roe', 'D/E': 'de', 'P/B': 'pb', 'PEG': 'peg', 'Gross Margin': 'gross_margin',
+    'Net Profit Margin': 'net_profit_margin', 'FCF % EV TTM': 'fcf_ev', 'EBITDA % EV TTM': 'ebitda_ev',
+    'Current Price': 'current_price', '52W High': 'w52_high', '52W Low': 'w52_low', 'Market Cap': 'market_cap',
+    'EV': 'ev', 'Total Cash': 'total_cash', 'Total Debt': 'total_debt', 'FCF Actual': 'fcf_actual',
+    'EBITDA Actual': 'ebitda_actual', 'P/FCF': 'p_fcf', 'Beta': 'beta', 'Dividend Yield': 'dividend_yield',
+    'Average Volume': 'avg_volume', 'RSI': 'rsi', 'Revenue Growth': 'revenue_growth',
+    'Earnings Growth': 'earnings_growth', 'Forward P/E': 'forward_pe', 'Analyst Rating': 'analyst_rating',
+    'Analyst Mean': 'analyst_mean', 'Target Price': 'target_price', 'Sentiment': 'sentiment'
+}
+
 class Metadata(Base):
     __tablename__ = 'metadata'
     key = Column(String, primary_key=True)
@@ -285,6 +304,17 @@ def init_db():
     except Exception as e:
         print(f"Migration error adding sentiment: {e}")
 
+    try:
+        # Migration: Add fundamentals_timestamp column to MetricFetches if not exists
+        if 'MetricFetches' in inspector.get_table_names():
+            columns = [col['name'] for col in inspector.get_columns('MetricFetches')]
+            if 'fundamentals_timestamp' not in columns:
+                with engine.connect() as conn:
+                    conn.execute(text('ALTER TABLE "MetricFetches" ADD COLUMN fundamentals_timestamp VARCHAR'))
+                    conn.commit()
+    except Exception as e:
+        print(f"Migration error adding fundamentals_timestamp: {e}")
+
     # Conditional table creation
     tables = [Stock, MetricFetch, Metadata, ProcessedResult, PriceHistory]
     for table in tables:
@@ -304,11 +334,29 @@ def init_db():
     session.commit()
     session.close()
 
-def get_value_from_db(val):
+def to_db_value(val):
     """
-    Helper to convert DB value to 'N/A' if None.
+    Helper to convert a metrics record value to its DB value: None (NULL) for missing numbers (NaN) and text ('N/A').
     """
-    return val if val is not None else 'N/A'
+    return None if is_missing(val) or val == MISSING_TEXT else val
+
+def metrics_from_fetch(fetch):
+    """
+    Rebuilds the typed metrics record (see metrics_schema.metrics_record) of a MetricFetch row with its Stock loaded:
+    NULL numeric columns become NaN, NULL text columns 'N/A'.
+    """
+    stock = fetch.stock
+    values = {field: getattr(fetch, column) for field, column in METRIC_COLUMNS.items()}
+    values.update({
+        'Ticker': fetch.ticker,
+        'Company Name': stock.company_name if stock else None,
+        'Industry': stock.industry if stock else None,
+        'Sector': stock.sector if stock else None,
+        'fundamentals_timestamp': fetch.fundamentals_timestamp or fetch.fetch_timestamp,
+        'fetch_timestamp': fetch.fetch_timestamp,
+        'fetch_id': fetch.fetch_id
+    })
+    return metrics_record(values)
 
 def get_latest_metrics(ticker):
     """
@@ -322,103 +370,9 @@ def get_latest_metrics(ticker):
     if not latest_fetch:
         return None
     
-    def get_all_latest_metrics():
-        """
-        Retrieves the latest metrics for all tickers in a single batched query.
-        Returns list of metrics dicts (like get_latest_metrics) for recent data (<12 hours), or empty list if none.
-        """
-        session = Session()
-        latest_subq = session.query(
-            MetricFetch.ticker,
-            func.max(MetricFetch.fetch_timestamp).label('max_ts')
-        ).group_by(MetricFetch.ticker).subquery()
-        latest_fetches = session.query(MetricFetch).join(
-            latest_subq,
-            and_(MetricFetch.ticker == latest_subq.c.ticker, MetricFetch.fetch_timestamp == latest_subq.c.max_ts)
-        ).options(joinedload(MetricFetch.stock)).all()
-        session.close()
-    
-        if not latest_fetches:
-            return []
-    
-        metrics_list = []
-        for latest_fetch in latest_fetches:
-            fetch_time = datetime.fromisoformat(latest_fetch.fetch_timestamp)
-            if datetime.now() - fetch_time < timedelta(hours=12):
-                stock = latest_fetch.stock
-                metrics = {
-                    'Ticker': latest_fetch.ticker,
-                    'Company Name': stock.company_name if stock else 'N/A',
-                    'Industry': stock.industry if stock else 'N/A',
-                    'Sector': stock.sector if stock else 'N/A',
-                    'P/E': get_value_from_db(latest_fetch.pe),
-                    'ROE': get_value_from_db(latest_fetch.roe),
-                    'D/E': get_value_from_db(latest_fetch.de),
-                    'P/B': get_value_from_db(latest_fetch.pb),
-                    'PEG': get_value_from_db(latest_fetch.peg),
-                    'Gross Margin': get_value_from_db(latest_fetch.gross_margin),
-                    'Net Profit Margin': get_value_from_db(latest_fetch.net_profit_margin),
-                    'FCF % EV TTM': get_value_from_db(latest_fetch.fcf_ev),
-                    'EBITDA % EV TTM': get_value_from_db(latest_fetch.ebitda_ev),
-                    'Current Price': get_value_from_db(latest_fetch.current_price),
-                    '52W High': get_value_from_db(latest_fetch.w52_high),
-                    '52W Low': get_value_from_db(latest_fetch.w52_low),
-                    'Market Cap': get_value_from_db(latest_fetch.market_cap),
-                    'EV': get_value_from_db(latest_fetch.ev),
-                    'Total Cash': get_value_from_db(latest_fetch.total_cash),
-                    'Total Debt': get_value_from_db(latest_fetch.total_debt),
-                    'FCF Actual': get_value_from_db(latest_fetch.fcf_actual),
-                    'EBITDA Actual': get_value_from_db(latest_fetch.ebitda_actual),
-                    'P/FCF': get_value_from_db(latest_fetch.p_fcf),
-                    'fetch_timestamp': latest_fetch.fetch_timestamp,
-                    'fetch_id': latest_fetch.fetch_id
-                }
-                metrics_list.append(metrics)
-        return metrics_list
-
     fetch_time = datetime.fromisoformat(latest_fetch.fetch_timestamp)
     if datetime.now() - fetch_time < timedelta(hours=72):
-        # Reconstruct metrics dict
-        stock = latest_fetch.stock  # Via relationship (now eager-loaded)
-        metrics = {
-            'Ticker': ticker,
-            'Company Name': stock.company_name if stock else 'N/A',
-            'Industry': stock.industry if stock else 'N/A',
-            'Sector': stock.sector if stock else 'N/A',
-            'P/E': get_value_from_db(latest_fetch.pe),
-            'ROE': get_value_from_db(latest_fetch.roe),
-            'D/E': get_value_from_db(latest_fetch.de),
-            'P/B': get_value_from_db(latest_fetch.pb),
-            'PEG': get_value_from_db(latest_fetch.peg),
-            'Gross Margin': get_value_from_db(latest_fetch.gross_margin),
-            'Net Profit Margin': get_value_from_db(latest_fetch.net_profit_margin),
-            'FCF % EV TTM': get_value_from_db(latest_fetch.fcf_ev),
-            'EBITDA % EV TTM': get_value_from_db(latest_fetch.ebitda_ev),
-            'Current Price': get_value_from_db(latest_fetch.current_price),
-            '52W High': get_value_from_db(latest_fetch.w52_high),
-            '52W Low': get_value_from_db(latest_fetch.w52_low),
-            'Market Cap': get_value_from_db(latest_fetch.market_cap),
-            'EV': get_value_from_db(latest_fetch.ev),
-            'Total Cash': get_value_from_db(latest_fetch.total_cash),
-            'Total Debt': get_value_from_db(latest_fetch.total_debt),
-            'FCF Actual': get_value_from_db(latest_fetch.fcf_actual),
-            'EBITDA Actual': get_value_from_db(latest_fetch.ebitda_actual),
-            'P/FCF': get_value_from_db(latest_fetch.p_fcf),
-            'Beta': get_value_from_db(latest_fetch.beta),
-            'Dividend Yield': get_value_from_db(latest_fetch.dividend_yield),
-            'Average Volume': get_value_from_db(latest_fetch.avg_volume),
-            'RSI': get_value_from_db(latest_fetch.rsi),
-            'Revenue Growth': get_value_from_db(latest_fetch.revenue_growth),
-            'Earnings Growth': get_value_from_db(latest_fetch.earnings_growth),
-            'Forward PE': get_value_from_db(latest_fetch.forward_pe),
-            'Analyst Rating': get_value_from_db(latest_fetch.analyst_rating),
-            'Analyst Mean': get_value_from_db(latest_fetch.analyst_mean),
-            'Target Price': get_value_from_db(latest_fetch.target_price),
-            'Sentiment': get_value_from_db(latest_fetch.sentiment),
-            'fetch_timestamp': latest_fetch.fetch_timestamp,  # Added for potential future use, though not required after seeder simplification
-            'fetch_id': latest_fetch.fetch_id  # Added to allow direct access if needed
-        }
-        return metrics
+        return metrics_from_fetch(latest_fetch)
     return None
 def is_latest(mf, session):
     return mf.fetch_id == session.query(func.max(MetricFetch.fetch_id)).filter(MetricFetch.ticker == mf.ticker).scalar()
@@ -426,7 +380,7 @@ def is_latest(mf, session):
 
 def prune_old_metrics(tickers=None, keep_days=7):
     """
-    Deletes MetricFetches and ProcessedResults older than keep_days.
+    Deletes MetricFetches and ProcessedResults older than keep_days, and every PriceHistory row but the newest per ticker.
     If tickers provided, filters to those; else all.
     Always keeps the latest fetch per ticker even if old.
     Uses subqueries for cascades, logs counts deleted.
@@ -442,17 +396,63 @@ def prune_old_metrics(tickers=None, keep_days=7):
         deleted_count = session.query(MetricFetch).filter(MetricFetch.fetch_id.in_(ids_to_delete)).delete(synchronize_session=False)
         session.commit()
         logging.info(f"Pruned {deleted_count} MetricFetches (and cascaded ProcessedResults) older than {keep_days} days.")
+        newer = aliased(PriceHistory)  # A later row of the same ticker (by fetch_timestamp, then id) supersedes a row
+        superseded = session.query(newer.id).filter(
+            newer.ticker == PriceHistory.ticker,
+            or_(newer.fetch_timestamp > PriceHistory.fetch_timestamp,
+                and_(newer.fetch_timestamp == PriceHistory.fetch_timestamp, newer.id > PriceHistory.id))
+        ).exists()
+        history_count = session.query(PriceHistory).filter(
+            PriceHistory.ticker.in_(tickers) if tickers else True, superseded
+        ).delete(synchronize_session=False)
+        session.commit()
+        logging.info(f"Pruned {history_count} superseded PriceHistory rows.")
     except Exception as e:
         session.rollback()
         logging.error(f"Error pruning old metrics: {e}")
     finally:
         session.close()
 
+def upsert_stock(metrics):
+    """
+    Inserts or updates the Stock row (name/industry/sector) for a metrics dict; portable across SQLite/PostgreSQL.
+    """
+    session = Session()
+    session.merge(Stock(
+        ticker=metrics['Ticker'],
+        company_name=metrics.get('Company Name', 'N/A'),
+        industry=metrics.get('Industry', 'N/A'),
+        sector=metrics.get('Sector', 'N/A')
+    ))
+    session.commit()
+    session.close()
+
+_metric_listeners = []
+_metric_listeners_lock = threading.Lock()
+
+def subscribe_metrics(callback):
+    """
+    Registers callback(ticker, record) to be called after every save_metrics in this process, on the saving thread,
+    with the saved metrics record (including fetch_id/fetch_timestamp). Callbacks should be quick (e.g. queue the change).
+    """
+    with _metric_listeners_lock:
+        _metric_listeners.append(callback)
+
+def _publish_metrics(ticker, record):
+    with _metric_listeners_lock:
+        listeners = list(_metric_listeners)
+    for callback in listeners:
+        try:
+            callback(ticker, record)
+        except Exception as e:
+            logging.error(f"Metrics change listener failed for {ticker}: {e}")
+
 def save_metrics(metrics):
     """
     Saves raw metrics to DB with current timestamp.
     Inserts MetricFetch. Stock upsert handled elsewhere.
-    Returns the fetch_id.
+    Quote-tier metrics keep their 'fundamentals_timestamp'; full fetches (no such key) start a new one.
+    Publishes the saved record to subscribe_metrics listeners. Returns the fetch_id.
     """
     session = Session()
 
@@ -463,43 +463,18 @@ def save_metrics(metrics):
     fetch = MetricFetch(
         ticker=ticker,
         fetch_timestamp=now,
-        pe=metrics.get('P/E') if metrics.get('P/E') != 'N/A' else None,
-        roe=metrics.get('ROE') if metrics.get('ROE') != 'N/A' else None,
-        de=metrics.get('D/E') if metrics.get('D/E') != 'N/A' else None,
-        pb=metrics.get('P/B') if metrics.get('P/B') != 'N/A' else None,
-        peg=metrics.get('PEG') if metrics.get('PEG') != 'N/A' else None,
-        gross_margin=metrics.get('Gross Margin') if metrics.get('Gross Margin') != 'N/A' else None,
-        net_profit_margin=metrics.get('Net Profit Margin') if metrics.get('Net Profit Margin') != 'N/A' else None,
-        fcf_ev=metrics.get('FCF % EV TTM') if metrics.get('FCF % EV TTM') != 'N/A' else None,
-        ebitda_ev=metrics.get('EBITDA % EV TTM') if metrics.get('EBITDA % EV TTM') != 'N/A' else None,
-        current_price=metrics.get('Current Price') if metrics.get('Current Price') != 'N/A' else None,
-        w52_high=metrics.get('52W High') if metrics.get('52W High') != 'N/A' else None,
-        w52_low=metrics.get('52W Low') if metrics.get('52W Low') != 'N/A' else None,
-        market_cap=metrics.get('Market Cap') if metrics.get('Market Cap') != 'N/A' else None,
-        ev=metrics.get('EV') if metrics.get('EV') != 'N/A' else None,
-        total_cash=metrics.get('Total Cash') if metrics.get('Total Cash') != 'N/A' else None,
-        total_debt=metrics.get('Total Debt') if metrics.get('Total Debt') != 'N/A' else None,
-        fcf_actual=metrics.get('FCF Actual') if metrics.get('FCF Actual') != 'N/A' else None,
-        ebitda_actual=metrics.get('EBITDA Actual') if metrics.get('EBITDA Actual') != 'N/A' else None,
-        p_fcf=metrics.get('P/FCF') if metrics.get('P/FCF') != 'N/A' else None,
-        beta=metrics.get('Beta') if metrics.get('Beta') != 'N/A' else None,
-        dividend_yield=metrics.get('Dividend Yield') if metrics.get('Dividend Yield') != 'N/A' else None,
-        avg_volume=metrics.get('Average Volume') if metrics.get('Average Volume') != 'N/A' else None,
-        rsi=metrics.get('RSI') if metrics.get('RSI') != 'N/A' else None,
-        revenue_growth=metrics.get('Revenue Growth') if metrics.get('Revenue Growth') != 'N/A' else None,
-        earnings_growth=metrics.get('Earnings Growth') if metrics.get('Earnings Growth') != 'N/A' else None,
-        forward_pe=metrics.get('Forward PE') if metrics.get('Forward PE') != 'N/A' else None,
-        analyst_rating=metrics.get('Analyst Rating') if metrics.get('Analyst Rating') != 'N/A' else None,
-        analyst_mean=metrics.get('Analyst Mean') if metrics.get('Analyst Mean') != 'N/A' else None,
-        target_price=metrics.get('Target Price') if metrics.get('Target Price') != 'N/A' else None,
-        sentiment=metrics.get('Sentiment') if metrics.get('Sentiment') != 'N/A' else None
+        fundamentals_timestamp=metrics.get('fundamentals_timestamp') or now,
+        **{column: to_db_value(metrics.get(field)) for field, column in METRIC_COLUMNS.items()}
     )
     session.add(fetch)
     session.commit()
     fetch_id = fetch.fetch_id
+    fundamentals_timestamp = fetch.fundamentals_timestamp
     session.close()
     # Prune old metrics after save
     prune_old_metrics(tickers=[ticker])
+    _publish_metrics(ticker, metrics_record(dict(metrics, fetch_timestamp=now, fetch_id=fetch_id,
+                                                 fundamentals_timestamp=fundamentals_timestamp)))
     return fetch_id
 
 def get_metadata(key):
@@ -552,9 +527,9 @@ def get_stale_tickers():
     tickers = [t[0] for t in query.all()]
     session.close()
     return tickers
-def get_price_history(ticker):
+def get_price_history(ticker, max_age_hours=24):
     """
-    Retrieves the latest price history for a ticker if fetched <24 hours ago.
+    Retrieves the latest price history for a ticker if fetched <max_age_hours ago (24 by default, for charts).
     Returns list of {'date':str, 'close':float} or None if no recent data.
     """
     session = Session()
@@ -562,21 +537,54 @@ def get_price_history(ticker):
     session.close()
     if latest:
         fetch_time = datetime.fromisoformat(latest.fetch_timestamp)
-        if datetime.now() - fetch_time < timedelta(hours=24):
+        if datetime.now() - fetch_time < timedelta(hours=max_age_hours):
             return json.loads(latest.history_json)
     return None
 
+def get_price_histories(tickers, max_age_hours=RSI_HISTORY_MAX_AGE_HOURS):
+    """
+    Batched get_price_history: returns dict of ticker -> latest history fetched <max_age_hours ago.
+    Defaults to the RSI freshness window so metric refreshes can reuse stored closes instead of downloading them.
+    """
+    if not tickers:
+        return {}
+    cutoff = (datetime.now() - timedelta(hours=max_age_hours)).isoformat()
+    session = Session()
+    subq = session.query(PriceHistory.ticker, func.max(PriceHistory.fetch_timestamp).label('max_ts')).filter(
+        PriceHistory.ticker.in_(tickers)
+    ).group_by(PriceHistory.ticker).subquery()
+    rows = session.query(PriceHistory).join(
+        subq, and_(PriceHistory.ticker == subq.c.ticker, PriceHistory.fetch_timestamp == subq.c.max_ts)
+    ).filter(PriceHistory.fetch_timestamp >= cutoff).all()
+    session.close()
+    return {row.ticker: json.loads(row.history_json) for row in rows}
+
 def save_price_history(ticker, history_list):
     """
-    Saves price history to DB with current timestamp.
+    Saves price history to DB with current timestamp, updating the ticker's latest row in place (one row per ticker,
+    so refreshes don't grow the table; older rows are removed by prune_old_metrics).
     """
     session = Session()
     now = datetime.now().isoformat()
-    ph = PriceHistory(ticker=ticker, fetch_timestamp=now, history_json=json.dumps(history_list))
-    session.add(ph)
+    ph = session.query(PriceHistory).filter_by(ticker=ticker).order_by(desc(PriceHistory.fetch_timestamp)).first()
+    if ph is None:
+        session.add(PriceHistory(ticker=ticker, fetch_timestamp=now, history_json=json.dumps(history_list)))
+    else:
+        ph.fetch_timestamp = now
+        ph.history_json = json.dumps(history_list)
     session.commit()
     session.close()
 
+def get_metrics_version():
+    """
+    Cheap state of the stored metrics: (number of tickers with metrics, newest fetch id or 0).
+    Changes whenever metrics are saved for any ticker or a ticker's metrics are deleted.
+    """
+    session = Session()
+    count, newest = session.query(func.count(func.distinct(MetricFetch.ticker)), func.max(MetricFetch.fetch_id)).one()
+    session.close()
+    return count, newest or 0
+
 def get_all_latest_metrics():
     session = Session()
     if session.query(Stock).count() == 0:
@@ -592,44 +600,7 @@ def get_all_latest_metrics():
     ).options(joinedload(MetricFetch.stock)).all()
     metrics_list = []
     for fetch in latest_fetches:
-        metrics = {
-            'Ticker': fetch.ticker,
-            'Company Name': fetch.stock.company_name if fetch.stock else 'N/A',
-            'Industry': fetch.stock.industry if fetch.stock else 'N/A',
-            'Sector': fetch.stock.sector if fetch.stock else 'N/A',
-            'P/E': fetch.pe if fetch.pe is not None else 'N/A',
-            'ROE': fetch.roe if fetch.roe is not None else 'N/A',
-            'D/E': fetch.de if fetch.de is not None else 'N/A',
-            'P/B': fetch.pb if fetch.pb is not None else 'N/A',
-            'PEG': fetch.peg if fetch.peg is not None else 'N/A',
-            'Gross Margin': fetch.gross_margin if fetch.gross_margin is not None else 'N/A',
-            'Net Profit Margin': fetch.net_profit_margin if fetch.net_profit_margin is not None else 'N/A',
-            'FCF % EV TTM': fetch.fcf_ev if fetch.fcf_ev is not None else 'N/A',
-            'EBITDA % EV TTM': fetch.ebitda_ev if fetch.ebitda_ev is not None else 'N/A',
-            'Current Price': fetch.current_price if fetch.current_price is not None else 'N/A',
-            '52W High': fetch.w52_high if fetch.w52_high is not None else 'N/A',
-            '52W Low': fetch.w52_low if fetch.w52_low is not None else 'N/A',
-            'Market Cap': fetch.market_cap if fetch.market_cap is not None else 'N/A',
-            'EV': fetch.ev if fetch.ev is not None else 'N/A',
-            'Total Cash': fetch.total_cash if fetch.total_cash is not None else 'N/A',
-            'Total Debt': fetch.total_debt if fetch.total_debt is not None else 'N/A',
-            'FCF Actual': fetch.fcf_actual if fetch.fcf_actual is not None else 'N/A',
-            'EBITDA Actual': fetch.ebitda_actual if fetch.ebitda_actual is not None else 'N/A',
-            'P/FCF': fetch.p_fcf if fetch.p_fcf is not None else 'N/A',
-            'Beta': fetch.beta if fetch.beta is not None else 'N/A',
-            'Dividend Yield': fetch.dividend_yield if fetch.dividend_yield is not None else 'N/A',
-            'Average Volume': fetch.avg_volume if fetch.avg_volume is not None else 'N/A',
-            'RSI': fetch.rsi if fetch.rsi is not None else 'N/A',
-            'Revenue Growth': fetch.revenue_growth if fetch.revenue_growth is not None else 'N/A',
-            'Earnings Growth': fetch.earnings_growth if fetch.earnings_growth is not None else 'N/A',
-            'Forward PE': fetch.forward_pe if fetch.forward_pe is not None else 'N/A',
-            'Analyst Rating': fetch.analyst_rating if fetch.analyst_rating is not None else 'N/A',
-            'Analyst Mean': fetch.analyst_mean if fetch.analyst_mean is not None else 'N/A',
-            'Target Price': fetch.target_price if fetch.target_price is not None else 'N/A',
-            'Sentiment': fetch.sentiment if fetch.sentiment is not None else 'N/A',
-            'fetch_timestamp': fetch.fetch_timestamp,
-            'fetch_id': fetch.fetch_id
-        }
+        metrics = metrics_from_fetch(fetch)
         metrics_list.append(metrics)
     session.close()
     return metrics_list
\ No newline at end of file
@@ -0,0 +1,263 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+import time
+
+from fetcher import QUOTE_BATCH_SIZE, StockFetcher
+from throttle import DEFAULT_MAX_CONCURRENCY, CircuitBreaker, get_shared_controller
+
+DEFAULT_WORKERS = DEFAULT_MAX_CONCURRENCY
+DEFAULT_REQUESTS_PER_MINUTE = float(os.getenv('FETCH_REQUESTS_PER_MINUTE', 30))
+FULL_REFRESH_DAYS = float(os.getenv('FETCH_FULL_REFRESH_DAYS', 7))  # Fundamentals cadence; quote-tier refreshes in between
+QUOTE_HISTORY_MAX_AGE_HOURS = 4 * 24  # Quote tier extends stored closes by the quoted session (covers a long weekend)
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting upstream requests to requests_per_minute.
+    burst is the bucket capacity (defaults to ~5s worth of tokens, at least 1).
+    """
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, burst=None):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1.0, self.rate * 5)
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.acquired = 0
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire(self, tokens=1):
+        """
+        Blocks until tokens are available, then takes them.
+        Requests larger than the bucket go through once it is full and leave it in debt.
+        """
+        needed = min(tokens, self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= needed:
+                    self.tokens -= tokens
+                    self.acquired += tokens
+                    return
+                wait = (needed - self.tokens) / self.rate
+            time.sleep(wait)
+
+def needs_full_refresh(metrics, now=None):
+    """
+    Returns True if a ticker needs the full (fundamentals) tier: no stored metrics, or fundamentals
+    older than FULL_REFRESH_DAYS. Otherwise a quote-tier refresh is enough.
+    """
+    if not metrics or not metrics.get('fundamentals_timestamp'):
+        return True
+    now = now or datetime.now()
+    return now - datetime.fromisoformat(metrics['fundamentals_timestamp']) > timedelta(days=FULL_REFRESH_DAYS)
+
+_shared_limiter = None
+_shared_limiter_lock = threading.Lock()
+
+def get_shared_limiter():
+    """
+    Returns the process-wide token bucket so fetch_bg, Manage and CLI runs share one request budget.
+    """
+    global _shared_limiter
+    with _shared_limiter_lock:
+        if _shared_limiter is None:
+            _shared_limiter = TokenBucket()
+        return _shared_limiter
+
+class FetchExecutor:
+    """
+    Runs MetricsProvider fetches (StockFetcher by default) on a thread pool, throttled by a shared token bucket instead of fixed sleeps.
+    Tickers are fetched in batches via fetch_batch (one RSI panel download per batch, skipped for stored histories).
+    workers sizes the thread pool; the AdaptiveController decides how many requests are actually in flight.
+    history_source: optional callable (tickers -> dict of ticker -> fresh stored history, e.g. db.get_price_histories);
+    RSI is computed from those histories and only the remaining tickers are downloaded. For the quote tier it is
+    called with max_age_hours=QUOTE_HISTORY_MAX_AGE_HOURS, since older histories are extended from the quote.
+    history_sink: optional callable (ticker, history), e.g. db.save_price_history; when set, batches download 1y
+    instead of 1mo so the same download also refreshes PriceHistory. Called in the iterating thread after each
+    successful ticker is yielded.
+    Quote fields come from the provider's multi-symbol quote endpoint (fetch_quote_infos), prefetched for the
+    whole run in chunks of QUOTE_BATCH_SIZE before the per-ticker fundamentals batches start.
+    """
+    def __init__(self, fetcher=None, workers=DEFAULT_WORKERS, limiter=None, controller=None, batch_size=5, breaker_retries=2,
+                 history_source=None, history_sink=None, quote_batch_size=QUOTE_BATCH_SIZE):
+        self.limiter = limiter or get_shared_limiter()
+        self.controller = controller or get_shared_controller()
+        self.fetcher = fetcher or StockFetcher(limiter=self.limiter, controller=self.controller)
+        if self.fetcher.limiter is None:
+            self.fetcher.limiter = self.limiter
+        if self.fetcher.controller is None:
+            self.fetcher.controller = self.controller
+        self.workers = workers
+        self.batch_size = batch_size
+        self.quote_batch_size = quote_batch_size  # Quote batches are one multi-symbol quote request each, so they can be larger
+        self.breaker_retries = breaker_retries
+        self.history_source = history_source
+        self.history_sink = history_sink
+        self.history_period = '1y' if history_sink else '1mo'
+        self.logger = logging.getLogger(__name__)
+        self.stats = {'tickers': 0, 'succeeded': 0, 'failed': 0, 'requests': 0, 'elapsed': 0.0}
+
+    def _wait_for_breaker(self):
+        while (wait := self.controller.breaker.retry_after()) > 0:
+            self.logger.info(f"Circuit open, pausing fetches for {wait:.0f}s")
+            time.sleep(wait)
+
+    def _fetch_quote_infos(self, tickers):
+        """
+        Prefetches multi-symbol quote items for a run, QUOTE_BATCH_SIZE symbols per request.
+        Returns dict of ticker -> quote item; missing tickers fall back to per-ticker info calls.
+        """
+        quotes = {}
+        for i in range(0, len(tickers), QUOTE_BATCH_SIZE):
+            self._wait_for_breaker()
+            try:
+                quotes.update(self.fetcher.fetch_quote_infos(tickers[i:i + QUOTE_BATCH_SIZE]))
+            except Exception as e:
+                self.logger.error(f"Quote prefetch failed for {len(tickers[i:i + QUOTE_BATCH_SIZE])} tickers: {e}")
+        return quotes
+
+    def _fetch_batch(self, batch, previous=None, quotes=None):
+        """
+        Fetches one batch, pausing while the circuit breaker is open and retrying tickers it rejected,
+        so a throttling episode delays the cycle instead of failing the rest of it.
+        previous: last stored metrics by ticker for a quote-tier batch (see MetricsProvider.fetch_quotes).
+        quotes: prefetched quote items (see _fetch_quote_infos); fetched per batch if None.
+        Returns (metrics_by_ticker, downloaded_histories).
+        """
+        stored = {}
+        if self.history_source is not None:
+            try:
+                if previous is None:
+                    stored = self.history_source(batch)
+                else:
+                    stored = self.history_source(batch, max_age_hours=QUOTE_HISTORY_MAX_AGE_HOURS)
+            except Exception as e:
+                self.logger.error(f"Failed to load stored histories for {batch}: {e}")
+        results = {}
+        downloaded = {}
+        pending = batch
+        for _ in range(self.breaker_retries + 1):
+            self._wait_for_breaker()
+            known = {**stored, **downloaded}
+            batch_quotes = None if quotes is None else {t: quotes[t] for t in pending if t in quotes}
+            if previous is None:
+                metrics, histories = self.fetcher.fetch_batch(pending, known, self.history_period, quotes=batch_quotes)
+            else:
+                # Quote tier needs a year of closes for the 52W range
+                metrics, histories = self.fetcher.fetch_quotes(pending, previous, known, '1y', quotes=batch_quotes)
+            results.update(metrics)
+            downloaded.update(histories)
+            pending = [t for t in pending if not results.get(t)]
+            quotes = None  # Retries refetch quotes rejected by the breaker
+            if not pending or self.controller.breaker.state == CircuitBreaker.CLOSED:
+                break
+        return results, downloaded
+
+    def iter_metrics(self, tickers):
+        """
+        Yields (ticker, metrics) as batches complete; metrics is {} on failure.
+        Results are yielded in the calling thread so callers can save to the DB directly.
+        """
+        return self._iter_batches(list(tickers))
+
+    def iter_quotes(self, previous):
+        """
+        Quote-tier counterpart of iter_metrics: previous maps ticker -> last stored metrics (e.g. get_latest_metrics).
+        Yields (ticker, metrics) with price, 52W range, volume and RSI refreshed and price-derived fields
+        recomputed, without any per-ticker info calls: one multi-symbol quote request per batch, plus a panel
+        download only for tickers whose stored history can't be extended from the quote.
+        """
+        return self._iter_batches(list(previous), previous)
+
+    def iter_tiered(self, tickers, previous):
+        """
+        Routes each ticker to the full or quote tier (see needs_full_refresh) and yields (ticker, metrics) from both.
+        previous maps ticker -> last stored metrics or None.
+        """
+        quote = {t: previous[t] for t in tickers if not needs_full_refresh(previous.get(t))}
+        full = [t for t in tickers if t not in quote]
+        self.logger.info(f"Tiered refresh: {len(full)} full, {len(quote)} quote-only")
+        yield from self.iter_metrics(full)
+        yield from self.iter_quotes(quote)
+
+    def _iter_batches(self, tickers, previous=None):
+        tickers = list(tickers)
+        if not tickers:
+            return
+        size = self.batch_size if previous is None else self.quote_batch_size
+        batches = [tickers[i:i + size] for i in range(0, len(tickers), size)]
+        start = time.monotonic()
+        requests_before = self.limiter.acquired
+        # Full-tier batches are small (per-ticker fundamentals), so their quotes are fetched up front in large chunks;
+        # quote-tier batches are already QUOTE_BATCH_SIZE-sized and fetch their own
+        quotes = self._fetch_quote_infos(tickers) if previous is None else None
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self._fetch_batch, batch, previous, quotes): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    batch_metrics, batch_histories = future.result()
+                except Exception as e:
+                    self.logger.error(f"Batch fetch failed for {batch}: {e}")
+                    batch_metrics, batch_histories = {}, {}
+                for t in batch:
+                    metrics = batch_metrics.get(t) or {}
+                    self.stats['tickers'] += 1
+                    self.stats['succeeded' if metrics else 'failed'] += 1
+                    yield t, metrics
+                    # After the caller has saved the metrics, so the Stock row exists for PriceHistory's foreign key
+                    if metrics and self.history_sink is not None and batch_histories.get(t):
+                        try:
+                            self.history_sink(t, batch_histories[t])
+                        except Exception as e:
+                            self.logger.error(f"Failed to save history for {t}: {e}")
+        self.stats['requests'] += self.limiter.acquired - requests_before
+        self.stats['elapsed'] += time.monotonic() - start
+        logging.info(self.throughput_summary())
+
+    def fetch_metrics(self, tickers):
+        """
+        Fetches all tickers and returns dict of ticker -> metrics.
+        """
+        return dict(self.iter_metrics(tickers))
+
+    def throughput(self):
+        """
+        Returns achieved tickers/min and upstream requests/min over all runs so far.
+        """
+        minutes = self.stats['elapsed'] / 60 if self.stats['elapsed'] > 0 else 0
+        if minutes == 0:
+            return {'tickers_per_minute': 0.0, 'requests_per_minute': 0.0}
+        return {
+            'tickers_per_minute': self.stats['tickers'] / minutes,
+            'requests_per_minute': self.stats['requests'] / minutes
+        }
+
+    def state(self):
+        """
+        Returns current throttling state: adaptive concurrency/delay, circuit breaker, rate limit, throughput
+        and (for pooled-session fetchers) HTTP connection reuse.
+        """
+        state = {
+            **self.controller.state(),
+            'requests_per_minute_limit': self.limiter.rate * 60,
+            **self.throughput()
+        }
+        session = getattr(self.fetcher, 'session', None)
+        if session is not None and hasattr(session, 'connection_stats'):
+            state['http'] = session.connection_stats()
+        return state
+
+    def throughput_summary(self):
+        rates = self.throughput()
+        control = self.controller.state()
+        return (f"Fetched {self.stats['succeeded']}/{self.stats['tickers']} tickers in {self.stats['elapsed']:.1f}s "
+                f"({rates['tickers_per_minute']:.1f} tickers/min, {rates['requests_per_minute']:.1f} req/min, "
+                f"{self.workers} workers, limit {self.limiter.rate * 60:.0f} req/min, "
+                f"concurrency {control['concurrency_limit']}, breaker {control['breaker']})")
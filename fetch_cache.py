@@ -0,0 +1,173 @@
+from datetime import datetime, timedelta
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import pytz
+
+CACHE_MODES = ('off', 'cache', 'record', 'replay')
+DEFAULT_CACHE_MODE = os.getenv('FETCH_CACHE_MODE', 'cache')
+DEFAULT_CACHE_DIR = os.getenv('FETCH_CACHE_DIR', '.fetch_cache')
+DEFAULT_CACHE_TTL = int(os.getenv('FETCH_CACHE_TTL', 6 * 3600))  # Seconds, for FUNDAMENTAL_ENDPOINTS
+DEFAULT_PRICE_TTL = int(os.getenv('FETCH_PRICE_CACHE_TTL', 5 * 60))  # Seconds, for every other endpoint (they carry prices)
+FUNDAMENTAL_ENDPOINTS = ('summary',)  # quoteSummary modules without a live price; info, quote and history:* all carry one
+DEFAULT_CACHE_MAX_MB = float(os.getenv('FETCH_CACHE_MAX_MB', 200))
+
+class CacheMiss(LookupError):
+    """
+    Raised in replay mode when a response was never recorded (no network fallback).
+    """
+
+def trading_day(now=None):
+    """
+    Returns the current US/Eastern trading day as 'YYYY-MM-DD', rolling weekends back to Friday.
+    """
+    now = now or datetime.now(pytz.timezone('US/Eastern'))
+    while now.weekday() > 4:
+        now -= timedelta(days=1)
+    return now.date().isoformat()
+
+class ResponseCache:
+    """
+    On-disk cache of upstream responses keyed by (ticker, endpoint, trading day).
+    Modes:
+    - 'cache': serve entries for today's trading day younger than ttl (FUNDAMENTAL_ENDPOINTS) or price_ttl (every
+      price-bearing endpoint: 'info', 'quote', 'history:1mo', ...), else fetch and store; LRU-evicts past max_bytes.
+    - 'record': always fetch and store, keyed by (ticker, endpoint) only so a cycle can be replayed on any day.
+    - 'replay': serve recorded entries only, never touching the network (raises CacheMiss).
+    - 'off': pass-through.
+    """
+    def __init__(self, directory=DEFAULT_CACHE_DIR, mode=DEFAULT_CACHE_MODE, ttl=DEFAULT_CACHE_TTL, max_mb=DEFAULT_CACHE_MAX_MB,
+                 price_ttl=DEFAULT_PRICE_TTL):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode '{mode}', expected one of {CACHE_MODES}")
+        self.directory = directory
+        self.mode = mode
+        self.ttl = ttl
+        self.price_ttl = price_ttl
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+        self.sizes = {}  # path -> bytes, for size-bounded eviction
+        if self.mode != 'off':
+            os.makedirs(self.directory, exist_ok=True)
+            for name in os.listdir(self.directory):
+                if name.endswith('.json'):
+                    path = os.path.join(self.directory, name)
+                    self.sizes[path] = os.path.getsize(path)
+
+    @property
+    def total_bytes(self):
+        return sum(self.sizes.values())
+
+    def _path(self, ticker, endpoint):
+        # Recordings drop the day so a cycle replays on any later date
+        day = trading_day() if self.mode == 'cache' else 'recorded'
+        digest = hashlib.sha1(f"{ticker}|{endpoint}|{day}".encode()).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def _ttl(self, endpoint):
+        return self.ttl if endpoint in FUNDAMENTAL_ENDPOINTS else self.price_ttl
+
+    def get(self, ticker, endpoint):
+        """
+        Returns the cached response or None on a miss. Raises CacheMiss in replay mode.
+        """
+        if self.mode in ('off', 'record'):
+            return None
+        path = self._path(ticker, endpoint)
+        try:
+            if self.mode == 'cache' and time.time() - os.path.getmtime(path) > self._ttl(endpoint):
+                raise FileNotFoundError(path)
+            with open(path) as f:
+                entry = json.load(f)
+            if self.mode == 'cache':
+                os.utime(path, (time.time(), os.path.getmtime(path)))  # atime marks recency for LRU
+            with self.lock:
+                self.stats['hits'] += 1
+            return entry['value']
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            with self.lock:
+                self.stats['misses'] += 1
+            if self.mode == 'replay':
+                raise CacheMiss(f"No recorded {endpoint} response for {ticker}")
+            return None
+
+    def put(self, ticker, endpoint, value):
+        """
+        Stores a JSON-serializable response; evicts least recently used entries past max_bytes.
+        """
+        if self.mode in ('off', 'replay'):
+            return
+        path = self._path(ticker, endpoint)
+        payload = json.dumps({'ticker': ticker, 'endpoint': endpoint, 'stored_at': time.time(), 'value': value}, default=str)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            self.logger.error(f"Failed to cache {endpoint} for {ticker}: {e}")
+            return
+        with self.lock:
+            self.sizes[path] = len(payload)
+            self.stats['writes'] += 1
+            if self.mode == 'cache':
+                self._evict()
+
+    def _evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        def last_used(path):
+            try:
+                return os.path.getatime(path)
+            except OSError:
+                return 0
+        for path in sorted(self.sizes, key=last_used):
+            if self.total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.sizes.pop(path, None)
+            self.stats['evictions'] += 1
+
+    def fetch(self, ticker, endpoint, loader):
+        """
+        Returns the cached response for (ticker, endpoint), calling loader() and storing its result on a miss.
+        Empty results ({} or []) are returned but not stored, so a blank response is retried rather than served as a hit.
+        """
+        value = self.get(ticker, endpoint)
+        if value is not None:
+            return value
+        value = loader()
+        if value:
+            self.put(ticker, endpoint, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            for path in list(self.sizes):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self.sizes = {}
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """
+    Returns the process-wide ResponseCache so the summary panel, custom sets and background thread share hits.
+    """
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = ResponseCache()
+        return _shared_cache
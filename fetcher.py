@@ -1,150 +1,641 @@
 import yfinance as yf
+from yfinance.data import YfData
+from yfinance.multi import _DownloadCtx, _download_impl
 import pandas as pd
 
+from abc import ABC, abstractmethod
 import logging
 import time
 
-class StockFetcher:
-    def __init__(self):
-        logging.basicConfig(level=logging.ERROR)
+import indicators
+from metrics_schema import MISSING, MISSING_TEXT, is_missing, metrics_record
+from fetch_cache import CacheMiss, get_response_cache
+from http_session import get_shared_session
+from throttle import CircuitOpenError, NOT_FOUND, RATE_LIMITED, classify_error, get_shared_controller
+
+def compute_rsi(closes, window=14):
+    """
+    Computes the latest RSI for every column of a close-price panel (dates x tickers) at once.
+    Uses simple rolling means of gains/losses (min_periods=1), read at each column's last valid close
+    (vectorized in indicators.rsi).
+    Returns float Series of ticker -> RSI, NaN for columns with no data.
+    """
+    return pd.Series(indicators.rsi(closes.to_numpy(dtype=float), window), index=closes.columns, dtype=float)
+
+QUOTE_URL = 'https://query1.finance.yahoo.com/v7/finance/quote'  # Multi-symbol
+QUOTE_SUMMARY_URL = 'https://query2.finance.yahoo.com/v10/finance/quoteSummary'  # One symbol per request
+SUMMARY_MODULES = ['financialData', 'quoteType', 'defaultKeyStatistics', 'assetProfile', 'summaryDetail']  # As Ticker.info
+QUOTE_BATCH_SIZE = 50  # Symbols per multi-symbol quote request
+QUOTE_WINDOW_DAYS = 252  # Sessions in the 52W range
+AVERAGE_VOLUME_DAYS = 63  # Yahoo's averageVolume is a 3-month daily average
+PRICE_MULTIPLE_KEYS = ('P/E', 'Forward P/E', 'P/B', 'PEG')
+
+def history_to_list(closes, volumes=None):
+    """
+    Converts a close Series indexed by date to list of {'date':str, 'close':float}, skipping NaN.
+    If a matching volume Series is given, entries also carry 'volume'.
+    """
+    history = []
+    for date, close in closes.dropna().items():
+        entry = {'date': date.strftime('%Y-%m-%d'), 'close': float(close)}
+        if volumes is not None and pd.notna(volumes.get(date)):
+            entry['volume'] = float(volumes[date])
+        history.append(entry)
+    return history
+
+def histories_to_panel(histories):
+    """
+    Builds a wide close panel (dates x tickers) from dict of ticker -> history list.
+    """
+    columns = {}
+    for ticker, history in histories.items():
+        columns[ticker] = pd.Series({pd.Timestamp(h['date']): h['close'] for h in history}, dtype=float)
+    return pd.DataFrame(columns).sort_index().reindex(columns=list(histories))
+
+def rsi_from_history(history):
+    """
+    Returns the latest RSI from a stored history list ({'date', 'close'} dicts), or NaN if empty.
+    """
+    if not history:
+        return MISSING
+    return float(compute_rsi(histories_to_panel({'_': history}))['_'])
+
+def quote_from_history(history):
+    """
+    Derives the quote-tier fields (price, 52W range, average volume, RSI) from a daily history list.
+    The 52W range is close-based, so it can sit slightly inside Yahoo's intraday high/low.
+    Average Volume is omitted when the history carries no volumes. Returns {} for an empty history.
+    """
+    if not history:
+        return {}
+    recent = history[-QUOTE_WINDOW_DAYS:]
+    closes = [h['close'] for h in recent]
+    quote = {
+        "Current Price": closes[-1],
+        "52W High": max(closes),
+        "52W Low": min(closes),
+        "RSI": rsi_from_history(history)
+    }
+    volumes = [h['volume'] for h in recent[-AVERAGE_VOLUME_DAYS:] if 'volume' in h]
+    if volumes:
+        quote["Average Volume"] = round(sum(volumes) / len(volumes))
+    return quote
+
+def merge_info(summary, quote):
+    """
+    Builds a Ticker.info-style dict from a quoteSummary result (module dicts) and a multi-symbol quote item,
+    flattening modules and letting quote fields win, as yfinance does for a single symbol.
+    """
+    info = {}
+    for value in list((summary or {}).values()) + [quote or {}]:
+        if isinstance(value, dict):
+            info.update({k: v for k, v in value.items() if v is not None})
+    for key, value in (quote or {}).items():
+        if not isinstance(value, dict) and value is not None:
+            info[key] = value
+    return {k: v['raw'] if isinstance(v, dict) and 'raw' in v else v for k, v in info.items()}
+
+def quote_fields(quote):
+    """
+    Maps a multi-symbol quote item to the metrics fields it carries: Yahoo's price, intraday 52W range,
+    market cap, 3-month average volume and valuation multiples. Missing/non-numeric fields are omitted.
+    """
+    mapping = {
+        "Current Price": 'regularMarketPrice',
+        "52W High": 'fiftyTwoWeekHigh',
+        "52W Low": 'fiftyTwoWeekLow',
+        "Market Cap": 'marketCap',
+        "Average Volume": 'averageDailyVolume3Month',
+        "P/E": 'trailingPE',
+        "Forward P/E": 'forwardPE',
+        "P/B": 'priceToBook'
+    }
+    fields = {}
+    for key, source in mapping.items():
+        value = (quote or {}).get(source)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            fields[key] = value
+    return fields
+
+def extend_history(history, quote):
+    """
+    Brings a stored daily history up to date from a quote item instead of re-downloading it: the quote's
+    close replaces the last entry if it is for the same session, or is appended if the history ends on the
+    previous business day (the oldest entry is dropped to keep the window).
+    Returns the new list, or None if the gap is longer (holidays included) or the quote lacks a price/time,
+    so the caller downloads instead. Splits/dividends are picked up by the next full download.
+    """
+    if not history or not quote:
+        return None
+    price = quote.get('regularMarketPrice')
+    timestamp = quote.get('regularMarketTime')
+    if not isinstance(price, (int, float)) or not isinstance(timestamp, (int, float)):
+        return None
+    session_day = pd.Timestamp(timestamp, unit='s', tz='UTC').tz_convert('US/Eastern').tz_localize(None).normalize()
+    last_day = pd.Timestamp(history[-1]['date'])
+    entry = {'date': session_day.strftime('%Y-%m-%d'), 'close': float(price)}
+    if isinstance(quote.get('regularMarketVolume'), (int, float)):
+        entry['volume'] = float(quote['regularMarketVolume'])
+    if session_day == last_day:
+        return history[:-1] + [entry]
+    if last_day + pd.offsets.BDay(1) == session_day:
+        return history[1 if len(history) >= QUOTE_WINDOW_DAYS else 0:] + [entry]
+    return None
+
+def _number(value):
+    """
+    True for a usable (non-missing) numeric value.
+    """
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and not is_missing(value)
+
+def apply_quote(metrics, quote):
+    """
+    Returns a copy of the last full-refresh metrics updated with a quote, recomputing price-derived fields locally:
+    market cap, P/E, Forward P/E, P/B and PEG scale with price (shares/earnings unchanged since the full refresh),
+    dividend yield scales inversely, EV moves with market cap, and P/FCF and FCF/EBITDA % EV are recomputed
+    from the stored actuals. Fields the quote carries itself (e.g. Yahoo's market cap or P/E from quote_fields)
+    are used as-is. Fields that cannot be rescaled (missing inputs) keep their stored values.
+    """
+    updated = {k: v for k, v in metrics.items() if k not in ('fetch_timestamp', 'fetch_id')}
+    updated.update(quote)
+    old_price = metrics.get('Current Price')
+    new_price = quote.get('Current Price')
+    if not _number(old_price) or old_price <= 0 or not _number(new_price):
+        return updated
+    ratio = new_price / old_price
+    for key in PRICE_MULTIPLE_KEYS:
+        if key not in quote and _number(updated.get(key)):
+            updated[key] = updated[key] * ratio
+    if _number(updated.get('Dividend Yield')):
+        updated['Dividend Yield'] = updated['Dividend Yield'] / ratio
+    market_cap = metrics.get('Market Cap')
+    if _number(market_cap):
+        new_cap = quote['Market Cap'] if 'Market Cap' in quote else market_cap * ratio
+        updated['Market Cap'] = new_cap
+        if _number(updated.get('EV')):
+            updated['EV'] = updated['EV'] + new_cap - market_cap
+        fcf = updated.get('FCF Actual')
+        if _number(fcf) and fcf > 0 and new_cap > 0:
+            updated['P/FCF'] = new_cap / fcf
+    ev = updated.get('EV')
+    if _number(ev) and ev:
+        for actual, key in (('FCF Actual', 'FCF % EV TTM'), ('EBITDA Actual', 'EBITDA % EV TTM')):
+            if _number(updated.get(actual)):
+                updated[key] = updated[actual] / ev * 100
+    return updated
+
+def build_metrics(ticker, info, latest_rsi, logger=None):
+    """
+    Maps a yfinance-style info dict (plus latest RSI) to the metrics dict used by db/processor.
+    Shared by every MetricsProvider so synthetic and live data take the same fallback paths.
+    Raises on malformed info (callers retry or return empty).
+    """
+    logger = logger or logging.getLogger(__name__)
+    # Analyst sentiment
+    analyst_rating = info.get('recommendationKey', MISSING_TEXT)
+    analyst_mean = info.get('recommendationMean', MISSING)
+    target_price = info.get('targetMeanPrice', MISSING)
+    sentiment = MISSING_TEXT
+    if isinstance(analyst_mean, (int, float)) and not is_missing(analyst_mean):
+        if analyst_mean <= 2:
+            sentiment = 'Bullish'
+        elif analyst_mean == 3:
+            sentiment = 'Neutral'
+        else:
+            sentiment = 'Bearish'
+    # Extract and format metrics
+    pe = info.get('trailingPE', None)
+    if pe is None:
+        market_cap = info.get('marketCap', None)
+        trailing_eps = info.get('trailingEps', None)
+        if market_cap and trailing_eps and trailing_eps != 0:
+            pe = market_cap / trailing_eps
+        else:
+            pe = MISSING
+            logger.warning(f"Missing P/E for {ticker}, fallback calculation failed.")
+
+    # PEG calculation
+    peg = info.get('pegRatio', None)
+    if peg is None:
+        pe_for_peg = info.get('trailingPE') or info.get('forwardPE') or None
+        growth = info.get('earningsGrowth', 0)
+        if pe_for_peg is not None and growth > 0:
+            peg = pe_for_peg / (growth * 100)
+        else:
+            peg = MISSING
+        logger.warning(f"Missing original pegRatio for {ticker}, calculated as {peg}")
+    else:
+        peg = peg  # Use original
+
+    # P/FCF calculation
+    market_cap = info.get('marketCap', 0)
+    free_cashflow = info.get('freeCashflow', 0)
+    if free_cashflow > 0 and market_cap > 0:
+        p_fcf = market_cap / free_cashflow
+    else:
+        p_fcf = MISSING
+        logger.warning(f"Unable to calculate P/FCF for {ticker} due to missing or zero freeCashflow")
+
+    metrics = metrics_record({
+        "Ticker": ticker,
+        "Company Name": info.get('longName'),
+        "Industry": info.get('industry'),
+        "Sector": info.get('sector'),
+        "P/E": pe,
+        "Forward P/E": info.get('forwardPE'),
+        "ROE": info['returnOnEquity'] * 100 if info.get('returnOnEquity') else MISSING,
+        "D/E": info['debtToEquity'] / 100 if info.get('debtToEquity') else MISSING,
+        "P/B": info.get('priceToBook'),
+        "PEG": peg,
+        "Earnings Growth": info['earningsGrowth'] * 100 if info.get('earningsGrowth') else MISSING,
+        "Revenue Growth": info['revenueGrowth'] * 100 if info.get('revenueGrowth') else MISSING,
+        "Gross Margin": info['grossMargins'] * 100 if info.get('grossMargins') else MISSING,
+        "Net Profit Margin": info['profitMargins'] * 100 if info.get('profitMargins') else MISSING,
+        "FCF % EV TTM": (info.get('freeCashflow', 0) / info.get('enterpriseValue', 1)) * 100 if info.get('enterpriseValue') else MISSING,
+        "EBITDA % EV TTM": (info.get('ebitda', 0) / info.get('enterpriseValue', 1)) * 100 if info.get('enterpriseValue') else MISSING,
+        "Current Price": info.get('currentPrice'),
+        "52W High": info.get('fiftyTwoWeekHigh'),
+        "52W Low": info.get('fiftyTwoWeekLow'),
+        "Market Cap": info.get('marketCap'),
+        "EV": info.get('enterpriseValue'),
+        "Total Cash": info.get('totalCash'),
+        "Total Debt": info.get('totalDebt'),
+        "FCF Actual": info.get('freeCashflow'),
+        "EBITDA Actual": info.get('ebitda'),
+        "P/FCF": p_fcf,
+        "Beta": info.get('beta'),
+        "Dividend Yield": info['dividendYield'] * 100 if info.get('dividendYield') else MISSING,
+        "Average Volume": info.get('averageVolume'),
+        "RSI": latest_rsi,
+        "Analyst Rating": analyst_rating,
+        "Analyst Mean": analyst_mean,
+        "Target Price": target_price,
+        "Sentiment": sentiment
+    })
+    # Log missing metrics (indicators are attached later from stored histories, see indicators.attach_indicators)
+    for key, value in metrics.items():
+        if (value == MISSING_TEXT or is_missing(value)) and key not in indicators.INDICATOR_KEYS:
+            logger.warning(f"Missing metric {key} for {ticker}")
+
+    return metrics
+
+class PanelDownloadError(RuntimeError):
+    """
+    Raised by StockFetcher._download_histories when yf.download rate limited some symbols, so the adaptive controller
+    records the throttle; carries the call's histories and per-symbol errors for the symbols that did come back.
+    """
+    def __init__(self, message, histories, errors):
+        super().__init__(message)
+        self.histories = histories
+        self.errors = errors
+
+class MetricsProvider(ABC):
+    """
+    Interface for metric sources (yfinance, synthetic load generators, ...).
+    Implementations provide fetch_metrics, fetch_close_panel and fetch_history (and optionally fetch_histories);
+    batching, quote-tier refreshes, rate limiting and adaptive backoff are shared here.
+    """
+    def __init__(self, limiter=None, controller=None):
         self.logger = logging.getLogger(__name__)
+        self.limiter = limiter  # Optional shared TokenBucket (see executor.py)
+        self.controller = controller  # Optional AdaptiveController (see throttle.py)
+
+    def _throttle(self, requests=1):
+        """
+        Waits on the shared rate limiter (if any) before an upstream request.
+        """
+        if self.limiter is not None:
+            self.limiter.acquire(requests)
+
+    def _upstream(self, fn, requests=1):
+        """
+        Runs one upstream request under the adaptive controller and rate limiter.
+        Failures are classified (rate limit/not found/transient) by the controller before re-raising.
+        """
+        def run():
+            self._throttle(requests)
+            return fn()
+        return self.controller.call(run) if self.controller is not None else run()
+
+    @abstractmethod
+    def fetch_metrics(self, ticker, latest_rsi=None, quote=None):
+        """
+        Returns metrics dict for one ticker (see build_metrics), or empty dict on error.
+        quote: the ticker's item from fetch_quote_infos, if one was fetched for its batch.
+        """
+
+    def fetch_quote_infos(self, tickers):
+        """
+        Returns dict of ticker -> quote item from a multi-symbol quote endpoint (many symbols per request).
+        Providers without one return {} and every caller falls back to per-ticker paths.
+        """
+        return {}
+
+    @abstractmethod
+    def fetch_close_panel(self, tickers, period='1mo'):
+        """
+        Returns wide close DataFrame (dates x tickers) for a chunk of tickers.
+        """
+
+    @abstractmethod
+    def fetch_history(self, ticker, period='1y'):
+        """
+        Returns list of {'date':str, 'close':float} or empty list on error.
+        """
+
+    def fetch_histories(self, tickers, period='1mo'):
+        """
+        Returns dict of ticker -> history list for a chunk of tickers in one panel request.
+        Providers that can also supply volumes override this; the default uses fetch_close_panel (closes only).
+        """
+        panel = self.fetch_close_panel(tickers, period)
+        return {t: history_to_list(panel[t]) if t in panel else [] for t in tickers}
 
-    def fetch_metrics(self, ticker):
+    def fetch_metrics_with_history(self, ticker, history=None, period='1y'):
+        """
+        Fetches metrics with RSI derived from a single price history, so one download feeds both RSI and the chart.
+        history: stored history that is still fresh (e.g. from get_price_history); nothing is downloaded for RSI if given.
+        Returns (metrics, history) where history is the one RSI was computed from; callers persist it if new.
+        """
+        if not history:
+            history = self.fetch_history(ticker, period)
+        return self.fetch_metrics(ticker, latest_rsi=rsi_from_history(history)), history
+
+    def fetch_batch(self, tickers, histories=None, period='1mo', quotes=None):
+        """
+        Fetches metrics for a chunk, computing RSI from stored histories where available and
+        downloading one close panel (of `period`) for the rest.
+        quotes: prefetched fetch_quote_infos items (fetched here if None).
+        Returns (metrics_by_ticker, downloaded) where downloaded maps ticker -> newly fetched history list.
+        """
+        histories, downloaded = self._histories_for(tickers, histories, period)
+        closes = histories_to_panel({t: histories.get(t, []) for t in tickers})
+        return self.fetch_metrics_many(tickers, closes=closes, quotes=quotes), downloaded
+
+    def fetch_quotes(self, tickers, previous, histories=None, period='1y', quotes=None):
+        """
+        Quote-tier refresh: updates price, 52W range, volume and RSI without per-ticker info calls and
+        recomputes price-derived fields from each ticker's last full metrics (see apply_quote).
+        With multi-symbol quotes, stored histories (any age) are extended by the quoted close (see extend_history)
+        and Yahoo's own market cap/52W range/multiples are used; tickers that can't be extended get one panel download.
+        previous: dict of ticker -> last stored metrics; tickers without one (or without history) get {}.
+        quotes: prefetched fetch_quote_infos items (fetched here if None).
+        Returns (metrics_by_ticker, updated_histories) like fetch_batch.
+        """
+        if quotes is None:
+            quotes = self.fetch_quote_infos(tickers)
+        histories = histories or {}
+        updated = {}
+        for ticker in tickers:
+            extended = extend_history(histories.get(ticker), quotes.get(ticker))
+            if extended:
+                updated[ticker] = extended
+        missing = [t for t in tickers if t not in updated]
+        if missing:
+            updated.update(self._histories_for(missing, None, period)[1])
+        results = {}
+        for ticker in tickers:
+            quote = quote_from_history(updated.get(ticker))
+            if quote and quotes.get(ticker):
+                quote.update(quote_fields(quotes[ticker]))
+            results[ticker] = apply_quote(previous[ticker], quote) if quote and previous.get(ticker) else {}
+        return results, updated
+
+    def _histories_for(self, tickers, histories, period):
+        """
+        Returns (histories, downloaded): the given stored histories plus one panel download for tickers lacking one.
+        """
+        histories = {t: h for t, h in (histories or {}).items() if h}
+        missing = [t for t in tickers if t not in histories]
+        downloaded = {}
+        if missing:
+            downloaded = {t: h for t, h in self.fetch_histories(missing, period).items() if h}
+        histories.update(downloaded)
+        return histories, downloaded
+
+    def fetch_metrics_many(self, tickers, closes=None, info_delay=None, quotes=None):
+        """
+        Fetches metrics for a chunk of tickers, pulling the RSI price panel in a single request
+        and the quote fields in one multi-symbol request where the provider supports it.
+        closes: optional pre-recorded close panel (dates x tickers), e.g. an offline fixture; downloaded if None.
+        info_delay: optional callable returning seconds to sleep between per-ticker info calls.
+        quotes: prefetched fetch_quote_infos items (fetched here if None).
+        Returns dict of ticker -> metrics dict (empty dict on failure, like fetch_metrics).
+        """
+        if closes is None:
+            closes = self.fetch_close_panel(tickers)
+        if quotes is None:
+            quotes = self.fetch_quote_infos(tickers)
+        rsi = compute_rsi(closes)
+        results = {}
+        for i, ticker in enumerate(tickers):
+            results[ticker] = self.fetch_metrics(ticker, latest_rsi=rsi.get(ticker, MISSING), quote=quotes.get(ticker))
+            if info_delay and i < len(tickers) - 1:
+                time.sleep(info_delay())
+        return results
+
+class StockFetcher(MetricsProvider):
+    max_attempts = 3
+    retry_backoff = 2.0  # Seconds, doubled per attempt for transient errors
+
+    def __init__(self, limiter=None, cache=None, controller=None, session=None):
+        logging.basicConfig(level=logging.ERROR)
+        super().__init__(limiter, controller if controller is not None else get_shared_controller())
+        self.cache = cache if cache is not None else get_response_cache()  # Shared ResponseCache (see fetch_cache.py)
+        self.session = session if session is not None else get_shared_session()  # Pooled keep-alive session (see http_session.py)
+
+    def _get_info(self, ticker, stock):
+        """
+        Returns stock.info, served from the response cache when fresh.
+        """
+        def load():
+            return self._upstream(lambda: stock.info)
+        return self.cache.fetch(ticker, 'info', load)
+
+    def _get_summary(self, ticker):
+        """
+        Returns the quoteSummary modules behind Ticker.info (one request), served from the response cache when fresh.
+        """
+        def load():
+            params = {'modules': ','.join(SUMMARY_MODULES), 'formatted': 'false', 'symbol': ticker, 'corsDomain': 'finance.yahoo.com'}
+            data = self._upstream(lambda: YfData(session=self.session).get_raw_json(f"{QUOTE_SUMMARY_URL}/{ticker}", params=params, timeout=self.session.read_timeout))
+            result = (data.get('quoteSummary') or {}).get('result') or []
+            return result[0] if result else {}
+        return self.cache.fetch(ticker, 'summary', load)
+
+    def fetch_quote_infos(self, tickers):
+        """
+        Fetches quote items for up to QUOTE_BATCH_SIZE symbols per request from Yahoo's multi-symbol quote endpoint
+        (the same endpoint Ticker.info calls once per symbol). Cached per ticker; failed chunks are logged and
+        left out so callers fall back to Ticker.info.
+        """
+        results = {}
+        missing = []
+        for ticker in tickers:
+            try:
+                item = self.cache.get(ticker, 'quote')
+            except CacheMiss:
+                continue
+            if item is None:
+                missing.append(ticker)
+            else:
+                results[ticker] = item
+        for i in range(0, len(missing), QUOTE_BATCH_SIZE):
+            chunk = missing[i:i + QUOTE_BATCH_SIZE]
+            params = {'symbols': ','.join(chunk), 'formatted': 'false'}
+            try:
+                data = self._upstream(lambda: YfData(session=self.session).get_raw_json(QUOTE_URL, params=params, timeout=self.session.read_timeout))
+            except CircuitOpenError as e:
+                self.logger.warning(f"Skipping quote batch of {len(chunk)}: {e}")
+                continue
+            except Exception as e:
+                self.logger.error(f"Quote batch failed for {len(chunk)} tickers ({classify_error(e)}): {e}")
+                continue
+            for item in (data.get('quoteResponse') or {}).get('result') or []:
+                ticker = item.get('symbol')
+                if ticker in chunk:
+                    self.cache.put(ticker, 'quote', item)
+                    results[ticker] = item
+        return results
+
+    def _get_closes(self, ticker, period, stock=None):
+        """
+        Returns close history as list of {'date':str, 'close':float}, served from the response cache when fresh.
+        """
+        def load():
+            hist = self._upstream(lambda: (stock or yf.Ticker(ticker, session=self.session)).history(period=period))
+            return history_to_list(hist['Close'], hist.get('Volume')) if not hist.empty else []
+        return self.cache.fetch(ticker, f'history:{period}', load)
+
+    def fetch_metrics(self, ticker, latest_rsi=None, quote=None):
         """
         Fetches stock metrics for a single ticker using yfinance (Yahoo Finance API).
         Returns dict with metrics in the expected format, or empty on error.
         Handles calculations for % metrics and includes actual $ values where needed.
         Added: Company name, industry, and sector for output table and filtering.
+        If latest_rsi is given (e.g. from fetch_metrics_many), the 1mo history call is skipped.
+        If quote is given (from fetch_quote_infos), only the per-symbol quoteSummary is requested and merged
+        with it, instead of Ticker.info's quoteSummary + single-symbol quote; build_metrics' fallbacks apply as usual.
+        Not-found tickers and an open circuit breaker fail fast; rate limits are paced by the controller;
+        transient errors retry with exponential backoff.
         """
-        for attempt in range(2):
+        for attempt in range(self.max_attempts):
             try:
-                stock = yf.Ticker(ticker)
-                hist = stock.history(period="1mo")
-                if not hist.empty:
-                    delta = hist['Close'].diff(1)
-                    gain = delta.where(delta > 0, 0)
-                    loss = -delta.where(delta < 0, 0)
-                    avg_gain = gain.rolling(window=14, min_periods=1).mean()
-                    avg_loss = loss.rolling(window=14, min_periods=1).mean()
-                    rs = avg_gain / avg_loss
-                    rsi = 100 - (100 / (1 + rs))
-                    latest_rsi = rsi.iloc[-1] if not rsi.empty else 'N/A'
-                else:
-                    latest_rsi = 'N/A'
-                info = stock.info
-                # Analyst sentiment
-                analyst_rating = info.get('recommendationKey', 'N/A')
-                analyst_mean = info.get('recommendationMean', 'N/A')
-                target_price = info.get('targetMeanPrice', 'N/A')
-                sentiment = 'N/A'
-                if analyst_mean != 'N/A' and isinstance(analyst_mean, (int, float)):
-                    if analyst_mean <= 2:
-                        sentiment = 'Bullish'
-                    elif analyst_mean == 3:
-                        sentiment = 'Neutral'
-                    else:
-                        sentiment = 'Bearish'
-                # Extract and format metrics
-                pe = info.get('trailingPE', None)
-                if pe is None:
-                    market_cap = info.get('marketCap', None)
-                    trailing_eps = info.get('trailingEps', None)
-                    if market_cap and trailing_eps and trailing_eps != 0:
-                        pe = market_cap / trailing_eps
-                    else:
-                        pe = 'N/A'
-                        self.logger.warning(f"Missing P/E for {ticker}, fallback calculation failed.")
-        
-                # PEG calculation
-                peg = info.get('pegRatio', None)
-                if peg is None:
-                    pe_for_peg = info.get('trailingPE') or info.get('forwardPE') or None
-                    growth = info.get('earningsGrowth', 0)
-                    if pe_for_peg is not None and growth > 0:
-                        peg = pe_for_peg / (growth * 100)
-                    else:
-                        peg = 'N/A'
-                    self.logger.warning(f"Missing original pegRatio for {ticker}, calculated as {peg}")
-                else:
-                    peg = peg  # Use original
-        
-                # P/FCF calculation
-                market_cap = info.get('marketCap', 0)
-                free_cashflow = info.get('freeCashflow', 0)
-                if free_cashflow > 0 and market_cap > 0:
-                    p_fcf = market_cap / free_cashflow
-                else:
-                    p_fcf = 'N/A'
-                    self.logger.warning(f"Unable to calculate P/FCF for {ticker} due to missing or zero freeCashflow")
-        
-                metrics = {
-                    "Ticker": ticker,
-                    "Company Name": info.get('longName', 'N/A'),
-                    "Industry": info.get('industry', 'N/A'),
-                    "Sector": info.get('sector', 'N/A'),
-                    "P/E": pe,
-                    "Forward P/E": info.get('forwardPE', 'N/A'),
-                    "ROE": info.get('returnOnEquity', 'N/A') * 100 if info.get('returnOnEquity') else 'N/A',
-                    "D/E": info.get('debtToEquity', 'N/A') / 100 if info.get('debtToEquity') else 'N/A',
-                    "P/B": info.get('priceToBook', 'N/A'),
-                    "PEG": peg,
-                    "Earnings Growth": info.get('earningsGrowth', 'N/A') * 100 if info.get('earningsGrowth') else 'N/A',
-                    "Revenue Growth": info.get('revenueGrowth', 'N/A') * 100 if info.get('revenueGrowth') else 'N/A',
-                    "Gross Margin": info.get('grossMargins', 'N/A') * 100 if info.get('grossMargins') else 'N/A',
-                    "Net Profit Margin": info.get('profitMargins', 'N/A') * 100 if info.get('profitMargins') else 'N/A',
-                    "FCF % EV TTM": (info.get('freeCashflow', 0) / info.get('enterpriseValue', 1)) * 100 if info.get('enterpriseValue') else 'N/A',
-                    "EBITDA % EV TTM": (info.get('ebitda', 0) / info.get('enterpriseValue', 1)) * 100 if info.get('enterpriseValue') else 'N/A',
-                    "Current Price": info.get('currentPrice', 'N/A'),
-                    "52W High": info.get('fiftyTwoWeekHigh', 'N/A'),
-                    "52W Low": info.get('fiftyTwoWeekLow', 'N/A'),
-                    "Market Cap": info.get('marketCap', 'N/A'),
-                    "EV": info.get('enterpriseValue', 'N/A'),
-                    "Total Cash": info.get('totalCash', 'N/A'),
-                    "Total Debt": info.get('totalDebt', 'N/A'),
-                    "FCF Actual": info.get('freeCashflow', 'N/A'),
-                    "EBITDA Actual": info.get('ebitda', 'N/A'),
-                    "P/FCF": p_fcf,
-                    "Beta": info.get('beta', 'N/A'),
-                    "Dividend Yield": info.get('dividendYield', 'N/A') * 100 if info.get('dividendYield') else 'N/A',
-                    "Average Volume": info.get('averageVolume', 'N/A'),
-                    "RSI": latest_rsi,
-                    "Analyst Rating": analyst_rating,
-                    "Analyst Mean": analyst_mean,
-                    "Target Price": target_price,
-                    "Sentiment": sentiment
-                }
-        
-                # Log missing metrics
-                for key, value in metrics.items():
-                    if value == 'N/A':
-                        self.logger.warning(f"Missing metric {key} for {ticker}")
-        
-                return metrics
+                stock = yf.Ticker(ticker, session=self.session)
+                if latest_rsi is None:
+                    latest_rsi = rsi_from_history(self._get_closes(ticker, '1mo', stock))
+                info = merge_info(self._get_summary(ticker), quote) if quote else self._get_info(ticker, stock)
+                return build_metrics(ticker, info, latest_rsi, self.logger)
+            except CacheMiss as e:
+                self.logger.error(f"Replay miss for {ticker}: {e}")
+                return {}
+            except CircuitOpenError as e:
+                self.logger.warning(f"Skipping {ticker}: {e}")
+                return {}
             except Exception as e:
-                self.logger.error(f"Attempt {attempt+1} failed for {ticker}: {e}")
-                if attempt < 1:
-                    time.sleep(5)
+                kind = classify_error(e)
+                self.logger.error(f"Attempt {attempt+1} failed for {ticker} ({kind}): {e}")
+                if kind == NOT_FOUND:
+                    return {}
+                if attempt < self.max_attempts - 1 and not (kind == RATE_LIMITED and self.controller is not None):
+                    # Rate-limit retries are delayed by the controller's AIMD delay instead
+                    time.sleep(self.retry_backoff * (2 ** attempt))
         else:
             self.logger.error(f"All attempts failed for {ticker}")
             return {}
 
+    def _download_histories(self, tickers, period):
+        """
+        Downloads closes and volumes for tickers in one yf.download call (one chart request per symbol).
+        yf.download only logs per-symbol failures, so the download runs on its own context to read them back.
+        Returns (histories, errors) with errors mapping failed tickers to an exception for classify_error;
+        raises PanelDownloadError (carrying both) if any symbol was rate limited, so the controller backs off.
+        """
+        ctx = _DownloadCtx()
+        data = _download_impl(ctx, tickers, period=period, auto_adjust=True, group_by='column', progress=False,
+                              session=self.session, timeout=self.session.read_timeout)
+        histories = {}
+        if not data.empty:
+            closes = data['Close']
+            volumes = data['Volume'] if 'Volume' in data else None
+            if isinstance(closes, pd.Series):
+                closes = closes.to_frame(name=tickers[0])
+                volumes = volumes.to_frame(name=tickers[0]) if volumes is not None else None
+            for ticker in tickers:
+                ticker_volumes = volumes[ticker] if volumes is not None and ticker in volumes else None
+                histories[ticker] = history_to_list(closes[ticker], ticker_volumes) if ticker in closes else []
+        errors = {t: RuntimeError(ctx.errors[t.upper()]) for t in tickers if t.upper() in ctx.errors and not histories.get(t)}
+        throttled = [e for e in errors.values() if classify_error(e) == RATE_LIMITED]
+        if throttled:
+            raise PanelDownloadError(f"{len(throttled)} of {len(tickers)} symbols rate limited: {throttled[0]}", histories, errors)
+        return histories, errors
+
+    def fetch_histories(self, tickers, period='1mo'):
+        """
+        Downloads closes and volumes for a chunk of tickers in one yf.download call (cached tickers are skipped).
+        Symbols yfinance failed on are classified like fetch_metrics errors: not-found ones are dropped,
+        rate-limited and transient ones are downloaded again (up to max_attempts). Only non-empty histories are cached.
+        Returns dict of ticker -> history list (empty for tickers with no data).
+        """
+        histories = {}
+        missing = []
+        for ticker in tickers:
+            try:
+                history = self.cache.get(ticker, f'history:{period}')
+            except CacheMiss:
+                history = []
+            if history is None:
+                missing.append(ticker)
+            else:
+                histories[ticker] = history
+        for attempt in range(self.max_attempts):
+            if not missing:
+                break
+            try:
+                downloaded, errors = self._upstream(lambda: self._download_histories(missing, period), len(missing))
+            except CircuitOpenError as e:
+                self.logger.warning(f"Skipping close panel for {len(missing)} tickers: {e}")
+                break
+            except PanelDownloadError as e:
+                downloaded, errors = e.histories, e.errors
+            except Exception as e:
+                downloaded, errors = {}, {t: e for t in missing}
+            for ticker, history in downloaded.items():
+                if ticker not in errors:
+                    if history:  # An all-NaN column is a blank response, not a cacheable "no data"
+                        self.cache.put(ticker, f'history:{period}', history)
+                    histories[ticker] = history
+            kinds = {t: classify_error(e) for t, e in errors.items()}
+            missing = [t for t in missing if t in errors and kinds[t] != NOT_FOUND]
+            if errors:
+                first = next(iter(errors))
+                self.logger.error(f"Attempt {attempt+1} failed for {len(errors)} of the close panel's tickers "
+                                  f"({', '.join(sorted(set(kinds.values())))}), e.g. {first}: {errors[first]}")
+            if missing and attempt < self.max_attempts - 1 and not (RATE_LIMITED in kinds.values() and self.controller is not None):
+                # Rate-limit retries are delayed by the controller's AIMD delay instead
+                time.sleep(self.retry_backoff * (2 ** attempt))
+        if missing:
+            self.logger.error(f"All attempts failed for {len(missing)} close panel tickers")
+        return {t: histories.get(t, []) for t in tickers}
+
+    def fetch_close_panel(self, tickers, period='1mo'):
+        """
+        Returns wide close DataFrame (dates x tickers) from fetch_histories; columns are all-NaN for tickers with no data.
+        """
+        histories = self.fetch_histories(tickers, period)
+        if not any(histories.values()):
+            return pd.DataFrame(columns=tickers, dtype=float)
+        return histories_to_panel(histories).reindex(columns=tickers)
+
     def fetch_history(self, ticker, period='1y'):
         """
         Fetches price history for a ticker using yfinance.
         Returns list of {'date':str, 'close':float} or empty list on error.
         """
         try:
-            stock = yf.Ticker(ticker)
-            hist = stock.history(period=period)
-            if hist.empty:
+            history_list = self._get_closes(ticker, period)
+            if not history_list:
                 self.logger.warning(f"No history data for {ticker}")
-                return []
-            history_list = []
-            for date, row in hist.iterrows():
-                history_list.append({
-                    'date': date.strftime('%Y-%m-%d'),
-                    'close': float(row['Close'])
-                })
             return history_list
         except Exception as e:
             self.logger.error(f"Failed to fetch history for {ticker}: {e}")
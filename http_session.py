@@ -0,0 +1,124 @@
+import os
+import threading
+
+from curl_cffi import requests as curl_requests
+from curl_cffi.const import CurlInfo, CurlOpt
+
+DEFAULT_POOL_SIZE = int(os.getenv('FETCH_POOL_SIZE', 10))
+DEFAULT_CONNECT_TIMEOUT = float(os.getenv('FETCH_CONNECT_TIMEOUT', 5))  # Seconds
+DEFAULT_READ_TIMEOUT = float(os.getenv('FETCH_READ_TIMEOUT', 20))  # Seconds
+DEFAULT_IMPERSONATE = os.getenv('FETCH_IMPERSONATE', 'chrome')
+
+class PooledSession(curl_requests.Session):
+    """
+    Long-lived keep-alive HTTP session for every yfinance call (yfinance 1.x requires a curl_cffi session).
+    Each worker thread gets its own curl handle (curl_cffi thread-local handles) whose connection cache holds
+    up to pool_size connections, so TLS handshakes and Yahoo's cookie/crumb negotiation happen once per
+    connection instead of once per ticker. Counts requests that opened a new connection vs reused one.
+    """
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, impersonate=DEFAULT_IMPERSONATE, **kwargs):
+        super().__init__(
+            impersonate=impersonate,
+            timeout=(connect_timeout, read_timeout),
+            curl_options={CurlOpt.MAXCONNECTS: pool_size},
+            curl_infos=[CurlInfo.NUM_CONNECTS],
+            **kwargs
+        )
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'new_connections': 0, 'reused_connections': 0, 'errors': 0}
+
+    def request(self, method, url, *args, **kwargs):
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except Exception:
+            with self.stats_lock:
+                self.stats['requests'] += 1
+                self.stats['errors'] += 1
+            raise
+        new_connections = response.infos.get(CurlInfo.NUM_CONNECTS, 0) if response.infos else 0
+        with self.stats_lock:
+            self.stats['requests'] += 1
+            if new_connections:
+                self.stats['new_connections'] += new_connections
+            else:
+                self.stats['reused_connections'] += 1
+        return response
+
+    def connection_stats(self):
+        """
+        Returns request/connection counts and the share of requests served on an already-open connection.
+        """
+        with self.stats_lock:
+            stats = dict(self.stats)
+        completed = stats['requests'] - stats['errors']
+        stats['reuse_ratio'] = round(stats['reused_connections'] / completed, 3) if completed else 0.0
+        stats['pool_size'] = self.pool_size
+        return stats
+
+_shared_session = None
+_shared_session_lock = threading.Lock()
+
+def get_shared_session():
+    """
+    Returns the process-wide PooledSession so every StockFetcher (background thread, summary panel, Manage) shares connections.
+    """
+    global _shared_session
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = PooledSession()
+        return _shared_session
+
+# Test: connection reuse against a local keep-alive HTTP stand-in
+if __name__ == "__main__":
+    from concurrent.futures import ThreadPoolExecutor
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    import time
+
+    class StandIn(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # Keep-alive
+        disable_nagle_algorithm = True  # Avoid delayed-ACK stalls between header and body writes
+        connections = 0
+        lock = threading.Lock()
+
+        def setup(self):
+            super().setup()
+            with StandIn.lock:
+                StandIn.connections += 1  # One handler instance per TCP connection
+
+        def do_GET(self):
+            body = b'{"quoteResponse": {"result": []}}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v7/finance/quote"
+    requests_count, workers = 200, 4
+
+    start = time.perf_counter()
+    for _ in range(requests_count):
+        with curl_requests.Session() as fresh:
+            fresh.get(url)
+    fresh_time = time.perf_counter() - start
+    print(f"Fresh session per request: {requests_count} requests, {StandIn.connections} server connections, {fresh_time:.2f}s")
+
+    StandIn.connections = 0
+    session = PooledSession(impersonate=None)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda _: session.get(url), range(requests_count)))
+    pooled_time = time.perf_counter() - start
+    print(f"Pooled session, {workers} threads: {requests_count} requests, {StandIn.connections} server connections, "
+          f"{pooled_time:.2f}s, stats {session.connection_stats()}")
+    server.shutdown()
+    os._exit(0)  # curl handles held by pool threads can delay interpreter exit
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+
+RSI_WINDOW = 14
+SMA_WINDOWS = (50, 200)
+VOLATILITY_WINDOW = 63  # ~3 months of daily returns
+HIGH_WINDOW = 252  # Sessions in the 52W range
+TRADING_DAYS = 252
+
+INDICATOR_KEYS = ['SMA 50', 'SMA 200', 'Volatility', 'Max Drawdown', '% From 52W High']
+
+def _last_valid_rows(values):
+    """
+    Returns the row index of each column's last non-NaN value (-1 for all-NaN columns).
+    """
+    valid = ~np.isnan(values)
+    last = values.shape[0] - 1 - np.argmax(valid[::-1], axis=0)
+    return np.where(valid.any(axis=0), last, -1)
+
+def _trailing_mean(values, window):
+    """
+    Trailing mean over `window` rows with min_periods=1 semantics (pandas rolling(window, min_periods=1).mean()).
+    Expects no NaNs.
+    """
+    sums = np.cumsum(values, axis=0)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts = np.minimum(np.arange(1, values.shape[0] + 1), window)[:, None]
+    return sums / counts
+
+def rsi(closes, window=RSI_WINDOW):
+    """
+    Latest RSI per column of a close array (dates x tickers), read at each column's last valid close.
+    Simple rolling means of gains/losses with pandas rolling(min_periods=1) semantics; gaps count as no change.
+    Returns float array, NaN for columns with no data.
+    """
+    closes = np.asarray(closes, dtype=float)
+    if closes.size == 0:
+        return np.full(closes.shape[1] if closes.ndim == 2 else 0, np.nan)
+    delta = np.diff(closes, axis=0, prepend=np.nan)
+    delta = np.nan_to_num(delta, nan=0.0)
+    avg_gain = _trailing_mean(np.maximum(delta, 0), window)
+    avg_loss = _trailing_mean(np.maximum(-delta, 0), window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = 100 - 100 / (1 + avg_gain / avg_loss)
+    values[np.isnan(closes)] = np.nan
+    rows = _last_valid_rows(values)
+    cols = np.arange(closes.shape[1])
+    return np.where(rows >= 0, values[np.maximum(rows, 0), cols], np.nan)
+
+def compute_indicators(closes):
+    """
+    Computes the latest technical indicators for every ticker of a wide close panel (dates x tickers) in one pass:
+    - RSI: 14-day, as stored by the fetcher (see rsi).
+    - SMA 50 / SMA 200: simple moving averages of the last 50/200 closes (NaN with shorter history).
+    - Volatility: annualized std of the last 63 daily log returns, in %.
+    - Max Drawdown: worst peak-to-trough decline over the panel, in % (<= 0).
+    - % From 52W High: last close vs the highest close of the last 252 sessions, in % (<= 0).
+    Gaps are forward-filled so every ticker is read at its last valid close.
+    Returns DataFrame indexed by ticker with RSI plus INDICATOR_KEYS columns (NaN where not computable).
+    """
+    tickers = list(closes.columns)
+    values = closes.sort_index().ffill().to_numpy(dtype=float)
+    result = pd.DataFrame(np.nan, index=tickers, columns=['RSI'] + INDICATOR_KEYS)
+    if values.size == 0:
+        return result
+    result['RSI'] = rsi(closes.sort_index().to_numpy(dtype=float))
+    last = values[-1]
+    counts = (~np.isnan(values)).sum(axis=0)
+
+    for window in SMA_WINDOWS:
+        tail = values[-window:]
+        with np.errstate(invalid='ignore'):
+            sma = np.nanmean(tail, axis=0) if len(tail) else np.full(len(tickers), np.nan)
+        result[f'SMA {window}'] = np.where(counts >= window, sma, np.nan)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.diff(np.log(values), axis=0)[-VOLATILITY_WINDOW:]
+        valid_returns = (~np.isnan(returns)).sum(axis=0)
+        volatility = np.nanstd(returns, axis=0, ddof=1) * np.sqrt(TRADING_DAYS) * 100 if len(returns) else np.nan
+    result['Volatility'] = np.where(valid_returns >= 2, volatility, np.nan) if len(returns) else np.nan
+
+    peaks = np.fmax.accumulate(values, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdowns = values / peaks - 1
+        high = np.nanmax(values[-HIGH_WINDOW:], axis=0) if counts.any() else np.full(len(tickers), np.nan)
+        result['Max Drawdown'] = np.where(counts > 0, np.nanmin(drawdowns, axis=0) * 100, np.nan)
+        result['% From 52W High'] = np.where(counts > 0, (last / high - 1) * 100, np.nan)
+    return result
+
+def attach_indicators(metrics_list, histories):
+    """
+    Adds indicator fields (INDICATOR_KEYS) to each metrics dict in place, from a dict of ticker -> history list
+    (e.g. db.get_price_histories). Tickers without history get NaN, so scoring falls back to the
+    fundamentals-only rules. Returns metrics_list.
+    """
+    from fetcher import histories_to_panel
+    panel_histories = {m['Ticker']: histories.get(m['Ticker']) or [] for m in metrics_list}
+    table = compute_indicators(histories_to_panel(panel_histories)) if panel_histories else None
+    for metrics in metrics_list:
+        for key in INDICATOR_KEYS:
+            value = table.at[metrics['Ticker'], key] if table is not None else np.nan
+            metrics[key] = float(value)
+    return metrics_list
+
+def _random_walk_panel(count, days=HIGH_WINDOW, seed=0):
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0003, 0.02, (days, count))
+    closes = 100 * np.exp(np.cumsum(returns, axis=0))
+    closes[:rng.integers(0, 60), :count // 10] = np.nan  # Some shorter histories
+    dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=days)
+    return pd.DataFrame(closes, index=dates, columns=[f"T{i:05d}" for i in range(count)])
+
+def _pandas_rsi(closes, window=RSI_WINDOW):
+    # Reference: the previous per-panel pandas implementation, for parity and baseline timing
+    delta = closes.diff(1)
+    avg_gain = delta.where(delta > 0, 0).rolling(window=window, min_periods=1).mean()
+    avg_loss = (-delta.where(delta < 0, 0)).rolling(window=window, min_periods=1).mean()
+    values = 100 - (100 / (1 + avg_gain / avg_loss))
+    return values.where(closes.notna()).ffill().iloc[-1]
+
+# Test: parity with the pandas RSI and per-ticker cost at 1k/10k tickers
+if __name__ == "__main__":
+    import time
+    panel = _random_walk_panel(500)
+    print(f"RSI parity vs pandas: max abs diff {np.nanmax(np.abs(rsi(panel.to_numpy()) - _pandas_rsi(panel).to_numpy())):.2e}")
+    for count in (1000, 10000):
+        panel = _random_walk_panel(count)
+        start = time.perf_counter()
+        compute_indicators(panel)
+        vectorized = time.perf_counter() - start
+        sample = panel.iloc[:, :200]
+        start = time.perf_counter()
+        for ticker in sample.columns:
+            _pandas_rsi(sample[[ticker]])
+        per_column = (time.perf_counter() - start) / len(sample.columns)
+        print(f"{count} tickers: all indicators {vectorized * 1000:.1f}ms ({vectorized / count * 1e6:.1f}us/ticker); "
+              f"pandas RSI one ticker at a time {per_column * 1e6:.0f}us/ticker")
@@ -1,43 +1,301 @@
 # main.py (updated to use caching)
 import argparse
-from fetcher import StockFetcher
-from processor import process_stock, get_float
-from db import init_db, get_latest_metrics, save_metrics, save_processed  # Updated imports
+from datetime import datetime, timedelta
+import json
+import os
+import numpy as np
+import streamlit as st
+from metrics_schema import format_metric
+from processor import DEFAULT_LOGIC, DEFAULT_WEIGHTS, FACTORS, PRESETS, compile_config, score_universe, get_float, result_flags, result_positives, result_risks
+from db import init_db, get_latest_metrics, get_all_latest_metrics, save_metrics, save_price_history, get_price_histories, upsert_stock, INDICATOR_HISTORY_MAX_AGE_HOURS
+from executor import FetchExecutor, TokenBucket, DEFAULT_WORKERS, DEFAULT_REQUESTS_PER_MINUTE
+from indicators import attach_indicators
+from synthetic import SyntheticProvider, synthetic_tickers
+from ranking import top_k, top_k_many
+from sweep import SEARCH_METHODS, ConfigSpace, benchmark, overlap_objective, search, tilt_objective
+from universe import UniverseStore
+from tickers import DEFAULT_TICKERS
+import time
 
-def main():
-    init_db()  # Initialize DB at start
+DEFAULT_CHECKPOINT = '.seed_checkpoint.json'
+APP_DATABASE_URL = 'sqlite:///stock_screen.db'  # db.py's fallback when DATABASE_URL is in neither the env nor secrets
+
+def load_universe(path):
+    """
+    Reads a ticker universe: 'default' for tickers.DEFAULT_TICKERS, else a .csv/.txt file with one ticker per line
+    (first column; BOM, blank lines, '#' comments and a 'ticker'/'symbol' header are skipped).
+    Returns upper-cased tickers, de-duplicated in file order.
+    """
+    if path == 'default':
+        return list(DEFAULT_TICKERS)
+    tickers = []
+    with open(path, encoding='utf-8-sig') as f:
+        for line in f:
+            ticker = line.split(',')[0].strip().strip('"').upper()
+            if ticker and not ticker.startswith('#') and ticker not in ('TICKER', 'SYMBOL'):
+                tickers.append(ticker)
+    return list(dict.fromkeys(tickers))
+
+def load_checkpoint(path, universe):
+    """
+    Returns the saved seed checkpoint for this universe, or a fresh one if missing or for another universe.
+    """
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                checkpoint = json.load(f)
+            if checkpoint.get('universe') == universe:
+                return checkpoint
+            print(f"Checkpoint {path} is for universe '{checkpoint.get('universe')}', starting over.")
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Ignoring unreadable checkpoint {path}: {e}")
+    return {'universe': universe, 'done': [], 'failed': {}, 'started_at': datetime.now().isoformat()}
+
+def save_checkpoint(path, checkpoint):
+    """
+    Writes the checkpoint atomically so an interrupted write never corrupts it.
+    """
+    checkpoint['updated_at'] = datetime.now().isoformat()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+def synthetic_db_error():
+    """
+    Returns why synthetic tickers may not be saved to the configured DB, or None if they may.
+    They are only written to a DATABASE_URL set explicitly in the environment that is not the app's own DB
+    (the secrets URL or the stock_screen.db fallback), so a load test never pollutes real data.
+    """
+    url = os.getenv('DATABASE_URL')
+    if not url:
+        return "--synthetic writes fake tickers to the DB; set DATABASE_URL to a scratch DB (e.g. sqlite:///synthetic.db)."
+    try:
+        app_url = st.secrets.get('DATABASE_URL', APP_DATABASE_URL)
+    except Exception:  # No secrets file
+        app_url = APP_DATABASE_URL
+    if url in (app_url, APP_DATABASE_URL):
+        return "--synthetic refuses to write to the app's DB; point DATABASE_URL at a scratch DB."
+    return None
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+def seed(args):
+    """
+    Seeds or refreshes every ticker of a universe file with parallel workers, checkpointing progress to
+    args.checkpoint after each chunk so an interrupted run (Ctrl-C, crash, restart) resumes where it stopped.
+    Tickers with metrics newer than --max-age-hours are skipped; the rest use the tiered refresh
+    (full fundamentals for new/old tickers, quote-only otherwise). Prints throughput and ETA per chunk.
+    """
+    tickers = synthetic_tickers(args.synthetic) if args.synthetic else load_universe(args.universe)
+    universe = f"synthetic:{args.synthetic}" if args.synthetic else args.universe
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    checkpoint = load_checkpoint(args.checkpoint, universe)
+    done = set(checkpoint['done'])
+
+    previous = {m['Ticker']: m for m in get_all_latest_metrics()}
+    cutoff = datetime.now() - timedelta(hours=args.max_age_hours)
+    fresh = {t for t, m in previous.items() if datetime.fromisoformat(m['fetch_timestamp']) > cutoff}
+    pending = [t for t in tickers if t not in done and t not in fresh]
+    print(f"Universe {universe}: {len(tickers)} tickers, {len(done)} done in checkpoint, "
+          f"{len(fresh & set(tickers))} fresh in DB, {len(pending)} to fetch with {args.workers} workers at {args.rpm:.0f} req/min.")
+    if not pending:
+        return
 
+    provider = SyntheticProvider() if args.synthetic else None
+    limiter = TokenBucket(float('inf') if args.synthetic else args.rpm)  # Synthetic requests never reach Yahoo
+    executor = FetchExecutor(fetcher=provider, workers=args.workers, limiter=limiter,
+                             history_source=get_price_histories, history_sink=save_price_history)
+    start = time.monotonic()
+    processed = succeeded = 0
+    try:
+        for i in range(0, len(pending), args.chunk_size):
+            chunk = pending[i:i + args.chunk_size]
+            for ticker, metrics in executor.iter_tiered(chunk, {t: previous.get(t) for t in chunk}):
+                processed += 1
+                if metrics:
+                    try:
+                        upsert_stock(metrics)
+                        save_metrics(metrics)
+                        checkpoint['done'].append(ticker)
+                        checkpoint['failed'].pop(ticker, None)
+                        succeeded += 1
+                        continue
+                    except Exception as e:
+                        print(f"Failed to save {ticker}: {e}")
+                checkpoint['failed'][ticker] = checkpoint['failed'].get(ticker, 0) + 1
+            save_checkpoint(args.checkpoint, checkpoint)
+            elapsed = time.monotonic() - start
+            rate = processed / elapsed if elapsed > 0 else 0
+            eta = (len(pending) - processed) / rate if rate > 0 else 0
+            print(f"[{processed}/{len(pending)}] {processed / len(pending):.0%} ok {succeeded} failed {processed - succeeded} | "
+                  f"{rate * 60:.1f} tickers/min | elapsed {format_duration(elapsed)} | ETA {format_duration(eta)}")
+    except KeyboardInterrupt:
+        save_checkpoint(args.checkpoint, checkpoint)
+        print(f"Interrupted; progress saved to {args.checkpoint}. Re-run the same command to resume.")
+        return
+    print(executor.throughput_summary())
+    if checkpoint['failed']:
+        print(f"{len(checkpoint['failed'])} tickers failed (re-run to retry): {', '.join(sorted(checkpoint['failed'])[:20])}")
+    else:
+        os.remove(args.checkpoint)
+        print("Seed complete; checkpoint removed.")
+
+def sweep(args):
+    """
+    Searches scoring configs around a base config (--config JSON exported from Customize, or --preset) for the best
+    value of an objective over the top N: overlap with --targets, or the mean --factor boost (tilt).
+    Candidates are scored in batches against the universe's ScoreMatrix (see sweep.py); prints the best config
+    (written to --output, importable on the Customize page) and the evaluation rate in configs/s.
+    """
+    if args.synthetic:
+        metrics_list = [m for m in SyntheticProvider().fetch_metrics_many(synthetic_tickers(args.synthetic)).values() if m]
+    else:
+        metrics_list = get_all_latest_metrics()
+        histories = get_price_histories([m['Ticker'] for m in metrics_list], max_age_hours=INDICATOR_HISTORY_MAX_AGE_HOURS)
+        metrics_list = attach_indicators(metrics_list, histories)
+    if not metrics_list:
+        print("No metrics to sweep over; seed the DB first or use --synthetic N.")
+        return
+    store = UniverseStore.from_records(metrics_list, 'sweep')
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+    else:
+        config = {'weights': DEFAULT_WEIGHTS, 'metrics': list(DEFAULT_WEIGHTS), 'logic': PRESETS[args.preset]}
+    try:
+        space = ConfigSpace(store.score_matrix(), config.get('weights'), config.get('metrics'), config.get('logic', DEFAULT_LOGIC),
+                            config.get('flags'), tune_boosts=args.tune_boosts)
+    except (ValueError, AttributeError, TypeError) as e:
+        print(f"Invalid base config: {e}")
+        return
+
+    if args.objective == 'overlap':
+        targets = [t.strip().upper() for t in (args.targets or '').split(',') if t.strip()]
+        known = [t for t in targets if t in store.rows]
+        if not known:
+            print("--objective overlap needs --targets with at least one ticker in the universe.")
+            return
+        if len(known) < len(targets):
+            print(f"Ignoring targets not in the universe: {', '.join(t for t in targets if t not in store.rows)}")
+        objective = overlap_objective(store.ticker_mask(known), args.top)
+    else:
+        objective = tilt_objective(space.matrix.factors[args.factor], args.top)
+
+    base_value = float(space.evaluate(space.start, objective)[0])
+    start = time.perf_counter()
+    try:
+        candidate, value, evaluated = search(space, objective, args.method, count=args.count, levels=args.levels,
+                                             rounds=args.rounds, seed=args.seed)
+    except ValueError as e:
+        print(e)
+        return
+    elapsed = time.perf_counter() - start
+    best = space.config(candidate)
+    print(f"{args.method} search over {len(space.levels)} dimensions at {len(store)} tickers: {evaluated} configs in {elapsed:.2f}s "
+          f"({evaluated / elapsed if elapsed else 0:,.0f} configs/s)")
+    print(f"Objective ({args.objective}, top {args.top}): base {base_value:.3f} -> best {value:.3f}")
+    for metric in space.metrics:
+        print(f"- {metric}: {space.weights[metric]} -> {best['weights'][metric]}")
+    for flag, _ in space.tuned:
+        print(f"- {flag} boost: {space.logic[flag]['boost']} -> {best['logic'][flag]['boost']}")
+    scores = space.scores(candidate)[0]
+    print(f"Top {args.top}: {', '.join(store.text['Ticker'][i] for i in top_k([scores], args.top))}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(best, f, indent=2)
+        print(f"Best config written to {args.output} (import it on the Customize page).")
+    if args.benchmark:
+        for batch, rate in benchmark(space, objective):
+            print(f"Batch of {batch}: {rate:,.0f} configs/s")
+
+def main():
     parser = argparse.ArgumentParser(description="StockSimTool CLI")
     parser.add_argument('--tickers', type=str, help="Comma-separated tickers (overrides preset)")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Parallel fetch workers")
+    parser.add_argument('--rpm', type=float, default=DEFAULT_REQUESTS_PER_MINUTE, help="Upstream requests per minute")
+    parser.add_argument('--synthetic', type=int, default=0, help="Load-test with N synthetic tickers instead of yfinance (needs a scratch DATABASE_URL)")
+    # Options repeated on subcommands default to SUPPRESS, so they only override the root parser's when given
+    subparsers = parser.add_subparsers(dest='command')
+    seed_parser = subparsers.add_parser('seed', help="Seed/refresh a ticker universe with checkpoint/resume")
+    seed_parser.add_argument('--universe', default='tickers.csv', help="Ticker file (.csv/.txt, one per line) or 'default' for tickers.py")
+    seed_parser.add_argument('--workers', type=int, default=argparse.SUPPRESS, help="Parallel fetch workers")
+    seed_parser.add_argument('--rpm', type=float, default=argparse.SUPPRESS, help="Upstream requests per minute")
+    seed_parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help="Checkpoint file for resuming")
+    seed_parser.add_argument('--restart', action='store_true', help="Discard any checkpoint and start over")
+    seed_parser.add_argument('--max-age-hours', type=float, default=12, help="Skip tickers with metrics newer than this (0 refreshes all)")
+    seed_parser.add_argument('--chunk-size', type=int, default=50, help="Tickers per checkpoint/progress line")
+    seed_parser.add_argument('--synthetic', type=int, default=argparse.SUPPRESS, help="Seed N synthetic tickers instead of yfinance (needs a scratch DATABASE_URL)")
+    sweep_parser = subparsers.add_parser('sweep', help="Search weight/boost configs for the best value of an objective")
+    sweep_parser.add_argument('--config', help="Base config JSON (as exported from the Customize page); default --preset")
+    sweep_parser.add_argument('--preset', default='Overall', choices=list(PRESETS), help="Base preset when no --config is given")
+    sweep_parser.add_argument('--objective', default='overlap', choices=['overlap', 'tilt'], help="Overlap of the top N with --targets, or mean --factor boost in the top N")
+    sweep_parser.add_argument('--targets', help="Comma-separated target tickers for --objective overlap")
+    sweep_parser.add_argument('--factor', default='value', choices=FACTORS, help="Factor for --objective tilt")
+    sweep_parser.add_argument('--top', type=int, default=20, help="Top N the objective is measured on")
+    sweep_parser.add_argument('--method', default='random', choices=SEARCH_METHODS, help="Random search, grid search or coordinate descent")
+    sweep_parser.add_argument('--count', type=int, default=10000, help="Random configs to try")
+    sweep_parser.add_argument('--levels', type=int, default=3, help="Grid values per dimension")
+    sweep_parser.add_argument('--rounds', type=int, default=10, help="Coordinate descent rounds at most")
+    sweep_parser.add_argument('--seed', type=int, default=0, help="Random search seed")
+    sweep_parser.add_argument('--tune-boosts', action='store_true', help="Also search flag boosts (base boost +-10)")
+    sweep_parser.add_argument('--output', help="Write the best config JSON here")
+    sweep_parser.add_argument('--benchmark', action='store_true', help="Print configs/s for several batch sizes")
+    sweep_parser.add_argument('--synthetic', type=int, default=argparse.SUPPRESS, help="Sweep over N synthetic tickers instead of the DB")
     args = parser.parse_args()
+    if args.synthetic and args.command != 'sweep':  # sweep --synthetic never touches the DB
+        error = synthetic_db_error()
+        if error:
+            print(error)
+            return
+    init_db()  # Initialize DB at start
+    if args.command == 'seed':
+        seed(args)
+        return
+    if args.command == 'sweep':
+        sweep(args)
+        return
 
     # Preset small list for ease; override with arg
     preset_tickers = ['UNH', 'NVO', 'AAPL', 'MSFT', 'GOOGL']
     tickers = args.tickers.split(',') if args.tickers else preset_tickers
+    provider = None
+    if args.synthetic:
+        tickers = synthetic_tickers(args.synthetic)
+        provider = SyntheticProvider()
 
-    # Step 1: Gather data with caching
-    results = []
-    fetcher = StockFetcher()
-    for ticker in tickers:
-        metrics = get_latest_metrics(ticker)  # Check cache first
-        if not metrics:
-            metrics = fetcher.fetch_metrics(ticker)  # Fetch fresh if no recent cache
+    # Step 1: Gather data with caching, fetching misses in parallel
+    cached = {t: get_latest_metrics(t) for t in tickers}  # Check cache first
+    to_fetch = [t for t in tickers if not cached[t]]
+    if to_fetch:
+        limiter = TokenBucket(float('inf') if args.synthetic else args.rpm)  # Synthetic requests never reach Yahoo
+        executor = FetchExecutor(fetcher=provider, workers=args.workers, limiter=limiter)
+        for ticker, metrics in executor.iter_metrics(to_fetch):
             if metrics:
-                fetch_id = save_metrics(metrics)
-                processed = process_stock(metrics)
-                save_processed(processed, fetch_id)
-                results.append(processed)
-            continue
-        # If cached or fetched, process (re-processing is cheap/deterministic)
-        processed = process_stock(metrics)
-        results.append(processed)
-
-    # Rank by final_score desc
-    results.sort(key=lambda x: x['final_score'], reverse=True)
+                save_metrics(metrics)
+                cached[ticker] = metrics
+        print(executor.throughput_summary())
+    start = time.perf_counter()
+    # Re-processing is cheap/deterministic; the whole universe is scored in one vectorized pass
+    plan = compile_config(logic=DEFAULT_LOGIC)
+    results = score_universe([cached[ticker] for ticker in tickers if cached[ticker]], plan=plan)
+    if args.synthetic:
+        score_time = time.perf_counter() - start
+        print(f"Scored {len(results)} stocks in {score_time:.2f}s ({len(results) / score_time if score_time else 0:.0f}/s)")
 
     # Parameters from algorithm
     num_top = 20  # All if len(results) < num_top
-    top_results = results[:num_top]
+    factors = ['value', 'momentum', 'quality', 'growth']
+
+    # Rank by final_score desc, and by each factor boost (ties by final_score), selecting only the top rows
+    final_scores = np.array([r['final_score'] for r in results])
+    top_results = [results[i] for i in top_k([final_scores], num_top)]
+    factor_tops = top_k_many({factor: np.array([r['factor_boosts'].get(factor, 0) for r in results]) for factor in factors},
+                             5, then=[final_scores])
 
     # Output as per Step 7 (markdown table)
     print("#### Ranked Top Stocks" if len(results) > num_top else "#### All Ranked Stocks")
@@ -46,26 +304,25 @@ def main():
     for i, res in enumerate(top_results, 1):
         m = res['metrics']
         details = (
-            f"P/E: {m['P/E']}<br>ROE: {m['ROE']}%<br>P/B: {m['P/B']}<br>PEG: {m['PEG']}<br>"
-            f"Gross: {m['Gross Margin']}%<br>FCF/EV: {m['FCF % EV TTM']}%<br>D/E: {m['D/E']}"
+            f"P/E: {format_metric(m['P/E'])}<br>ROE: {format_metric(m['ROE'])}%<br>P/B: {format_metric(m['P/B'])}<br>PEG: {format_metric(m['PEG'])}<br>"
+            f"Gross: {format_metric(m['Gross Margin'])}%<br>FCF/EV: {format_metric(m['FCF % EV TTM'])}%<br>D/E: {format_metric(m['D/E'])}"
         )
-        print(f"| {i} | {m['Company Name']} ({m['Ticker']}) | {res['final_score']:.2f} | {details} | {', '.join(res['flags'])} | {res['positives']} | {res['risks']} |")
+        print(f"| {i} | {m['Company Name']} ({m['Ticker']}) | {res['final_score']:.2f} | {details} | {', '.join(result_flags(res))} | {result_positives(res)} | {result_risks(res)} |")
 
     # Step 5: Factor Sub-Lists (Top 3-5 per factor)
-    factors = ['value', 'momentum', 'quality', 'growth']
     print("\n#### Factor Sub-Lists (Top 3-5 per Factor)")
     for factor in factors:
-        sorted_by_factor = sorted(results, key=lambda x: x['factor_boosts'].get(factor, 0), reverse=True)
-        top_factor = sorted_by_factor[:5]  # Top 5
+        top_factor = [results[i] for i in factor_tops[factor]]  # Top 5
         print(f"**{factor.capitalize()}**:")
         for res in top_factor:
             if res['factor_boosts'][factor] > 0:
-                reason = f"High score due to relevant metrics (e.g., ROE: {res['metrics']['ROE']}%, Flags: {', '.join(res['flags'])})."
+                reason = f"High score due to relevant metrics (e.g., ROE: {format_metric(res['metrics']['ROE'])}%, Flags: {', '.join(result_flags(res))})."
                 print(f"- {res['metrics']['Company Name']} ({res['metrics']['Ticker']}): {reason}")
 
     # Warnings (Step 7 end)
     print("\n**Warnings**:")
-    high_pe = [r['metrics']['Ticker'] for r in results if get_float(r['metrics'], 'P/E') > 30]
+    high_pe_rows = np.flatnonzero([get_float(r['metrics'], 'P/E') > 30 for r in results])
+    high_pe = [results[i]['metrics']['Ticker'] for i in high_pe_rows[top_k([final_scores[high_pe_rows]])]]  # By score
     print(f"- High P/E stocks needing review: {', '.join(high_pe) if high_pe else 'None'}.")
     print("- Monitor debt burdens and market volatility.")
 
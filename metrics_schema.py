@@ -0,0 +1,91 @@
+import math
+
+import numpy as np
+
+from indicators import INDICATOR_KEYS
+
+MISSING = math.nan  # Missing numeric metric
+
+TEXT_FIELDS = ('Ticker', 'Company Name', 'Industry', 'Sector', 'Analyst Rating', 'Sentiment')
+MISSING_TEXT = 'N/A'  # Missing text field (a display label, e.g. an unknown sector)
+
+NUMERIC_FIELDS = (
+    'P/E', 'Forward P/E', 'ROE', 'D/E', 'P/B', 'PEG', 'Earnings Growth', 'Revenue Growth', 'Gross Margin',
+    'Net Profit Margin', 'FCF % EV TTM', 'EBITDA % EV TTM', 'Current Price', '52W High', '52W Low', 'Market Cap',
+    'EV', 'Total Cash', 'Total Debt', 'FCF Actual', 'EBITDA Actual', 'P/FCF', 'Beta', 'Dividend Yield',
+    'Average Volume', 'RSI', 'Analyst Mean', 'Target Price'
+) + tuple(INDICATOR_KEYS)
+
+# Missing-value policies for scoring (see get_float/scoring_column and processor.process_universe):
+# - ZERO: a missing value scores as 0.0, so it passes/fails thresholds like a 0 would and normalizes from 0.
+# - EXCLUDE: a missing value stays NaN, so it never meets a condition and earns no normalized score. Used for
+#   lower-is-better multiples, where 0 would otherwise rank an unknown P/E, D/E, ... as the best possible value.
+ZERO = 'zero'
+EXCLUDE = 'exclude'
+MISSING_POLICY = {field: ZERO for field in NUMERIC_FIELDS}
+MISSING_POLICY.update({field: EXCLUDE for field in ('P/E', 'Forward P/E', 'D/E', 'P/B', 'PEG', 'P/FCF', 'Beta')})
+
+MISSING_FILL = {field: 0.0 if policy == ZERO else MISSING for field, policy in MISSING_POLICY.items()}  # Scoring value of a missing metric
+
+def is_missing(value):
+    """
+    True for a missing numeric metric value (None or NaN).
+    """
+    return value is None or value != value
+
+def to_float(value):
+    """
+    Float of a numeric metric value, MISSING (NaN) for missing or non-numeric values.
+    """
+    if isinstance(value, bool) or is_missing(value):
+        return MISSING
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return MISSING
+
+def present(metrics, *keys):
+    """
+    True if every key has a (non-missing) value in the metrics record.
+    """
+    return not any(is_missing(metrics.get(key)) for key in keys)
+
+def metrics_record(values):
+    """
+    Typed metrics record from a dict of metric values: every NUMERIC_FIELDS entry is a float (NaN when missing),
+    every TEXT_FIELDS entry a string (MISSING_TEXT when missing). Other keys (timestamps, fetch ids) pass through.
+    """
+    record = dict(values)
+    for field in NUMERIC_FIELDS:
+        record[field] = to_float(values.get(field))
+    for field in TEXT_FIELDS:
+        value = values.get(field)
+        record[field] = MISSING_TEXT if value is None or value != value else str(value)
+    return record
+
+def get_float(metrics, key):
+    """
+    Scoring value of a metric: its float, or for a missing (NaN/absent) value the metric's MISSING_POLICY fill
+    (0.0, or NaN so every comparison on it is False).
+    """
+    val = metrics.get(key)
+    if val is None or val != val:
+        return MISSING_FILL.get(key, 0.0)
+    return float(val)
+
+def scoring_column(df, key):
+    """
+    Scoring values of one metric over a metrics frame (see processor.metrics_frame): missing values filled per
+    MISSING_POLICY, as get_float does.
+    """
+    fill = MISSING_FILL.get(key, 0.0)
+    if key not in df:
+        return np.full(len(df), fill)
+    values = df[key].to_numpy()
+    return values if fill != fill else np.where(np.isnan(values), fill, values)
+
+def format_metric(value, digits=2):
+    """
+    Display string for a numeric metric, rounded to `digits`; 'N/A' when missing.
+    """
+    return MISSING_TEXT if is_missing(value) else f"{round(float(value), digits)}"
@@ -1,6 +1,11 @@
 import streamlit as st
 import json
-from processor import DEFAULT_LOGIC
+import time
+import numpy as np
+import pandas as pd
+from conditions import describe_condition, validate_condition
+from processor import CONDITIONS, DEFAULT_LOGIC, compile_config
+from ranking import top_k
 
 st.title("Customize Processor Logic")
 
@@ -8,7 +13,7 @@ st.title("Customize Processor Logic")
 default_weights = {
     'P/E': 0.2, 'ROE': 0.15, 'D/E': 0.1, 'P/B': 0.1, 'PEG': 0.1,
     'Gross Margin': 0.1, 'Net Profit Margin': 0.1, 'FCF % EV TTM': 0.075,
-    'EBITDA % EV TTM': 0.075, 'Beta': 0.05, 'Dividend Yield': 0.05, 'Average Volume': 0.05, 'RSI': 0.05, 'Revenue Growth': 0.05, 'Earnings Growth': 0.05, 'Forward PE': 0.05
+    'EBITDA % EV TTM': 0.075, 'Beta': 0.05, 'Dividend Yield': 0.05, 'Average Volume': 0.05, 'RSI': 0.05, 'Revenue Growth': 0.05, 'Earnings Growth': 0.05, 'Forward P/E': 0.05
 }
 default_metrics = list(default_weights.keys())
 
@@ -20,8 +25,8 @@ presets = {
         'logic': DEFAULT_LOGIC.copy()
     },
     'Growth': {
-        'weights': {'Revenue Growth': 0.15, 'Earnings Growth': 0.15, 'PEG': 0.15, 'Forward PE': 0.1, 'D/E': 0.1, 'ROE': 0.1, 'Gross Margin': 0.1, 'Net Profit Margin': 0.1},
-        'metrics': ['Revenue Growth', 'Earnings Growth', 'PEG', 'Forward PE', 'D/E', 'ROE', 'Gross Margin', 'Net Profit Margin'],
+        'weights': {'Revenue Growth': 0.15, 'Earnings Growth': 0.15, 'PEG': 0.15, 'Forward P/E': 0.1, 'D/E': 0.1, 'ROE': 0.1, 'Gross Margin': 0.1, 'Net Profit Margin': 0.1},
+        'metrics': ['Revenue Growth', 'Earnings Growth', 'PEG', 'Forward P/E', 'D/E', 'ROE', 'Gross Margin', 'Net Profit Margin'],
         'logic': {k: v.copy() for k, v in DEFAULT_LOGIC.items()}  # Add boosts, e.g., GARP boost +20
     },
     'Momentum': {
@@ -44,6 +49,18 @@ if 'configs' not in st.session_state:
     st.session_state.configs = {k: v.copy() for k, v in presets.items()}  # Load presets
     # Rename default to Value if needed, but since Value is preset, it's covered
 
+def set_preview_baseline(label):
+    """
+    Snapshot of the edited config that the live preview's rank changes are measured against.
+    """
+    config = {
+        'weights': st.session_state.weights,
+        'metrics': st.session_state.selected_metrics,
+        'logic': st.session_state.logic,
+        'flags': st.session_state.custom_flags
+    }
+    st.session_state.preview_baseline = (label, json.loads(json.dumps(config)))
+
 # Preset selector
 preset = st.selectbox("Load Preset", list(presets.keys()))
 if st.button("Load Preset"):
@@ -52,6 +69,8 @@ if st.button("Load Preset"):
         st.session_state.weights = config['weights'].copy()
         st.session_state.selected_metrics = config['metrics'].copy()
         st.session_state.logic = config['logic'].copy()
+        st.session_state.custom_flags = {}
+        set_preview_baseline(f"preset '{preset}'")
         st.success(f"Loaded preset '{preset}'")
     else:
         st.warning("Preset not found.")
@@ -64,18 +83,26 @@ if st.button("Load Custom Config"):
         st.session_state.weights = config['weights']
         st.session_state.selected_metrics = config['metrics']
         st.session_state.logic = config['logic']
+        st.session_state.custom_flags = dict(config.get('flags', {}))
+        set_preview_baseline(f"config '{config_name}'")
         st.success(f"Loaded config '{config_name}'")
     else:
         st.warning("Config not found. Starting with defaults.")
         st.session_state.weights = default_weights.copy()
         st.session_state.selected_metrics = default_metrics.copy()
         st.session_state.logic = DEFAULT_LOGIC.copy()
+        st.session_state.custom_flags = {}
+        set_preview_baseline("the defaults")
 
 # Ensure session state is initialized
 if 'weights' not in st.session_state:
     st.session_state.weights = default_weights.copy()
     st.session_state.selected_metrics = default_metrics.copy()
     st.session_state.logic = DEFAULT_LOGIC.copy()
+if 'custom_flags' not in st.session_state:
+    st.session_state.custom_flags = {}
+if 'preview_baseline' not in st.session_state:
+    set_preview_baseline("the config loaded on the main page")
 
 # Auto-increment for new configs
 def get_unique_name(base_name):
@@ -91,7 +118,7 @@ if config_name.startswith("NewConfig"):
 
 # Metrics Selector
 st.subheader("Select Metrics to Include")
-available_metrics = ['P/E', 'ROE', 'D/E', 'P/B', 'PEG', 'Gross Margin', 'Net Profit Margin', 'FCF % EV TTM', 'EBITDA % EV TTM', 'Beta', 'Dividend Yield', 'Average Volume', 'RSI', 'Revenue Growth', 'Earnings Growth', 'Forward PE']
+available_metrics = ['P/E', 'ROE', 'D/E', 'P/B', 'PEG', 'Gross Margin', 'Net Profit Margin', 'FCF % EV TTM', 'EBITDA % EV TTM', 'Beta', 'Dividend Yield', 'Average Volume', 'RSI', 'Revenue Growth', 'Earnings Growth', 'Forward P/E']
 defaults = [m for m in st.session_state.get('selected_metrics', []) if m in available_metrics]
 st.session_state.selected_metrics = st.multiselect("Metrics", available_metrics, default=defaults)
 
@@ -118,8 +145,89 @@ for flag, data in DEFAULT_LOGIC.items():
         boost = st.slider(f"{flag} Boost", min_boost, max_boost, st.session_state.logic.get(flag, {}).get('boost', default_boost), 1)
     st.session_state.logic[flag] = {'enabled': enabled, 'boost': boost}
 
+# Custom flags: declarative conditions, compiled once into column masks when the config is scored
+st.subheader("Custom Flags")
+for flag, rule in list(st.session_state.custom_flags.items()):
+    entry = st.session_state.logic.get(flag, {'enabled': True, 'boost': 0})
+    st.write(f"**{flag}:** {describe_condition(rule)}")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        enabled = st.checkbox(f"Enable {flag}", value=entry['enabled'], key=f"custom_enabled_{flag}")
+    with col2:
+        boost = st.slider(f"{flag} Boost", -30, 30, max(-30, min(30, int(entry['boost']))), 1, key=f"custom_boost_{flag}")
+    st.session_state.logic[flag] = {'enabled': enabled, 'boost': boost}
+    with col3:
+        if st.button(f"Remove {flag}", key=f"custom_remove_{flag}"):
+            del st.session_state.custom_flags[flag]
+            st.session_state.logic.pop(flag, None)
+            st.rerun()
+
+new_flag = st.text_input("New Flag Name", value="")
+new_rule = st.text_area("Condition (JSON)", value='{"all": [["P/E", "<", 15], ["ROE", ">", 15]]}',
+                        help='Comparisons like ["P/E", "<", 15] or ["Total Cash", ">", "Total Debt"], '
+                             '["SMA 50", "present"], grouped with {"all": [...]}, {"any": [...]} or {"not": ...}.')
+if st.button("Add Flag"):
+    try:
+        if not new_flag.strip():
+            raise ValueError("Enter a flag name")
+        if new_flag in CONDITIONS:
+            raise ValueError(f"'{new_flag}' is a built-in flag")
+        rule = json.loads(new_rule)
+        validate_condition(rule)
+    except json.JSONDecodeError as e:
+        st.error(f"Condition is not valid JSON: {e}")
+    except ValueError as e:
+        st.error(f"Invalid flag: {e}")
+    else:
+        st.session_state.custom_flags[new_flag] = rule
+        st.session_state.logic.setdefault(new_flag, {'enabled': True, 'boost': 0})
+        st.rerun()
+
+# Validate the edited config once; the compiled plan is what every page scores with
+try:
+    plan = compile_config(st.session_state.weights, st.session_state.selected_metrics, st.session_state.logic, st.session_state.custom_flags)
+except ValueError as e:
+    plan = None
+    st.error(f"Invalid config: {e}")
+if plan is not None and plan.unscored:
+    st.info(f"No normalizer for {', '.join(plan.unscored)}: they add 0 to the base score but their weights still count toward the total.")
+
+# Live preview: the universe rescored with matrix products (processor.ScoreMatrix) on every edit, no full rescore
+st.subheader("Live Preview")
+store = st.session_state.get('universe_store')
+if store is None:
+    st.info("Open the main page once to load the universe for a live preview.")
+elif plan is not None:
+    preview_top = st.slider("Preview Top N", 5, 50, st.session_state.get('preview_top', 20), 5, key='preview_top')
+    matrix = store.score_matrix()
+    start = time.perf_counter()
+    scores = matrix.scores(plan)
+    rescore_time = time.perf_counter() - start
+    top = top_k([scores], preview_top)
+    baseline_name, baseline = st.session_state.preview_baseline
+    try:
+        baseline_plan = compile_config(baseline['weights'], baseline['metrics'], baseline['logic'], baseline['flags'])
+    except ValueError:
+        baseline_plan = None
+    baseline_ranks = None
+    if baseline_plan is not None:
+        baseline_ranks = np.empty(len(store), dtype=int)
+        baseline_ranks[top_k([matrix.scores(baseline_plan)])] = np.arange(1, len(store) + 1)
+    rows = []
+    for rank, row in enumerate(top, start=1):
+        entry = {'Rank': rank, 'Ticker': store.text['Ticker'][row], 'Company': store.text['Company Name'][row], 'Score': round(float(scores[row]), 2)}
+        if baseline_ranks is not None:
+            moved = int(baseline_ranks[row]) - rank
+            entry['Change'] = f"new (was {baseline_ranks[row]})" if baseline_ranks[row] > preview_top else f"▲{moved}" if moved > 0 else f"▼{-moved}" if moved < 0 else "–"
+        rows.append(entry)
+    st.dataframe(pd.DataFrame(rows), hide_index=True)
+    if baseline_ranks is not None:
+        entered = int((baseline_ranks[top] > preview_top).sum())
+        st.caption(f"Rank changes vs {baseline_name}: {entered} new in the top {preview_top}. "
+                   f"Rescored {len(store)} stocks in {rescore_time * 1000:.2f}ms.")
+
 # Save
-if st.button("Save Config"):
+if plan is not None and st.button("Save Config"):
     if config_name in presets:
         st.warning("Cannot overwrite preset. Please rename to save.")
         new_name = st.text_input("New Name", value=get_unique_name(config_name + "_copy"))
@@ -127,15 +235,19 @@ if st.button("Save Config"):
             st.session_state.configs[new_name] = {
                 'weights': st.session_state.weights.copy(),
                 'metrics': st.session_state.selected_metrics.copy(),
-                'logic': st.session_state.logic.copy()
+                'logic': st.session_state.logic.copy(),
+                'flags': st.session_state.custom_flags.copy()
             }
+            set_preview_baseline(f"config '{new_name}'")
             st.success(f"Saved as '{new_name}'")
     else:
         st.session_state.configs[config_name] = {
             'weights': st.session_state.weights.copy(),
             'metrics': st.session_state.selected_metrics.copy(),
-            'logic': st.session_state.logic.copy()
+            'logic': st.session_state.logic.copy(),
+            'flags': st.session_state.custom_flags.copy()
         }
+        set_preview_baseline(f"config '{config_name}'")
         st.success(f"Saved config '{config_name}'")
 
 # JSON Export/Import
@@ -143,7 +255,8 @@ st.subheader("Export/Import Config")
 config_data = {
     'weights': st.session_state.weights,
     'metrics': st.session_state.selected_metrics,
-    'logic': st.session_state.logic
+    'logic': st.session_state.logic,
+    'flags': st.session_state.custom_flags
 }
 st.download_button("Export JSON", data=json.dumps(config_data), file_name=f"{config_name}.json", mime="application/json")
 
@@ -152,5 +265,10 @@ if uploaded_file:
     imported = json.load(uploaded_file)
     import_name = st.text_input("Name for Imported Config", value="imported")
     if st.button("Save Imported Config"):
-        st.session_state.configs[import_name] = imported
-        st.success(f"Imported and saved as '{import_name}'. Edit and save if needed.")
\ No newline at end of file
+        try:
+            compile_config(imported.get('weights'), imported.get('metrics'), imported.get('logic', DEFAULT_LOGIC), imported.get('flags'))
+        except (ValueError, AttributeError, TypeError) as e:
+            st.error(f"Invalid config file: {e}")
+        else:
+            st.session_state.configs[import_name] = imported
+            st.success(f"Imported and saved as '{import_name}'. Edit and save if needed.")
\ No newline at end of file
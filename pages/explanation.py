@@ -9,7 +9,7 @@ QuanticScreen is a web tool for screening and analyzing stocks. It pulls financi
 Key pages:
 - **Main**: Select dataset/config, apply filters (sectors, flags Any/All, top N, search), view ranked table, export CSV.
 - **Stock Summary**: Search dropdown (type to filter existing tickers), auto-loads details: all metrics (formatted/rounded), flags, bullet positives, 52W bar, 1Y graph, analyst sentiment, 4x3 rankings (by preset vs. All/Category/Sector).
-- **Customize**: Edit weights (0-0.3), metrics, flag enables/boosts; save new configs (presets read-only).
+- **Customize**: Edit weights (0-0.3), metrics, flag enables/boosts, add custom flags; save new configs (presets read-only).
 - **Manage (Admin)**: Password-protected; refresh stale, add/refresh/delete tickers (rate-limited), prune old data.
 - **Explanation**: This page!
 
@@ -18,7 +18,7 @@ Data refreshes in background for stale metrics (>12h or pre-last market close),
 
 st.header("Metrics Explained")
 st.write("""
-Metrics are fetched from Yahoo Finance (yfinance) and used for scoring/rankings. 'N/A' if missing (logged; fallbacks for some like PEG = P/E / growth).
+Metrics are fetched from Yahoo Finance (yfinance) and used for scoring/rankings. Missing values are stored as NULL and shown as 'N/A' (logged; fallbacks for some like PEG = P/E / growth). In scoring, missing valuation/leverage metrics (P/E, Forward P/E, P/B, PEG, P/FCF, D/E, Beta) never meet a flag condition and add nothing to the base score; other missing metrics count as 0.
 
 - **P/E (Price/Earnings)**: Stock price vs. earnings—lower (<15) often undervalued.
 - **ROE (Return on Equity %)**: Profit from equity—high (>15%) shows efficiency.
@@ -35,7 +35,7 @@ Metrics are fetched from Yahoo Finance (yfinance) and used for scoring/rankings.
 - **Average Volume**: Trading liquidity—high better.
 - **RSI (Relative Strength Index)**: Momentum (0-100)—<30 oversold, >70 overbought.
 - **Revenue/Earnings Growth %**: Recent quarterly—high (>10%) growth.
-- **Forward PE**: Future P/E—low suggests undervalued.
+- **Forward P/E**: Future P/E—low suggests undervalued.
 - **Analyst Rating/Mean/Target Price/Sentiment**: Aggregated opinions (Bullish/Neutral/Bearish based on mean 1-5).
 - **Current Price/52W High/Low/Market Cap/EV/Total Cash/Debt/FCF/EBITDA Actual**: Raw values for context.
 
@@ -55,15 +55,16 @@ Flags trigger based on conditions, adding boosts/penalties to scores. Positives
 - **Momentum Building (+5%)**: Price >90% 52W High, EBITDA/EV >5%.
 - **Debt Burden (-15%)**: D/E >2, FCF/EV <1.
 
-Customize in Customize page—enable/disable, adjust boosts. Rankings grid shows position by preset (Value/Growth/etc.) vs. All/Category/Sector.
+Customize in Customize page—enable/disable, adjust boosts, or add your own flags as JSON conditions, e.g. {"all": [["P/E", "<", 15], ["ROE", ">", 15]]} (groups: all/any/not; comparisons against a number, another metric or a scaled metric; ["SMA 50", "present"]/"missing" checks). Custom flags are saved with the config. Rankings grid shows position by preset (Value/Growth/etc.) vs. All/Category/Sector.
 """)
 
 st.header("Usage Tips")
 st.write("""
 - **Getting Started**: If table empty, use Manage (admin password) to add tickers (e.g., from defaults like AAPL, MSFT) or refresh. Custom sets: Enter name/tickers—auto-fetches missing metrics for existing stocks, warns/skips new (add via Manage).
 - **Datasets**: 'All' for full DB; cap categories (Mega/Large/etc.); sectors; presets filter by scores; custom browser-saved.
-- **Configs**: Presets balanced (Overall) or focused (e.g., Growth emphasizes PEG/growth). Save edits as new.
-- **Filters**: Require flags (Any/All for combos), search partial ticker/company, top N (slider), exclude negatives.
+- **Configs**: Presets balanced (Overall) or focused (e.g., Growth emphasizes PEG/growth). Save edits as new. The Customize page's Live Preview re-ranks the universe as you move sliders (open the main page first to load it); Change is the rank move vs the config you loaded or last saved.
+- **Filters**: Require flags (Any/All/None for combos; the sidebar's Flag Counts shows how many stocks have each flag), search partial ticker/company, top N (slider), exclude negatives.
+- **Screen Query**: Free-form screen, e.g. sector = "Technology" and P/E < 20 and flags has GARP. Metrics compare with < <= > >= = != against numbers (2B, 500M) or other metrics (Total Cash > Total Debt), or check 'RSI is missing'; sector/industry/cap/ticker/name use =, !=, in (...) and contains; flags has <flag> or flags has any/all/none (<flag>, ...); combine with and/or/not and parentheses. The full screen (dataset and filters included) is shown under Share Screen, and the query is kept in the page URL for sharing.
 - **Summary**: Dropdown filters as you type (client-side, no refresh); auto-loads on select. Graph/bar refresh if >24h stale.
 - **Admin**: Cooldowns prevent abuse (e.g., 1h add/refresh). Prune olds to save space.
 - **Background Refresh**: Runs in session; checks close-date (fetches if pre-last close, even weekends). Logs in console.
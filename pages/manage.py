@@ -5,8 +5,9 @@ import re
 import random
 from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy import select
-from db import get_latest_metrics, get_stale_tickers, save_metrics, Session, Stock, MetricFetch, ProcessedResult, prune_old_metrics
-from fetcher import StockFetcher
+from db import get_latest_metrics, get_stale_tickers, save_metrics, Session, Stock, MetricFetch, ProcessedResult, PriceHistory, prune_old_metrics, get_price_histories, save_price_history
+from executor import FetchExecutor
+from throttle import get_shared_controller
 
 def manage_page():
     st.title("Manage Page")
@@ -25,6 +26,13 @@ def manage_page():
 
     st.success("Authenticated as admin.")
 
+    # Upstream fetch status (adaptive concurrency, circuit breaker)
+    st.subheader("Fetch Status")
+    fetch_state = get_shared_controller().state()
+    if fetch_state['breaker'] != 'closed':
+        st.warning(f"Yahoo throttling detected: circuit {fetch_state['breaker']}, retry in {fetch_state['breaker_retry_after_s']:.0f}s.")
+    st.json(fetch_state)
+
     # Manual Refresh Button
     st.subheader("Manual Refresh All Stale")
     if st.button("Manual Refresh All Stale"):
@@ -41,24 +49,20 @@ def manage_page():
                 if not stale_tickers:
                     st.info("No stale tickers found.")
                 else:
-                    fetcher = StockFetcher()
-                    batch_size = random.randint(5, 10)
+                    executor = FetchExecutor(history_source=get_price_histories, history_sink=save_price_history)
                     total = len(stale_tickers)
                     done = 0
-                    for i in range(0, total, batch_size):
-                        batch = stale_tickers[i:i + batch_size]
-                        for t in batch:
-                            try:
-                                metrics = fetcher.fetch_metrics(t)
-                                if metrics:
-                                    save_metrics(metrics)
-                                    logging.info(f"Manual fetch: updated {t}")
-                            except Exception as e:
-                                logging.error(f"Manual fetch error {t}: {e}")
-                            time.sleep(random.randint(5, 10))
-                            done += 1
-                            progress.progress(done / total)
-                        time.sleep(random.randint(5, 10))
+                    previous = {t: get_latest_metrics(t) for t in stale_tickers}
+                    for t, metrics in executor.iter_tiered(stale_tickers, previous):
+                        try:
+                            if metrics:
+                                save_metrics(metrics)
+                                logging.info(f"Manual fetch: updated {t}")
+                        except Exception as e:
+                            logging.error(f"Manual fetch error {t}: {e}")
+                        done += 1
+                        progress.progress(done / total)
+                    st.info(executor.throughput_summary())
                     st.success("Manual refresh completed.")
                     # Prune old metrics after manual refresh
                     prune_old_metrics()
@@ -81,10 +85,9 @@ def manage_page():
                 existing = [t for t in tickers if get_latest_metrics(t)]
                 new_ones = [t for t in tickers if not get_latest_metrics(t)]
                 all_to_fetch = new_ones + existing
-                fetcher = StockFetcher()
-                for t in all_to_fetch:
+                executor = FetchExecutor(history_source=get_price_histories, history_sink=save_price_history)
+                for t, metrics in executor.iter_metrics(all_to_fetch):
                     try:
-                        metrics = fetcher.fetch_metrics(t)
                         if metrics:
                             try:
                                 stmt = insert(Stock).values(ticker=t, company_name=metrics.get('Company Name', 'N/A'), industry=metrics.get('Industry', 'N/A'), sector=metrics.get('Sector', 'N/A'))
@@ -112,7 +115,6 @@ def manage_page():
                             st.error(f"Failed to fetch {t}")
                     except Exception as e:
                         st.error(f"Error fetching {t}: {e}")
-                    time.sleep(random.randint(5, 10))
 
     # Delete Stocks
     st.subheader("Delete Stocks")
@@ -135,6 +137,8 @@ def manage_page():
                         session.query(ProcessedResult).filter(ProcessedResult.fetch_id.in_(subq)).delete(synchronize_session=False)
                         # Delete MetricFetches
                         session.query(MetricFetch).filter_by(ticker=ticker).delete(synchronize_session=False)
+                        # Delete PriceHistory (foreign key to Stock)
+                        session.query(PriceHistory).filter_by(ticker=ticker).delete(synchronize_session=False)
                         # Delete Stock
                         session.query(Stock).filter_by(ticker=ticker).delete(synchronize_session=False)
                         session.commit()
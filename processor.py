@@ -1,9 +1,16 @@
-def get_float(metrics, key):
-    """
-    Helper to get float value from metrics dict or 0 if N/A/missing.
-    """
-    val = metrics.get(key, 'N/A')
-    return float(val) if val != 'N/A' else 0.0
+from collections import OrderedDict
+import hashlib
+import json
+import math
+import threading
+from types import MappingProxyType
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from conditions import Condition, canonical_condition, validate_condition
+from metrics_schema import MISSING, NUMERIC_FIELDS, get_float, is_missing, present, scoring_column
 
 def format_large(val):
     if val >= 1e9:
@@ -17,7 +24,7 @@ def get_cap_category(market_cap):
     """
     Return cap category string based on market cap.
     """
-    if market_cap == 'N/A':
+    if is_missing(market_cap):
         return 'Unknown'
     try:
         cap = float(market_cap)
@@ -36,33 +43,125 @@ def get_cap_category(market_cap):
     except (ValueError, TypeError):
         return 'Unknown'
 
-CONDITIONS = {
-    'Undervalued': lambda m: get_float(m, 'P/E') < 15 and get_float(m, 'ROE') > 15,
-    'Strong Balance Sheet': lambda m: get_float(m, 'D/E') < 1 and get_float(m, 'Total Cash') > get_float(m, 'Total Debt'),
-    'Quality Moat': lambda m: get_float(m, 'Gross Margin') > 40 and get_float(m, 'Net Profit Margin') > 15 and get_float(m, 'FCF % EV TTM') > 5,
-    'GARP': lambda m: get_float(m, 'PEG') < 1.5 and get_float(m, 'P/E') < 20,
-    'High-Risk Growth': lambda m: get_float(m, 'P/E') > 30 and get_float(m, 'PEG') < 1,
-    'Value Trap': lambda m: get_float(m, 'P/B') < 1.5 and get_float(m, 'ROE') < 5,
-    'Momentum Building': lambda m: get_float(m, 'Current Price') > 0.9 * get_float(m, '52W High') and get_float(m, 'EBITDA % EV TTM') > 5,
-    'Debt Burden': lambda m: get_float(m, 'D/E') > 2 and get_float(m, 'FCF % EV TTM') < 1
+def near_52w_high_rule(within=10):
+    """
+    Condition (see conditions.py): price within `within`% of its 52W high.
+    Uses the close-based '% From 52W High' indicator when attached (see indicators.py), else Current Price/52W High.
+    """
+    return {'any': [
+        {'all': [['% From 52W High', 'present'], ['% From 52W High', '>', -within]]},
+        {'all': [['% From 52W High', 'missing'], ['Current Price', '>', {'field': '52W High', 'times': 1 - within / 100}]]}
+    ]}
+
+# 50-day SMA above the 200-day SMA; true when the SMAs aren't available so those stocks score as before
+UPTREND_RULE = {'any': [['SMA 50', 'missing'], ['SMA 200', 'missing'], ['SMA 50', '>', 'SMA 200']]}
+
+NEAR_52W_HIGH = {within: Condition(near_52w_high_rule(within)) for within in (10, 20)}  # Windows used by scoring
+UPTREND = Condition(UPTREND_RULE)
+
+def near_52w_high(metrics, within=10):
+    """
+    True if price is within `within`% of its 52W high (see near_52w_high_rule).
+    """
+    condition = NEAR_52W_HIGH.get(within) or Condition(near_52w_high_rule(within))
+    return condition(metrics)
+
+def in_uptrend(metrics):
+    """
+    True if the 50-day SMA is above the 200-day SMA, or the SMAs aren't available (see UPTREND_RULE).
+    """
+    return UPTREND(metrics)
+
+# Built-in flags as declarative conditions (format in conditions.py); custom flags use the same format
+FLAG_RULES = {
+    'Undervalued': {'all': [['P/E', '<', 15], ['ROE', '>', 15]]},
+    'Strong Balance Sheet': {'all': [['D/E', '<', 1], ['Total Cash', '>', 'Total Debt']]},
+    'Quality Moat': {'all': [['Gross Margin', '>', 40], ['Net Profit Margin', '>', 15], ['FCF % EV TTM', '>', 5]]},
+    'GARP': {'all': [['PEG', '<', 1.5], ['P/E', '<', 20]]},
+    'High-Risk Growth': {'all': [['P/E', '>', 30], ['PEG', '<', 1]]},
+    'Value Trap': {'all': [['P/B', '<', 1.5], ['ROE', '<', 5]]},
+    'Momentum Building': {'all': [near_52w_high_rule(10), UPTREND_RULE, ['EBITDA % EV TTM', '>', 5]]},
+    'Debt Burden': {'all': [['D/E', '>', 2], ['FCF % EV TTM', '<', 1]]}
+}
+
+CONDITIONS = {flag: Condition(rule) for flag, rule in FLAG_RULES.items()}  # Compiled once; call per stock or .mask(frame)
+
+FLAG_BITS = {flag: 1 << i for i, flag in enumerate(CONDITIONS)}  # Bit per flag in a result's flag_mask
+FLAG_LIMIT = 64  # Flags that fit a uint64 flag_mask; custom flags take the bits after FLAG_BITS (see compile_config)
+FLAG_MATCHES = ('any', 'all', 'none')  # Modes of match_flags
+
+FLAG_DESCRIPTIONS = {
+    'Undervalued': lambda m: f"Undervalued with P/E {round(get_float(m, 'P/E'), 2)} and ROE {round(get_float(m, 'ROE'), 2)}%" if present(m, 'P/E', 'ROE') else 'Undervalued',
+    'Strong Balance Sheet': lambda m: f"Strong balance sheet with D/E {round(get_float(m, 'D/E'), 2)} and cash exceeding debt" if present(m, 'D/E', 'Total Cash', 'Total Debt') else 'Strong Balance Sheet',
+    'Quality Moat': lambda m: f"Quality moat with margins {round(get_float(m, 'Gross Margin'), 2)}%/{round(get_float(m, 'Net Profit Margin'), 2)}% and FCF/EV {round(get_float(m, 'FCF % EV TTM'), 2)}%" if present(m, 'Gross Margin', 'Net Profit Margin', 'FCF % EV TTM') else 'Quality Moat',
+    'GARP': lambda m: f"GARP with PEG {round(get_float(m, 'PEG'), 2)} and P/E {round(get_float(m, 'P/E'), 2)}" if present(m, 'PEG', 'P/E') else 'GARP',
+    'High-Risk Growth': lambda m: f"High-risk growth with P/E {round(get_float(m, 'P/E'), 2)} and PEG {round(get_float(m, 'PEG'), 2)}" if present(m, 'P/E', 'PEG') else 'High-Risk Growth',
+    'Value Trap': lambda m: f"Value trap with P/B {round(get_float(m, 'P/B'), 2)} and ROE {round(get_float(m, 'ROE'), 2)}%" if present(m, 'P/B', 'ROE') else 'Value Trap',
+    'Momentum Building': lambda m: f"Momentum building near 52W high with EBITDA/EV {round(get_float(m, 'EBITDA % EV TTM'), 2)}%" if present(m, 'Current Price', '52W High', 'EBITDA % EV TTM') else 'Momentum Building',
+    'Debt Burden': lambda m: f"Debt burden with D/E {round(get_float(m, 'D/E'), 2)} and FCF/EV {round(get_float(m, 'FCF % EV TTM'), 2)}%" if present(m, 'D/E', 'FCF % EV TTM') else 'Debt Burden'
 }
 
 def get_flag_description(flag, metrics):
     """
     Returns a descriptive string for the given flag based on key metrics.
-    Handles N/A gracefully by falling back to flag name if required metrics are missing.
-    """
-    descriptions = {
-        'Undervalued': lambda m: f"Undervalued with P/E {round(get_float(m, 'P/E'), 2)} and ROE {round(get_float(m, 'ROE'), 2)}%" if m.get('P/E', 'N/A') != 'N/A' and m.get('ROE', 'N/A') != 'N/A' else 'Undervalued',
-        'Strong Balance Sheet': lambda m: f"Strong balance sheet with D/E {round(get_float(m, 'D/E'), 2)} and cash exceeding debt" if m.get('D/E', 'N/A') != 'N/A' and m.get('Total Cash', 'N/A') != 'N/A' and m.get('Total Debt', 'N/A') != 'N/A' else 'Strong Balance Sheet',
-        'Quality Moat': lambda m: f"Quality moat with margins {round(get_float(m, 'Gross Margin'), 2)}%/{round(get_float(m, 'Net Profit Margin'), 2)}% and FCF/EV {round(get_float(m, 'FCF % EV TTM'), 2)}%" if all(m.get(k, 'N/A') != 'N/A' for k in ['Gross Margin', 'Net Profit Margin', 'FCF % EV TTM']) else 'Quality Moat',
-        'GARP': lambda m: f"GARP with PEG {round(get_float(m, 'PEG'), 2)} and P/E {round(get_float(m, 'P/E'), 2)}" if m.get('PEG', 'N/A') != 'N/A' and m.get('P/E', 'N/A') != 'N/A' else 'GARP',
-        'High-Risk Growth': lambda m: f"High-risk growth with P/E {round(get_float(m, 'P/E'), 2)} and PEG {round(get_float(m, 'PEG'), 2)}" if m.get('P/E', 'N/A') != 'N/A' and m.get('PEG', 'N/A') != 'N/A' else 'High-Risk Growth',
-        'Value Trap': lambda m: f"Value trap with P/B {round(get_float(m, 'P/B'), 2)} and ROE {round(get_float(m, 'ROE'), 2)}%" if m.get('P/B', 'N/A') != 'N/A' and m.get('ROE', 'N/A') != 'N/A' else 'Value Trap',
-        'Momentum Building': lambda m: f"Momentum building near 52W high with EBITDA/EV {round(get_float(m, 'EBITDA % EV TTM'), 2)}%" if m.get('Current Price', 'N/A') != 'N/A' and m.get('52W High', 'N/A') != 'N/A' and m.get('EBITDA % EV TTM', 'N/A') != 'N/A' else 'Momentum Building',
-        'Debt Burden': lambda m: f"Debt burden with D/E {round(get_float(m, 'D/E'), 2)} and FCF/EV {round(get_float(m, 'FCF % EV TTM'), 2)}%" if m.get('D/E', 'N/A') != 'N/A' and m.get('FCF % EV TTM', 'N/A') != 'N/A' else 'Debt Burden'
-    }
-    return descriptions.get(flag, lambda m: flag)(metrics)
+    Falls back to the flag name if required metrics are missing.
+    """
+    describe = FLAG_DESCRIPTIONS.get(flag)
+    return describe(metrics) if describe else flag
+
+def flag_mask(flags, bits=FLAG_BITS):
+    """
+    Bitmask for a list of flag names, e.g. to filter results by required flags.
+    bits: flag -> bit, FLAG_BITS or a plan's flag_bits when custom flags are involved (unknown flags add no bit).
+    """
+    mask = 0
+    for flag in flags:
+        mask |= bits.get(flag, 0)
+    return mask
+
+def match_flags(flag_masks, mask, mode='any'):
+    """
+    Boolean array: which rows of a flag_mask column have any, all or none of the flags in mask (see flag_mask).
+    One bitwise operation per row, however many flags mask holds.
+    """
+    hits = flag_masks & flag_masks.dtype.type(mask)
+    if mode == 'any':
+        return hits != 0
+    if mode == 'all':
+        return hits == mask
+    if mode == 'none':
+        return hits == 0
+    raise ValueError(f"Flag match must be one of {', '.join(FLAG_MATCHES)}, got {mode!r}")
+
+def flag_counts(flag_masks, flag_bits=FLAG_BITS):
+    """
+    Number of rows of a flag_mask column with each flag, as a dict flag -> count (e.g. for the sidebar).
+    Counts every bit in one pass over the column's bytes rather than one pass per flag.
+    """
+    flag_masks = np.ascontiguousarray(flag_masks, dtype=flag_masks.dtype.newbyteorder('<'))
+    bits = np.unpackbits(flag_masks.view(np.uint8).reshape(len(flag_masks), flag_masks.dtype.itemsize), axis=1, bitorder='little')
+    totals = bits.sum(axis=0)
+    return {flag: int(totals[bit.bit_length() - 1]) if bit.bit_length() <= len(totals) else 0 for flag, bit in flag_bits.items()}
+
+def result_flags(result):
+    """
+    Names of the flags a scored result triggered, in its config's logic order.
+    """
+    return [flag for flag in result['boosts'] if result['flag_mask'] & result['flag_bits'][flag]]
+
+def result_positives(result):
+    """
+    Flag descriptions for a scored result, built on demand when it is rendered (table, CSV export, summary).
+    """
+    positives = [get_flag_description(flag, result['metrics']) for flag in result_flags(result)]
+    return positives or ["Solid fundamentals based on available metrics."]
+
+def result_risks(result):
+    """
+    Negative-boost flags of a scored result with their boosts, e.g. 'Debt Burden (-15%) '.
+    """
+    risks = ''.join(f"{flag} ({result['boosts'][flag]}%) " for flag in result_flags(result) if result['boosts'][flag] < 0)
+    return risks or "Low risks based on available metrics."
 
 DEFAULT_LOGIC = {
     'Undervalued': {'enabled': True, 'boost': 15},
@@ -119,11 +218,184 @@ PRESETS = {
     }
 }
 
-def process_stock(metrics, weights=None, selected_metrics=None, logic=DEFAULT_LOGIC):
+DEFAULT_WEIGHTS = {'P/E': 0.2, 'ROE': 0.2, 'P/B': 0.1, 'PEG': 0.15, 'Gross Margin': 0.1, 'Net Profit Margin': 0.1, 'FCF % EV TTM': 0.1, 'EBITDA % EV TTM': 0.05}
+
+METRIC_NORMALIZERS = {
+    'P/E': lambda v: max(0, min(100, 100 - (v * 2))),  # Low better, good <50
+    'ROE': lambda v: max(0, min(100, v * 4)),  # High better, good >25
+    'D/E': lambda v: max(0, min(100, 100 - (v * 50))),  # Low better, good <2
+    'P/B': lambda v: max(0, min(100, 100 - (v * 20))),  # Low better, good <5
+    'PEG': lambda v: max(0, min(100, 100 - (v * 50))),  # Low better, good <2
+    'Gross Margin': lambda v: max(0, min(100, v)),  # High better, %
+    'Net Profit Margin': lambda v: max(0, min(100, v)),  # High better, %
+    'FCF % EV TTM': lambda v: max(0, min(100, v * 10)),  # High better, good >10%
+    'EBITDA % EV TTM': lambda v: max(0, min(100, v * 10)),  # High better
+}
+
+# Vectorized counterparts of METRIC_NORMALIZERS (same clipping)
+COLUMN_NORMALIZERS = {
+    'P/E': lambda v: np.clip(100 - (v * 2), 0, 100),
+    'ROE': lambda v: np.clip(v * 4, 0, 100),
+    'D/E': lambda v: np.clip(100 - (v * 50), 0, 100),
+    'P/B': lambda v: np.clip(100 - (v * 20), 0, 100),
+    'PEG': lambda v: np.clip(100 - (v * 50), 0, 100),
+    'Gross Margin': lambda v: np.clip(v, 0, 100),
+    'Net Profit Margin': lambda v: np.clip(v, 0, 100),
+    'FCF % EV TTM': lambda v: np.clip(v * 10, 0, 100),
+    'EBITDA % EV TTM': lambda v: np.clip(v * 10, 0, 100),
+}
+
+PLAN_CACHE_SIZE = 32  # Compiled plans kept (presets + a few custom configs)
+
+def _zero(v):
+    return 0
+
+def _zero_column(v):
+    return np.zeros_like(v)
+
+def _normalized(normalize, value):
+    """
+    Normalized score of a metric value; an excluded missing value (NaN) scores 0.
+    """
+    return normalize(value) if value == value else 0
+
+class ScoringPlan(NamedTuple):
+    """
+    Immutable, pre-resolved form of a (weights, selected_metrics, logic) config, built once by compile_config:
+    - metrics: selected metrics in scoring order; normalizers/column_normalizers: matching scalar/vectorized normalizers
+      (metrics without one score 0 and are listed in unscored).
+    - weights: raw weight per selected metric; weight_total: sum of all config weights (the base-score divisor);
+      weight_vector: weights / weight_total as a read-only array (zeros if the total is 0).
+    - flags: (flag, boost) for each enabled flag with a condition, in logic order; boosts: read-only flag -> boost;
+      conditions: the compiled Condition of each entry in flags.
+    - flag_bits: read-only flag -> flag_mask bit for the built-in and the config's custom flags; flag_dtype: the
+      smallest unsigned dtype holding them (uint8 for the built-in flags), used for process_universe's flag_mask.
+    - key: stable config hash (see config_hash).
+    """
+    key: str
+    metrics: tuple
+    normalizers: tuple
+    column_normalizers: tuple
+    weights: tuple
+    weight_total: float
+    weight_vector: np.ndarray
+    flags: tuple
+    boosts: MappingProxyType
+    unscored: tuple
+    conditions: tuple
+    flag_bits: MappingProxyType
+    flag_dtype: np.dtype
+
+def _canonical_config(weights, selected_metrics, logic, flags=None):
+    """
+    Validates a config and returns its canonical JSON (metric order kept: it fixes the summation order).
+    flags: optional custom flags, name -> declarative condition (see conditions.py); enabled/boosted through logic
+    like the built-in ones.
+    Raises ValueError for non-numeric weights, selected metrics without a weight, malformed logic entries or
+    invalid custom flags.
+    """
+    if weights is None:
+        weights = DEFAULT_WEIGHTS
+    if selected_metrics is None:
+        selected_metrics = list(weights.keys())
+    for metric, weight in weights.items():
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)) or not math.isfinite(weight):
+            raise ValueError(f"Weight for '{metric}' must be a finite number, got {weight!r}")
+    missing = [m for m in selected_metrics if m not in weights]
+    if missing:
+        raise ValueError(f"No weight for selected metrics: {', '.join(missing)}")
+    for flag, entry in logic.items():
+        if not isinstance(entry, dict) or 'enabled' not in entry or 'boost' not in entry:
+            raise ValueError(f"Logic for '{flag}' needs 'enabled' and 'boost'")
+        if isinstance(entry['boost'], bool) or not isinstance(entry['boost'], (int, float)):
+            raise ValueError(f"Boost for '{flag}' must be a number, got {entry['boost']!r}")
+    config = {
+        'weights': [[metric, weights[metric]] for metric in weights],
+        'metrics': list(selected_metrics),
+        'logic': [[flag, bool(entry['enabled']), entry['boost']] for flag, entry in logic.items()]
+    }
+    if flags:
+        if not isinstance(flags, dict):
+            raise ValueError(f"Custom flags must map names to conditions, got {type(flags).__name__}")
+        if len(flags) > FLAG_LIMIT - len(FLAG_BITS):
+            raise ValueError(f"At most {FLAG_LIMIT - len(FLAG_BITS)} custom flags, got {len(flags)}")
+        for name, rule in flags.items():
+            if not isinstance(name, str) or not name.strip():
+                raise ValueError(f"Custom flag names must be non-empty strings, got {name!r}")
+            if name in CONDITIONS:
+                raise ValueError(f"Custom flag '{name}' has the name of a built-in flag")
+            try:
+                validate_condition(rule)
+            except ValueError as e:
+                raise ValueError(f"Custom flag '{name}': {e}") from None
+        config['flags'] = [[name, json.loads(canonical_condition(rule))] for name, rule in flags.items()]  # Only when present: hashes of configs without custom flags are unchanged
+    return json.dumps(config)
+
+def config_hash(weights=None, selected_metrics=None, logic=DEFAULT_LOGIC, flags=None):
+    """
+    Stable hash of a config: equal configs hash equal across runs/processes (e.g. for cache keys).
+    """
+    return hashlib.sha1(_canonical_config(weights, selected_metrics, logic, flags).encode()).hexdigest()
+
+_plan_cache = OrderedDict()
+_plan_cache_lock = threading.Lock()
+
+def compile_config(weights=None, selected_metrics=None, logic=DEFAULT_LOGIC, flags=None):
+    """
+    Validates a scoring config once and returns its ScoringPlan, from a bounded LRU (PLAN_CACHE_SIZE) keyed by config_hash.
+    Defaults match process_stock's. Custom flag conditions are compiled here, once per config.
+    Raises ValueError for invalid configs (see _canonical_config).
+    """
+    canonical = _canonical_config(weights, selected_metrics, logic, flags)
+    key = hashlib.sha1(canonical.encode()).hexdigest()
+    with _plan_cache_lock:
+        plan = _plan_cache.get(key)
+        if plan is not None:
+            _plan_cache.move_to_end(key)
+            return plan
+    config = json.loads(canonical)
+    weights = dict(config['weights'])
+    metrics = tuple(config['metrics'])
+    weight_total = sum(weights.values())
+    metric_weights = tuple(weights[m] for m in metrics)
+    weight_vector = np.array(metric_weights, dtype=float) / weight_total if weight_total > 0 else np.zeros(len(metrics))
+    weight_vector.setflags(write=False)
+    conditions = dict(CONDITIONS)
+    flag_bits = dict(FLAG_BITS)
+    for name, rule in config.get('flags', []):
+        conditions[name] = Condition(rule)
+        flag_bits[name] = 1 << len(flag_bits)
+    flags = tuple((flag, boost) for flag, enabled, boost in config['logic'] if enabled and flag in conditions)
+    plan = ScoringPlan(
+        key=key,
+        metrics=metrics,
+        normalizers=tuple(METRIC_NORMALIZERS.get(m, _zero) for m in metrics),
+        column_normalizers=tuple(COLUMN_NORMALIZERS.get(m, _zero_column) for m in metrics),
+        weights=metric_weights,
+        weight_total=weight_total,
+        weight_vector=weight_vector,
+        flags=flags,
+        boosts=MappingProxyType(dict(flags)),
+        unscored=tuple(m for m in metrics if m not in METRIC_NORMALIZERS),
+        conditions=tuple(conditions[flag] for flag, _ in flags),
+        flag_bits=MappingProxyType(flag_bits),
+        flag_dtype=np.min_scalar_type(max(flag_bits.values()))
+    )
+    with _plan_cache_lock:
+        _plan_cache[key] = plan
+        _plan_cache.move_to_end(key)
+        while len(_plan_cache) > PLAN_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
+    return plan
+
+def process_stock(metrics, weights=None, selected_metrics=None, logic=DEFAULT_LOGIC, flags=None, plan=None):
     """
     Processes a single stock's metrics per algorithm steps 2-5.
-    Returns dict with: base_score, final_score, flags (list), positives (str), risks (str), factor_boosts (dict for value/momentum/etc.).
-    Handles N/A as 0 for scoring.
+    flags: optional custom flags (see compile_config).
+    Returns dict with: base_score, final_score, flag_mask (flag_bits of triggered flags), boosts (the config's flag boosts),
+    flag_bits (the config's flag -> bit table), factor_boosts (dict for value/momentum/etc.), metrics and cap_category.
+    Flag names, positives and risks are derived on demand with result_flags/result_positives/result_risks.
+    Missing metrics follow their MISSING_POLICY (metrics_schema): 0.0, or excluded (NaN fails every condition and normalizes to 0).
     Overall flow: Score individual metrics (0-10), weight to base (0-100), apply multi-metric correlations for boosts/penalties/flags, add factor lens boosts.
     """
     # Use the top-level get_float
@@ -151,46 +423,28 @@ def process_stock(metrics, weights=None, selected_metrics=None, logic=DEFAULT_LO
     dividend = get_float(metrics, 'Dividend Yield')
     avg_volume = get_float(metrics, 'Average Volume')
 
-    if weights is None:
-        weights = {'P/E': 0.2, 'ROE': 0.2, 'P/B': 0.1, 'PEG': 0.15, 'Gross Margin': 0.1, 'Net Profit Margin': 0.1, 'FCF % EV TTM': 0.1, 'EBITDA % EV TTM': 0.05}
-    if selected_metrics is None:
-        selected_metrics = list(weights.keys())
-    metric_normalizers = {
-        'P/E': lambda v: max(0, min(100, 100 - (v * 2))),  # Low better, good <50
-        'ROE': lambda v: max(0, min(100, v * 4)),  # High better, good >25
-        'D/E': lambda v: max(0, min(100, 100 - (v * 50))),  # Low better, good <2
-        'P/B': lambda v: max(0, min(100, 100 - (v * 20))),  # Low better, good <5
-        'PEG': lambda v: max(0, min(100, 100 - (v * 50))),  # Low better, good <2
-        'Gross Margin': lambda v: max(0, min(100, v)),  # High better, %
-        'Net Profit Margin': lambda v: max(0, min(100, v)),  # High better, %
-        'FCF % EV TTM': lambda v: max(0, min(100, v * 10)),  # High better, good >10%
-        'EBITDA % EV TTM': lambda v: max(0, min(100, v * 10)),  # High better
-    }
-
-    norm_scores = {metric: metric_normalizers.get(metric, lambda v: 0)(get_float(metrics, metric)) for metric in selected_metrics}
-    base_score = sum(norm_scores[metric] * weights[metric] for metric in selected_metrics) / sum(weights.values()) if sum(weights.values()) > 0 else 0
+    if plan is None:
+        plan = compile_config(weights, selected_metrics, logic, flags)
+    if plan.weight_total > 0:
+        base_score = sum(_normalized(normalize, get_float(metrics, metric)) * weight
+                         for metric, normalize, weight in zip(plan.metrics, plan.normalizers, plan.weights)) / plan.weight_total
+    else:
+        base_score = 0
 
     # Step 4: Correlations & Flags (Boost/Penalty %)
-    flags = []
+    mask = 0
     boost_total = 0
-    positives = []
-    risks = ""
-    for flag in logic:
-        if logic[flag]['enabled'] and flag in CONDITIONS and CONDITIONS[flag](metrics):
-            flags.append(flag)
-            boost = logic[flag]['boost']
+    for (flag, boost), condition in zip(plan.flags, plan.conditions):
+        if condition(metrics):
+            mask |= plan.flag_bits[flag]
             boost_total += boost
-            desc = get_flag_description(flag, metrics)
-            positives.append(desc)
-            if boost < 0:
-                risks += f'{flag} ({boost}%) '
 
     # Step 5: Factor Lens (Extra Boosts, sub-rankings in main.py)
     factor_boosts = {
         # Value: Low P/FCF boosts value
         'value': 20 if p_fcf < 15 or (pb < 1.5 and roe > 15) else 10 if p_fcf < 20 else 0,
-        # Momentum: Price near 52W high, RSI in range, high volume, ROE >15
-        'momentum': 20 if price > 0.9 * high and 50 < rsi < 70 and avg_volume > 1000000 and roe > 15 else 10 if price > 0.8 * high else 0,
+        # Momentum: Price near 52W high in an uptrend (SMA 50 > SMA 200), RSI in range, high volume, ROE >15
+        'momentum': 20 if near_52w_high(metrics) and in_uptrend(metrics) and 50 < rsi < 70 and avg_volume > 1000000 and roe > 15 else 10 if near_52w_high(metrics, 20) else 0,
         # Quality: High ROE, low D/E, high margins, dividend >2%, low beta
         'quality': 20 if roe > 20 and de < 1 and gross > 40 and dividend > 2 and beta < 1 else 10 if roe > 15 and de < 1.5 else 0,
         # Growth: Low PEG, high revenue/earnings growth, reasonable forward PE, low D/E
@@ -201,24 +455,362 @@ def process_stock(metrics, weights=None, selected_metrics=None, logic=DEFAULT_LO
     # Final Score
     final_score = base_score + (base_score * (boost_total / 100)) + factor_boost_total
 
-    # If positives or risks are empty, use defaults
-    if not positives:
-        positives = ["Solid fundamentals based on available metrics."]
-    if not risks:
-        risks = "Low risks based on available metrics."
+    return _result(metrics, base_score, final_score, mask, factor_boosts, plan)
 
+def _result(metrics, base_score, final_score, mask, factor_boosts, plan):
+    """
+    Assembles the process_stock result dict (numbers and the flag bitmask only; text is built by result_positives/result_risks).
+    """
     return {
         'base_score': base_score,
         'final_score': final_score,
-        'flags': flags,
-        'positives': positives,
-        'risks': risks,
+        'flag_mask': mask,
+        'boosts': plan.boosts,  # Shared read-only plan tables, not per-result copies
+        'flag_bits': plan.flag_bits,
         'factor_boosts': factor_boosts,  # For sub-rankings
         'metrics': metrics,  # Original for details
-        'cap_category': get_cap_category(metrics.get('Market Cap', 'N/A'))
+        'cap_category': get_cap_category(metrics.get('Market Cap'))
+    }
+
+FACTORS = ['value', 'momentum', 'quality', 'growth']
+
+def metrics_frame(metrics_list):
+    """
+    Columnar view of a list of metrics records for process_universe: one row per stock (same order),
+    one float column per NUMERIC_FIELDS metric with NaN where the value is missing. Records are already typed
+    (see metrics_schema.metrics_record), so columns are built directly without per-value parsing.
+    """
+    return pd.DataFrame({field: [m.get(field, MISSING) for m in metrics_list] for field in NUMERIC_FIELDS},
+                        dtype=float)
+
+def _factor_columns(df, cache):
+    """
+    Factor boost array per FACTORS entry over a metrics_frame, with get_float semantics (missing values per MISSING_POLICY).
+    cache: field -> scoring column, shared with the flag condition masks of the same pass (see Condition.mask).
+    """
+    def col(key):
+        values = cache.get(key)
+        if values is None:
+            values = cache[key] = scoring_column(df, key)
+        return values
+    near_high = NEAR_52W_HIGH[10].mask(df, cache)
+    uptrend = UPTREND.mask(df, cache)
+
+    roe, de, pb, peg, rsi = col('ROE'), col('D/E'), col('P/B'), col('PEG'), col('RSI')
+    p_fcf = col('P/FCF')
+    return {
+        'value': np.where((p_fcf < 15) | ((pb < 1.5) & (roe > 15)), 20, np.where(p_fcf < 20, 10, 0)),
+        'momentum': np.where(near_high & uptrend & (50 < rsi) & (rsi < 70) & (col('Average Volume') > 1000000) & (roe > 15), 20,
+                             np.where(NEAR_52W_HIGH[20].mask(df, cache), 10, 0)),
+        'quality': np.where((roe > 20) & (de < 1) & (col('Gross Margin') > 40) & (col('Dividend Yield') > 2) & (col('Beta') < 1), 20,
+                            np.where((roe > 15) & (de < 1.5), 10, 0)),
+        'growth': np.where((peg < 1.5) & (col('Revenue Growth') > 10) & (col('Earnings Growth') > 10) & (col('Forward P/E') < 25) & (de < 1), 20,
+                           np.where(peg < 2, 10, 0))
     }
 
+def _base_scores(df, plan):
+    """
+    Weighted normalized base score (0-100) per row of a metrics_frame, in process_stock's operation order.
+    """
+    base_score = np.zeros(len(df))
+    if plan.weight_total > 0:
+        weighted = 0
+        for metric, normalize, weight in zip(plan.metrics, plan.column_normalizers, plan.weights):
+            values = scoring_column(df, metric)
+            weighted = weighted + np.where(np.isnan(values), 0.0, normalize(values)) * weight
+        base_score = base_score + weighted / plan.weight_total
+    return base_score
+
+def process_universe(df, weights=None, selected_metrics=None, logic=DEFAULT_LOGIC, flags=None, plan=None):
+    """
+    Vectorized process_stock over a metrics_frame: scores every stock with column operations instead of per-dict loops.
+    Returns DataFrame (same index as df) with base_score, final_score, boost_total, flag_mask (unsigned ints of
+    plan.flag_dtype; filter with match_flags), one bool column per enabled flag in logic order, and one
+    '<factor>_boost' column per FACTORS entry.
+    Each enabled flag's condition is evaluated once as a column mask (see conditions.Condition.mask).
+    Scores match process_stock exactly (same operation order); see universe_results for the per-stock dicts.
+    """
+    if plan is None:
+        plan = compile_config(weights, selected_metrics, logic, flags)
+    cache = {}
+    factors = _factor_columns(df, cache)
+    base_score = _base_scores(df, plan)
+
+    result = {'base_score': base_score}  # Columns collected first, one DataFrame built at the end
+    boost_total = np.zeros(len(df), dtype=int)
+    mask = np.zeros(len(df), dtype=plan.flag_dtype)
+    for (flag, boost), condition in zip(plan.flags, plan.conditions):
+        result[flag] = condition.mask(df, cache)
+        boost_total = boost_total + np.where(result[flag], boost, 0)
+        mask[result[flag]] |= plan.flag_bits[flag]
+    result['flag_mask'] = mask
+    factor_total = 0
+    for factor in FACTORS:
+        result[f'{factor}_boost'] = factors[factor]
+        factor_total = factor_total + factors[factor]
+    result['boost_total'] = boost_total
+    result['final_score'] = base_score + (base_score * (boost_total / 100)) + factor_total
+    return pd.DataFrame(result, index=df.index)
+
+def process_configs(df, plans):
+    """
+    Final scores of every stock under several configs at once, e.g. all PRESETS for the ranking grid.
+    plans: dict of name -> ScoringPlan. Conditions and factor boosts are evaluated once, base scores once per
+    distinct weighting, and boosts for all configs come from one (configs x flags) boost matrix times the
+    (flags x stocks) condition masks, so the cost barely grows with the number of configs.
+    Returns DataFrame (same index as df) with one final-score column per name, equal to process_universe's final_score.
+    """
+    names = list(plans)
+    cache = {}
+    factors = _factor_columns(df, cache)
+    factor_total = 0
+    for factor in FACTORS:
+        factor_total = factor_total + factors[factor]
+
+    bases = {}
+    for plan in plans.values():
+        weighting = (plan.metrics, plan.weights, plan.weight_total)
+        if weighting not in bases:
+            bases[weighting] = _base_scores(df, plan)
+    base = np.array([bases[(plans[n].metrics, plans[n].weights, plans[n].weight_total)] for n in names]).reshape(len(names), len(df))
+
+    conditions = {}  # Condition key -> Condition, so configs sharing a condition evaluate it once
+    boosts = []
+    for name in names:
+        plan_boosts = {}
+        for (flag, boost), condition in zip(plans[name].flags, plans[name].conditions):
+            conditions.setdefault(condition.key, condition)
+            plan_boosts[condition.key] = plan_boosts.get(condition.key, 0) + boost
+        boosts.append(plan_boosts)
+    masks = np.array([condition.mask(df, cache) for condition in conditions.values()], dtype=int).reshape(len(conditions), len(df))
+    boost_matrix = np.array([[plan_boosts.get(key, 0) for key in conditions] for plan_boosts in boosts], dtype=int).reshape(len(names), len(conditions))
+    boost_total = boost_matrix @ masks
+
+    final = base + (base * (boost_total / 100)) + factor_total
+    return pd.DataFrame(final.T, index=df.index, columns=names)
+
+class ScoreMatrix:
+    """
+    Final scores of a metrics_frame split into parts that are linear in a config, so a config is rescored without
+    touching the metrics again (e.g. live previews while weights and boosts are edited):
+    - normalized: read-only (stocks x metrics) matrix of METRIC_NORMALIZERS scores (0 for excluded missing values);
+      a config's base scores are normalized @ weights(plan).
+    - flag_matrix: read-only (stocks x flags) 0/1 matrix of condition masks, one column per flag_keys entry (the
+      built-in CONDITIONS, then custom conditions as configs bring them); boost totals are flag_matrix @ boosts(plan).
+    - factors: read-only FACTORS boost arrays; factor_total: their sum per stock, the same for every config.
+    Scores equal process_universe's final_score up to float rounding (the products sum in another order);
+    scores_many rates a whole batch of configs with the same two products (see sweep.py).
+    Built once per data version (see UniverseStore.score_matrix) and shared read-only across sessions.
+    """
+    def __init__(self, df):
+        self.metrics = tuple(METRIC_NORMALIZERS)
+        self.columns = {metric: i for i, metric in enumerate(self.metrics)}
+        self._frame = df
+        self._cache = {}
+        normalized = np.zeros((len(df), len(self.metrics)))
+        for i, metric in enumerate(self.metrics):
+            values = self._column(metric)
+            normalized[:, i] = np.where(np.isnan(values), 0.0, COLUMN_NORMALIZERS[metric](values))
+        normalized.setflags(write=False)
+        self.normalized = normalized
+        self.factors = {}
+        factor_total = np.zeros(len(df))
+        for factor, values in _factor_columns(df, self._cache).items():
+            self.factors[factor] = np.array(values)
+            self.factors[factor].setflags(write=False)
+            factor_total = factor_total + values
+        factor_total.setflags(write=False)
+        self.factor_total = factor_total
+        self._lock = threading.Lock()
+        self.flag_keys = ()
+        self.flag_matrix = np.zeros((len(df), 0))
+        self._add_conditions(CONDITIONS.values())
+
+    def _column(self, metric):
+        values = self._cache.get(metric)
+        if values is None:
+            values = self._cache[metric] = scoring_column(self._frame, metric)
+        return values
+
+    def _add_conditions(self, conditions):
+        """
+        Appends a flag_matrix column for each condition not in flag_keys yet (a new matrix, so readers never see a
+        partly built one).
+        """
+        with self._lock:
+            new = {}
+            for condition in conditions:
+                if condition.key not in self.flag_keys and condition.key not in new:
+                    new[condition.key] = condition.mask(self._frame, self._cache)
+            if new:
+                matrix = np.column_stack([self.flag_matrix, *new.values()]).astype(float)
+                matrix.setflags(write=False)
+                self.flag_matrix, self.flag_keys = matrix, self.flag_keys + tuple(new)
+
+    def weights(self, plan):
+        """
+        The plan's weight_vector spread over the normalized columns (metrics without a normalizer add nothing).
+        """
+        vector = np.zeros(len(self.metrics))
+        for metric, weight in zip(plan.metrics, plan.weight_vector):
+            if metric in self.columns:
+                vector[self.columns[metric]] += weight
+        return vector
+
+    def boosts(self, plan):
+        """
+        The plan's enabled flag boosts over the flag_matrix columns, adding columns for new custom conditions.
+        Returns (flag_matrix, boosts): the matrix the vector is aligned with.
+        """
+        self._add_conditions(plan.conditions)
+        matrix, keys = self.flag_matrix, self.flag_keys
+        positions = {key: i for i, key in enumerate(keys)}
+        vector = np.zeros(len(keys))
+        for (flag, boost), condition in zip(plan.flags, plan.conditions):
+            vector[positions[condition.key]] += boost
+        return matrix, vector
+
+    def scores(self, plan):
+        """
+        Final score per stock under plan: two matrix-vector products plus the factor boosts.
+        """
+        base = self.normalized @ self.weights(plan)
+        matrix, boosts = self.boosts(plan)
+        return base + base * ((matrix @ boosts) / 100) + self.factor_total
+
+    def scores_many(self, weights, boosts):
+        """
+        Final scores of many configs at once, as a (configs x stocks) array: one matrix product for the base scores
+        and one for the boosts. weights: (configs x metrics) rows like weights(plan); boosts: (configs x flags)
+        rows over the first flag_matrix columns (columns are only ever appended, so earlier rows stay aligned).
+        """
+        weights = np.asarray(weights, dtype=float)
+        boosts = np.asarray(boosts, dtype=float)
+        base = weights @ self.normalized.T
+        boost_total = boosts @ self.flag_matrix[:, :boosts.shape[1]].T
+        return base + base * (boost_total / 100) + self.factor_total
+
+def universe_results(metrics_list, scored, plan):
+    """
+    Turns process_universe output (scored with plan) back into process_stock-shaped dicts (same order as metrics_list),
+    e.g. for pages that filter and display the result dicts.
+    """
+    masks = scored['flag_mask'].tolist()
+    factor_values = scored[[f'{factor}_boost' for factor in FACTORS]].to_numpy()
+    base_scores = scored['base_score'].to_numpy()
+    final_scores = scored['final_score'].to_numpy()
+    results = []
+    for i, metrics in enumerate(metrics_list):
+        factor_boosts = {factor: int(value) for factor, value in zip(FACTORS, factor_values[i])}
+        results.append(_result(metrics, float(base_scores[i]), float(final_scores[i]), masks[i], factor_boosts, plan))
+    return results
+
+def score_universe(metrics_list, weights=None, selected_metrics=None, logic=DEFAULT_LOGIC, flags=None, plan=None):
+    """
+    process_stock for a whole list of metrics dicts via process_universe; returns the same list of result dicts.
+    """
+    if not metrics_list:
+        return []
+    if plan is None:
+        plan = compile_config(weights, selected_metrics, logic, flags)
+    return universe_results(metrics_list, process_universe(metrics_frame(metrics_list), plan=plan), plan)
+
 # Test
 if __name__ == "__main__":
     dummy_metrics = {'P/E': 15.3, 'ROE': 21.7, 'D/E': 0.75, 'P/B': 3.5, 'PEG': 1.2, 'Gross Margin': 25, 'Net Profit Margin': 6, 'FCF % EV TTM': 4, 'EBITDA % EV TTM': 7, 'Total Cash': 10000000000, 'Market Cap': 300000000000, 'Current Price': 500, '52W High': 600, '52W Low': 400, 'Total Debt': 50000000000, 'FCF Actual': 10000000000}
-    print(process_stock(dummy_metrics))
\ No newline at end of file
+    print(process_stock(dummy_metrics))
+
+    # Parity: process_universe vs process_stock on synthetic metrics (with missing values), every preset
+    import time
+    from synthetic import SyntheticProvider, synthetic_tickers
+    provider = SyntheticProvider(missing_rate=0.1)
+    universe = [m for m in provider.fetch_metrics_many(synthetic_tickers(1700)).values() if m]
+    for i, m in enumerate(universe[::3]):
+        m.update({'SMA 50': 100.0 + i % 7, 'SMA 200': 103.0, '% From 52W High': -float(i % 25)})  # Indicators on a subset
+    for name, preset in PRESETS.items():
+        expected = [process_stock(m, logic=preset) for m in universe]
+        assert score_universe(universe, logic=preset) == expected, f"Parity mismatch for {name}"
+    preset_plans = {name: compile_config(logic=preset) for name, preset in PRESETS.items()}
+    all_presets = process_configs(metrics_frame(universe), preset_plans)
+    for name, plan in preset_plans.items():
+        assert (all_presets[name] == process_universe(metrics_frame(universe), plan=plan)['final_score']).all(), f"Multi-config mismatch for {name}"
+    # Custom flags: a declarative condition flags the same stocks as the equivalent per-stock lambda
+    custom = {'Cheap Quality': {'all': [['P/E', '<', 20], {'any': [['ROE', '>', 20], ['Gross Margin', '>=', 50]]}, ['D/E', 'present']]}}
+    custom_logic = dict(DEFAULT_LOGIC, **{'Cheap Quality': {'enabled': True, 'boost': 12}})
+    custom_plan = compile_config(logic=custom_logic, flags=custom)
+    def cheap_quality(m):
+        return get_float(m, 'P/E') < 20 and (get_float(m, 'ROE') > 20 or get_float(m, 'Gross Margin') >= 50) and not is_missing(m.get('D/E'))
+    expected_flags = [cheap_quality(m) for m in universe]
+    assert process_universe(metrics_frame(universe), plan=custom_plan)['Cheap Quality'].tolist() == expected_flags
+    custom_results = score_universe(universe, plan=custom_plan)
+    assert custom_results == [process_stock(m, plan=custom_plan) for m in universe]
+    assert [('Cheap Quality' in result_flags(r)) for r in custom_results] == expected_flags
+    # A missing (excluded) P/E never matches through a comparison: not for !=, not under "not"
+    custom_frame = metrics_frame(universe)
+    no_pe = np.array([is_missing(m.get('P/E')) for m in universe])
+    for rule in (['P/E', '!=', 20], ['P/E', '!=', 'P/B'], {'not': ['P/E', '<', 15]}, {'not': {'all': [['P/E', '<', 15], ['ROE', '>', 15]]}}):
+        condition = Condition(rule)
+        matched = condition.mask(custom_frame)
+        assert matched.tolist() == [condition(m) for m in universe], f"Mask/test mismatch for {rule}"
+        assert not (matched & no_pe).any() and matched.any(), f"Missing P/E matched {rule}"
+    start = time.perf_counter()
+    [cheap_quality(m) for m in universe]
+    lambda_time = time.perf_counter() - start
+    start = time.perf_counter()
+    custom_plan.conditions[-1].mask(custom_frame)
+    mask_time = time.perf_counter() - start
+    print(f"Custom flag matches its lambda on {sum(expected_flags)} stocks; per-stock lambda {lambda_time * 1000:.2f}ms, "
+          f"compiled mask {mask_time * 1000:.2f}ms")
+
+    # Flag bitsets: Any/All/None filters and per-flag counts match filtering the results' flag name lists
+    overall = process_universe(metrics_frame(universe), plan=preset_plans['Overall'])
+    flag_column = overall['flag_mask'].to_numpy()
+    name_lists = [result_flags(r) for r in score_universe(universe, plan=preset_plans['Overall'])]
+    assert flag_column.dtype == np.uint8
+    assert flag_counts(flag_column) == {flag: sum(flag in names for names in name_lists) for flag in FLAG_BITS}
+    timings = []
+    for count in (1, 4, 8):
+        required = list(FLAG_BITS)[:count]
+        mask = flag_mask(required)
+        start = time.perf_counter()
+        expected = {'any': [any(flag in names for flag in required) for names in name_lists],
+                    'all': [all(flag in names for flag in required) for names in name_lists],
+                    'none': [not any(flag in names for flag in required) for names in name_lists]}
+        list_time = time.perf_counter() - start
+        start = time.perf_counter()
+        matched = {mode: match_flags(flag_column, mask, mode) for mode in FLAG_MATCHES}
+        bit_time = time.perf_counter() - start
+        assert all(matched[mode].tolist() == expected[mode] for mode in FLAG_MATCHES)
+        timings.append(f"{count} flags: lists {list_time * 1000:.2f}ms vs bitmask {bit_time * 1000:.3f}ms")
+    print(f"Any/All/None flag filters match name lists; {'; '.join(timings)}")
+
+    # Linear decomposition: ScoreMatrix scores match process_universe (up to rounding) for presets and custom flags
+    matrix_frame = metrics_frame(universe)
+    start = time.perf_counter()
+    score_matrix = ScoreMatrix(matrix_frame)
+    matrix_build = time.perf_counter() - start
+    for plan in [*preset_plans.values(), custom_plan, compile_config(selected_metrics=['P/E', 'RSI'], weights={'P/E': 0.2, 'RSI': 0.1})]:
+        assert np.allclose(score_matrix.scores(plan), process_universe(matrix_frame, plan=plan)['final_score'], rtol=0, atol=1e-9)
+    start = time.perf_counter()
+    for _ in range(100):
+        score_matrix.scores(preset_plans['Value'])
+    matrix_time = (time.perf_counter() - start) / 100
+    start = time.perf_counter()
+    process_universe(matrix_frame, plan=preset_plans['Value'])
+    rescore_time = time.perf_counter() - start
+    print(f"ScoreMatrix matches process_universe; build {matrix_build * 1000:.1f}ms, "
+          f"rescore {matrix_time * 1000:.3f}ms vs process_universe {rescore_time * 1000:.1f}ms")
+
+    start = time.perf_counter()
+    [process_stock(m) for m in universe]
+    loop_time = time.perf_counter() - start
+    frame = metrics_frame(universe)
+    start = time.perf_counter()
+    process_universe(frame)
+    vector_time = time.perf_counter() - start
+    start = time.perf_counter()
+    process_configs(frame, preset_plans)
+    configs_time = time.perf_counter() - start
+    print(f"Parity OK for {len(universe)} stocks x {len(PRESETS)} presets; "
+          f"process_stock loop {loop_time * 1000:.1f}ms, process_universe {vector_time * 1000:.1f}ms, "
+          f"all {len(PRESETS)} presets via process_configs {configs_time * 1000:.1f}ms")
\ No newline at end of file
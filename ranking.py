@@ -0,0 +1,157 @@
+from bisect import bisect_left
+
+import numpy as np
+
+def _ordered(rows, keys):
+    """
+    Rows sorted by keys descending (first key primary), ties by row position.
+    """
+    return rows[np.lexsort([rows] + [-key[rows] for key in reversed(keys)])]
+
+def _select(rows, keys, k, kth=None):
+    """
+    Best k of rows (ascending positions) by keys descending, then position. Rows above the k-th best primary value
+    (np.partition) are fewer than k and sorted; the rest come from the rows tied at that value, by the next key.
+    kth: the k-th best primary value if already known.
+    """
+    if k >= len(rows):
+        return _ordered(rows, keys)
+    if k <= 0:
+        return rows[:0]
+    primary = keys[0][rows]
+    if kth is None:
+        kth = np.partition(primary, len(rows) - k)[len(rows) - k]
+    above = rows[primary > kth]
+    tied = rows[primary == kth]
+    rest = k - len(above)
+    best_tied = _select(tied, keys[1:], rest) if len(keys) > 1 else tied[:rest]
+    return np.concatenate([_ordered(above, keys), best_tied])
+
+def top_k(keys, k=None):
+    """
+    Row indices of the k best rows, in the order of a stable descending sort on keys followed by [:k].
+    keys: list of equal-length arrays; the first is the ranking score, later ones break its ties (rows then keep position).
+    Only the rows ahead of the k-th best value (found with np.partition) are sorted; k None orders every row (Show All).
+    """
+    keys = [np.asarray(key) for key in keys]
+    rows = np.arange(len(keys[0]))
+    return _ordered(rows, keys) if k is None else _select(rows, keys, k)
+
+def top_k_many(scores, k, then=()):
+    """
+    top_k for several ranking scores over the same rows at once, e.g. one top list per factor.
+    scores: dict of name -> score array; then: tie-break arrays shared by every name (e.g. final scores).
+    The k-th best value of every score comes from one np.partition over the stacked (names x rows) matrix.
+    Returns dict of name -> row indices (best first).
+    """
+    names = list(scores)
+    if not names:
+        return {}
+    matrix = np.vstack([np.asarray(scores[name]) for name in names])
+    then = [np.asarray(key) for key in then]
+    rows = np.arange(matrix.shape[1])
+    kth = [None] * len(names)
+    if 0 < k < len(rows):
+        kth = np.partition(matrix, len(rows) - k, axis=1)[:, len(rows) - k]
+    return {name: _select(rows, [matrix[i], *then], k, kth[i]) for i, name in enumerate(names)}
+
+class RankIndex:
+    """
+    Precomputed ranks for the summary grid: per preset, the universe's final scores sorted descending,
+    once for All and once per label of each grouping (e.g. cap category, sector).
+    Entries are (-score, load position) so ties keep load order, like a stable sort by score.
+    A rank lookup is one dict access plus a binary search.
+    """
+    def __init__(self, tickers, scores, groups):
+        """
+        tickers: tickers in load order; scores: dict of preset -> final scores aligned with tickers;
+        groups: dict of grouping name -> labels aligned with tickers (e.g. {'cap': [...], 'sector': [...]}).
+        """
+        self.positions = {}
+        for i, ticker in enumerate(tickers):
+            self.positions.setdefault(ticker, i)
+        self.scores = {preset: [float(v) for v in values] for preset, values in scores.items()}
+        self.labels = {name: list(labels) for name, labels in groups.items()}
+        self.sorted = {}
+        for preset, values in self.scores.items():
+            keys = sorted((-value, i) for i, value in enumerate(values))
+            self.sorted[(preset, None, None)] = keys
+            for name, labels in self.labels.items():
+                for key in keys:
+                    self.sorted.setdefault((preset, name, labels[key[1]]), []).append(key)
+
+    def rank(self, ticker, preset, group=None, label=None):
+        """
+        Returns (rank, group size) of ticker under preset, among all stocks (group None) or within its label of group.
+        If label is given it must match the ticker's indexed label. Returns None for unknown tickers/presets or a mismatch.
+        """
+        i = self.positions.get(ticker)
+        if i is None or preset not in self.scores:
+            return None
+        if group is not None:
+            own_label = self.labels[group][i]
+            if label is not None and label != own_label:
+                return None
+            label = own_label
+        keys = self.sorted[(preset, group, label)]
+        return bisect_left(keys, (-self.scores[preset][i], i)) + 1, len(keys)
+
+def _benchmark_top_k(sizes=(1000, 10000, 100000), k=100, factors=4):
+    import time
+    rng = np.random.default_rng(0)
+    for count in sizes:
+        finals = np.round(rng.uniform(0, 150, count), 1)  # Rounded so ties occur
+        factor_scores = {f'factor{j}': rng.choice([0, 10, 20], count) for j in range(factors)}
+        rows = [{'final_score': float(finals[i]), **{name: int(v[i]) for name, v in factor_scores.items()}} for i in range(count)]
+
+        start = time.perf_counter()
+        by_score = sorted(rows, key=lambda r: r['final_score'], reverse=True)
+        expected = by_score[:k]
+        expected_factors = {name: sorted(by_score, key=lambda r: r[name], reverse=True)[:5] for name in factor_scores}
+        sort_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        top = top_k([finals], k)
+        top_factors = top_k_many(factor_scores, 5, then=[finals])
+        partial_time = time.perf_counter() - start
+
+        assert [rows[i] for i in top] == expected
+        assert all([rows[i] for i in top_factors[name]] == expected_factors[name] for name in factor_scores)
+        assert top_k([finals]).tolist() == np.argsort(-finals, kind='stable').tolist()
+        assert top_k([finals], 0).size == 0 and top_k([finals], count + 1).tolist() == top_k([finals]).tolist()
+        start = time.perf_counter()
+        np.argsort(-finals, kind='stable')[:k]
+        argsort_time = time.perf_counter() - start
+        start = time.perf_counter()
+        top_k([finals], k)
+        top_time = time.perf_counter() - start
+        print(f"{count} rows: top {k} + top 5 x {factors} factors: sorting dicts {sort_time * 1000:.1f}ms, "
+              f"top_k/top_k_many {partial_time * 1000:.2f}ms; top {k} alone: top_k {top_time * 1000:.2f}ms "
+              f"vs full argsort {argsort_time * 1000:.2f}ms")
+
+# Test: ranks match a stable sort + scan, including ties; top_k matches sort-and-slice (benchmarked 1k-100k rows)
+if __name__ == "__main__":
+    import random
+    import time
+    rng = random.Random(0)
+    count = 5000
+    tickers = [f"T{i:05d}" for i in range(count)]
+    scores = {'Value': [round(rng.uniform(0, 150), 1) for _ in tickers], 'Growth': [rng.uniform(0, 150) for _ in tickers]}
+    caps = [rng.choice(['Large Cap', 'Mid Cap', 'Small Cap']) for _ in tickers]
+    start = time.perf_counter()
+    index = RankIndex(tickers, scores, {'cap': caps})
+    build_time = time.perf_counter() - start
+    for ticker in rng.sample(tickers, 200):
+        i = tickers.index(ticker)
+        for preset, values in scores.items():
+            order = sorted(range(count), key=lambda j: values[j], reverse=True)
+            assert index.rank(ticker, preset) == (order.index(i) + 1, count)
+            group = [j for j in order if caps[j] == caps[i]]
+            assert index.rank(ticker, preset, 'cap') == (group.index(i) + 1, len(group))
+    start = time.perf_counter()
+    for ticker in tickers:
+        index.rank(ticker, 'Value', 'cap')
+    lookup_time = (time.perf_counter() - start) / count
+    print(f"Ranks match stable sort; build {build_time * 1000:.1f}ms for {count} tickers x {len(scores)} presets, "
+          f"lookup {lookup_time * 1e6:.1f}us")
+    _benchmark_top_k()
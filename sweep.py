@@ -0,0 +1,239 @@
+import itertools
+
+import numpy as np
+
+from processor import DEFAULT_LOGIC, DEFAULT_WEIGHTS, compile_config
+
+# Weight-space search over scoring configs, evaluated in batches against a ScoreMatrix (processor.py):
+# a batch of candidate configs is a (configs x dimensions) array, scored into (configs x stocks) with one matrix product for the base scores
+# and one for the boosts (ScoreMatrix.scores_many), then rated by an objective over each config's top N.
+# Dimensions are the weights of the base config's selected metrics on the Customize sliders' grid (0-0.3, step 0.01)
+# and, optionally, the boosts of its enabled flags within +-10 of the base boost (also as on the Customize page).
+WEIGHT_LEVELS = np.round(np.arange(0, 0.3001, 0.01), 2)
+BOOST_RANGE = 10
+BATCH_SIZE = 1024  # Configs scored per matrix product: a (stocks x BATCH_SIZE) float array at a time
+GRID_LIMIT = 1_000_000  # Largest grid grid_search will enumerate
+SEARCH_METHODS = ('random', 'grid', 'descent')
+
+def top_rows(scores, top):
+    """
+    Row indices of the top best stocks of every config in a (configs x stocks) score array, as (configs x top).
+    Uses np.argpartition, so the order within the top and the choice among stocks tied at the cut are arbitrary.
+    """
+    count = scores.shape[1]
+    if top >= count:
+        return np.broadcast_to(np.arange(count), scores.shape)
+    return np.argpartition(scores, count - top, axis=1)[:, count - top:]
+
+def overlap_objective(target_mask, top):
+    """
+    Objective: share of the target stocks (boolean row mask, e.g. UniverseStore.ticker_mask) in each config's top N,
+    out of as many as fit (1.0 when the top N holds every target, or is all targets).
+    """
+    target_mask = np.asarray(target_mask, dtype=bool)
+    best = max(1, min(top, int(target_mask.sum())))
+    def objective(scores):
+        return target_mask[top_rows(scores, top)].sum(axis=1) / best
+    return objective
+
+def tilt_objective(values, top):
+    """
+    Objective: mean of values (e.g. ScoreMatrix.factors['value'], a factor's boosts) over each config's top N.
+    """
+    values = np.asarray(values, dtype=float)
+    def objective(scores):
+        return values[top_rows(scores, top)].mean(axis=1)
+    return objective
+
+class ConfigSpace:
+    """
+    Candidate configs around a base (weights, selected_metrics, logic, flags) config, scored against a ScoreMatrix.
+    A candidate is a row of weights (one per selected metric) followed, with tune_boosts, by one boost per enabled flag;
+    levels lists the values each dimension may take. Weights of metrics that are not selected keep counting toward the
+    weight total, as in compile_config.
+    Raises ValueError for invalid base configs (see compile_config).
+    """
+    def __init__(self, matrix, weights=None, selected_metrics=None, logic=DEFAULT_LOGIC, flags=None, tune_boosts=False):
+        plan = compile_config(weights, selected_metrics, logic, flags)
+        self.matrix = matrix
+        self.plan = plan
+        self.weights = dict(DEFAULT_WEIGHTS if weights is None else weights)
+        self.logic = {flag: dict(entry) for flag, entry in logic.items()}
+        self.flags = flags
+        self.metrics = plan.metrics
+        self.extra_weight = plan.weight_total - sum(plan.weights)  # Unselected weights, still in the divisor
+        self.columns = [matrix.columns.get(metric, -1) for metric in self.metrics]
+        _, self.base_boosts = matrix.boosts(plan)
+        positions = {key: i for i, key in enumerate(matrix.flag_keys)}
+        self.tuned = [(flag, positions[condition.key]) for (flag, _), condition in zip(plan.flags, plan.conditions)] if tune_boosts else []
+        self.levels = [WEIGHT_LEVELS] * len(self.metrics)
+        self.levels += [np.arange(boost - BOOST_RANGE, boost + BOOST_RANGE + 1, dtype=float) for flag, boost in plan.flags] if tune_boosts else []
+        start = [WEIGHT_LEVELS[np.abs(WEIGHT_LEVELS - weight).argmin()] for weight in plan.weights]
+        start += [boost for _, boost in plan.flags] if tune_boosts else []
+        self.start = np.array(start, dtype=float)
+
+    def scores(self, candidates):
+        """
+        (configs x stocks) final scores of a (configs x dimensions) candidate array.
+        """
+        candidates = np.atleast_2d(np.asarray(candidates, dtype=float))
+        raw = candidates[:, :len(self.metrics)]
+        totals = raw.sum(axis=1) + self.extra_weight
+        shares = np.divide(raw, totals[:, None], out=np.zeros_like(raw), where=totals[:, None] > 0)
+        weights = np.zeros((len(candidates), len(self.matrix.metrics)))
+        for i, column in enumerate(self.columns):
+            if column >= 0:  # Metrics without a normalizer add 0 to the base score
+                weights[:, column] += shares[:, i]
+        boosts = np.tile(self.base_boosts, (len(candidates), 1))
+        for i, (flag, position) in enumerate(self.tuned):
+            boosts[:, position] += candidates[:, len(self.metrics) + i] - self.plan.boosts[flag]
+        return self.matrix.scores_many(weights, boosts)
+
+    def evaluate(self, candidates, objective):
+        """
+        Objective value of every candidate row, scored BATCH_SIZE configs per matrix product.
+        """
+        candidates = np.atleast_2d(np.asarray(candidates, dtype=float))
+        return np.concatenate([objective(self.scores(candidates[i:i + BATCH_SIZE]))
+                               for i in range(0, len(candidates), BATCH_SIZE)] or [np.zeros(0)])
+
+    def config(self, candidate):
+        """
+        The config of a candidate row as saved by the Customize page (weights, metrics, logic, flags).
+        """
+        weights = dict(self.weights)
+        weights.update({metric: round(float(w), 4) for metric, w in zip(self.metrics, candidate)})
+        logic = {flag: dict(entry) for flag, entry in self.logic.items()}
+        for i, (flag, _) in enumerate(self.tuned):
+            logic[flag]['boost'] = int(candidate[len(self.metrics) + i])
+        config = {'weights': weights, 'metrics': list(self.metrics), 'logic': logic}
+        if self.flags:
+            config['flags'] = self.flags
+        return config
+
+def _best(candidates, values, best):
+    i = int(np.argmax(values))
+    if best is None or values[i] > best[1]:
+        return candidates[i].copy(), float(values[i])
+    return best
+
+def random_search(space, objective, count=10000, seed=0):
+    """
+    Best of count random candidates (each dimension uniform over its levels) plus the base config.
+    Returns (candidate, value, evaluated).
+    """
+    rng = np.random.default_rng(seed)
+    best = _best(space.start[None, :], space.evaluate(space.start, objective), None)
+    for i in range(0, count, BATCH_SIZE):
+        size = min(BATCH_SIZE, count - i)
+        candidates = np.column_stack([rng.choice(levels, size) for levels in space.levels]) if space.levels else np.zeros((size, 0))
+        best = _best(candidates, space.evaluate(candidates, objective), best)
+    return best[0], best[1], count + 1
+
+def grid_search(space, objective, levels=3):
+    """
+    Best candidate on a grid of `levels` evenly spaced values per dimension (levels ** dimensions configs).
+    Returns (candidate, value, evaluated). Raises ValueError when the grid exceeds GRID_LIMIT.
+    """
+    axes = [np.unique(np.asarray(dimension)[np.linspace(0, len(dimension) - 1, levels).round().astype(int)]) for dimension in space.levels]
+    size = int(np.prod([len(axis) for axis in axes]))
+    if size > GRID_LIMIT:
+        raise ValueError(f"Grid of {size} configs exceeds {GRID_LIMIT}; use fewer levels or random search")
+    best = None
+    grid = itertools.product(*axes)
+    while True:
+        candidates = np.array(list(itertools.islice(grid, BATCH_SIZE)), dtype=float).reshape(-1, len(axes))
+        if not len(candidates):
+            break
+        best = _best(candidates, space.evaluate(candidates, objective), best)
+    return best[0], best[1], size
+
+def coordinate_descent(space, objective, start=None, rounds=10):
+    """
+    Improves start (default the base config) one dimension at a time: every level of the dimension is scored in one
+    batch and the best kept if strictly better. Stops after a round without improvement or after rounds rounds.
+    Returns (candidate, value, evaluated).
+    """
+    current = np.array(space.start if start is None else start, dtype=float)
+    value = float(space.evaluate(current, objective)[0])
+    evaluated = 1
+    for _ in range(rounds):
+        improved = False
+        for dimension, levels in enumerate(space.levels):
+            candidates = np.tile(current, (len(levels), 1))
+            candidates[:, dimension] = levels
+            values = space.evaluate(candidates, objective)
+            evaluated += len(levels)
+            i = int(np.argmax(values))
+            if values[i] > value:
+                current, value, improved = candidates[i], float(values[i]), True
+        if not improved:
+            break
+    return current, value, evaluated
+
+def search(space, objective, method='random', count=10000, levels=3, rounds=10, seed=0):
+    """
+    Runs one of SEARCH_METHODS; returns (candidate, value, evaluated).
+    """
+    if method == 'random':
+        return random_search(space, objective, count, seed)
+    if method == 'grid':
+        return grid_search(space, objective, levels)
+    if method == 'descent':
+        return coordinate_descent(space, objective, rounds=rounds)
+    raise ValueError(f"Search method must be one of {', '.join(SEARCH_METHODS)}, got {method!r}")
+
+def benchmark(space, objective, batch_sizes=(1, 64, BATCH_SIZE, 8 * BATCH_SIZE), seed=0):
+    """
+    Configs evaluated per second (score + objective) for several batch sizes; returns a list of (batch, rate).
+    """
+    import time
+    rng = np.random.default_rng(seed)
+    rates = []
+    for batch in batch_sizes:
+        candidates = np.column_stack([rng.choice(levels, batch) for levels in space.levels])
+        start = time.perf_counter()
+        space.evaluate(candidates, objective)
+        rates.append((batch, batch / (time.perf_counter() - start)))
+    return rates
+
+# Test: batched scores match process_universe per config; searches improve on the base config (benchmarked at 1700 tickers)
+if __name__ == "__main__":
+    import time
+    from processor import ScoreMatrix, metrics_frame, process_universe
+    from synthetic import SyntheticProvider, synthetic_tickers
+    universe = [m for m in SyntheticProvider(missing_rate=0.1).fetch_metrics_many(synthetic_tickers(1700)).values() if m]
+    frame = metrics_frame(universe)
+    matrix = ScoreMatrix(frame)
+    weights = {'P/E': 0.2, 'ROE': 0.2, 'P/B': 0.1, 'PEG': 0.15, 'RSI': 0.05, 'Beta': 0.1}
+    selected = ['P/E', 'ROE', 'P/B', 'PEG', 'RSI']  # Beta unselected but weighted; RSI has no normalizer
+    space = ConfigSpace(matrix, weights, selected, DEFAULT_LOGIC, tune_boosts=True)
+    rng = np.random.default_rng(1)
+    candidates = np.column_stack([rng.choice(levels, 20) for levels in space.levels])
+    batch = space.scores(candidates)
+    for i, candidate in enumerate(candidates):
+        config = space.config(candidate)
+        expected = process_universe(frame, config['weights'], config['metrics'], config['logic'])['final_score'].to_numpy()
+        assert np.allclose(batch[i], expected, rtol=0, atol=1e-9), f"Batch mismatch for candidate {i}"
+
+    targets = np.zeros(len(universe), dtype=bool)
+    targets[rng.choice(len(universe), 40, replace=False)] = True
+    objectives = {'overlap': overlap_objective(targets, 40), 'value tilt': tilt_objective(matrix.factors['value'], 40)}
+    for name, objective in objectives.items():
+        base = float(space.evaluate(space.start, objective)[0])
+        results = {}
+        for method in SEARCH_METHODS:
+            start = time.perf_counter()
+            candidate, value, evaluated = search(space, objective, method, count=5000, levels=2)
+            elapsed = time.perf_counter() - start
+            assert value >= base, f"{method} did worse than the base config"
+            results[method] = f"{value:.3f} ({evaluated} configs, {elapsed:.2f}s)"
+        print(f"{name}: base {base:.3f}; " + ", ".join(f"{method} {result}" for method, result in results.items()))
+
+    for batch, rate in benchmark(space, objectives['overlap']):
+        print(f"Batch of {batch}: {rate:,.0f} configs/s at {len(universe)} tickers")
+    start = time.perf_counter()
+    for candidate in candidates[:10]:
+        config = space.config(candidate)
+        objectives['overlap'](process_universe(frame, plan=compile_config(config['weights'], config['metrics'], config['logic']))['final_score'].to_numpy()[None, :])
+    print(f"process_universe per config: {10 / (time.perf_counter() - start):,.0f} configs/s")
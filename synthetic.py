@@ -0,0 +1,267 @@
+import random
+import threading
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from fetcher import QUOTE_BATCH_SIZE, MetricsProvider, build_metrics, compute_rsi, history_to_list
+from throttle import CircuitOpenError
+
+SECTORS = {
+    'Technology': ['Software - Infrastructure', 'Semiconductors', 'Consumer Electronics'],
+    'Healthcare': ['Drug Manufacturers - General', 'Medical Devices', 'Healthcare Plans'],
+    'Financial Services': ['Banks - Diversified', 'Asset Management', 'Insurance - Diversified'],
+    'Consumer Cyclical': ['Internet Retail', 'Auto Manufacturers', 'Restaurants'],
+    'Industrials': ['Aerospace & Defense', 'Railroads', 'Specialty Industrial Machinery'],
+    'Energy': ['Oil & Gas Integrated', 'Oil & Gas E&P'],
+    'Consumer Defensive': ['Discount Stores', 'Beverages - Non-Alcoholic', 'Household & Personal Products'],
+    'Communication Services': ['Internet Content & Information', 'Telecom Services'],
+    'Utilities': ['Utilities - Regulated Electric'],
+    'Real Estate': ['REIT - Specialty', 'REIT - Industrial'],
+    'Basic Materials': ['Specialty Chemicals', 'Gold'],
+}
+RATINGS = [(1.5, 'strong_buy'), (2.2, 'buy'), (3.0, 'hold'), (3.8, 'underperform'), (5.0, 'sell')]
+PERIOD_DAYS = {'1mo': 21, '3mo': 63, '6mo': 126, '1y': 252, '2y': 504}
+
+class SyntheticUpstreamError(ConnectionError):
+    """
+    Injected failure standing in for a transient upstream error (timeouts, 5xx).
+    """
+
+class SyntheticRateLimitError(SyntheticUpstreamError):
+    """
+    Injected HTTP 429 (Too Many Requests) response.
+    """
+    status_code = 429
+
+def synthetic_tickers(count, prefix='SYN'):
+    """
+    Returns count fake ticker symbols, e.g. SYN00001.
+    """
+    width = max(5, len(str(count)))
+    return [f"{prefix}{i:0{width}d}" for i in range(1, count + 1)]
+
+class SyntheticProvider(MetricsProvider):
+    """
+    Deterministic MetricsProvider generating realistic info dicts and price histories for fake tickers.
+    The same (seed, ticker) always yields the same data; latency (seconds per request, with jitter)
+    and error_rate (fraction of requests failing) simulate upstream behaviour for load tests.
+    missing_rate is the chance each optional info field is absent, to exercise missing-value fallbacks.
+    throttle_schedule is an optional callable taking the 1-based request number and returning True
+    to answer that request with a 429, acting as a local throttling stub for the adaptive controller.
+    """
+    def __init__(self, seed=42, latency=0.0, jitter=0.5, error_rate=0.0, missing_rate=0.05, throttle_schedule=None, limiter=None, controller=None):
+        super().__init__(limiter, controller)
+        self.throttle_schedule = throttle_schedule
+        self.seed = seed
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.missing_rate = missing_rate
+        self.rng = random.Random(seed)  # Latency/error draws only; data comes from per-ticker rngs
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'throttled': 0}
+        self.dates = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=PERIOD_DAYS['2y'])
+
+    def _ticker_rng(self, ticker, stream):
+        # Separate streams keep prices and fundamentals independent of each other's draws
+        return np.random.default_rng([self.seed, zlib.crc32(ticker.encode()), stream])
+
+    def _request(self):
+        """
+        Simulates one upstream round trip (under the limiter/controller): sleep for latency, maybe fail.
+        """
+        self._upstream(self._respond)
+
+    def _respond(self):
+        with self.lock:
+            self.stats['requests'] += 1
+            throttled = self.throttle_schedule is not None and self.throttle_schedule(self.stats['requests'])
+            delay = max(0.0, self.rng.gauss(self.latency, self.latency * self.jitter)) if self.latency else 0.0
+            fail = not throttled and self.rng.random() < self.error_rate
+            if throttled:
+                self.stats['throttled'] += 1
+            if fail:
+                self.stats['errors'] += 1
+        if delay:
+            time.sleep(delay)
+        if throttled:
+            raise SyntheticRateLimitError("429 Too Many Requests")
+        if fail:
+            raise SyntheticUpstreamError("Injected upstream failure")
+
+    def _closes(self, ticker, days=252):
+        """
+        Geometric random walk of daily closes ending today, drift/volatility drawn per ticker.
+        """
+        rng = self._ticker_rng(ticker, 0)
+        start_price = float(np.exp(rng.uniform(np.log(5), np.log(800))))
+        drift = rng.normal(0.0003, 0.0008)
+        vol = rng.uniform(0.008, 0.035)
+        returns = rng.normal(drift, vol, PERIOD_DAYS['2y'])
+        closes = start_price * np.exp(np.cumsum(returns))
+        return pd.Series(closes[-days:], index=self.dates[-days:])
+
+    def _volumes(self, ticker, days=252):
+        """
+        Lognormal daily share volumes around a per-ticker base, aligned with _closes.
+        """
+        rng = self._ticker_rng(ticker, 2)
+        base = float(np.exp(rng.uniform(np.log(5e4), np.log(8e7))))
+        volumes = base * rng.lognormal(0.0, 0.35, PERIOD_DAYS['2y'])
+        return pd.Series(np.round(volumes[-days:]), index=self.dates[-days:])
+
+    def generate_info(self, ticker):
+        """
+        Returns a yfinance-style info dict consistent with the ticker's price history.
+        """
+        rng = self._ticker_rng(ticker, 1)
+        closes = self._closes(ticker)
+        price = float(closes.iloc[-1])
+        sector = list(SECTORS)[int(rng.integers(len(SECTORS)))]
+        industry = SECTORS[sector][int(rng.integers(len(SECTORS[sector])))]
+        market_cap = float(np.exp(rng.uniform(np.log(5e7), np.log(3e12))))
+        gross_margin = float(np.clip(rng.normal(0.42, 0.18), -0.2, 0.95))
+        profit_margin = float(np.clip(gross_margin * rng.uniform(-0.3, 0.6), -0.5, 0.6))
+        revenue = market_cap / float(np.exp(rng.normal(1.0, 0.8)))
+        net_income = revenue * profit_margin
+        ebitda = revenue * float(np.clip(profit_margin + rng.uniform(0.03, 0.2), -0.3, 0.7))
+        free_cashflow = net_income * rng.uniform(0.5, 1.4)
+        total_cash = market_cap * rng.uniform(0.01, 0.25)
+        total_debt = market_cap * float(np.exp(rng.normal(-1.8, 1.0)))
+        ev = market_cap + total_debt - total_cash
+        equity = max(market_cap / float(np.exp(rng.normal(1.2, 0.7))), 1.0)
+        earnings_growth = float(rng.normal(0.08, 0.25))
+        analyst_mean = float(np.round(rng.uniform(1.2, 4.5), 1))
+        info = {
+            'longName': f"Synthetic {ticker} Corp.",
+            'sector': sector,
+            'industry': industry,
+            'currentPrice': price,
+            'fiftyTwoWeekHigh': float(closes.max()),
+            'fiftyTwoWeekLow': float(closes.min()),
+            'marketCap': market_cap,
+            'enterpriseValue': ev,
+            'totalCash': total_cash,
+            'totalDebt': total_debt,
+            'freeCashflow': free_cashflow,
+            'ebitda': ebitda,
+            'trailingPE': market_cap / net_income if net_income > 0 else None,
+            'trailingEps': net_income / (market_cap / price),
+            'forwardPE': market_cap / (net_income * (1 + earnings_growth)) if net_income > 0 and earnings_growth > -1 else None,
+            'pegRatio': None if rng.random() < 0.4 else float(rng.uniform(0.3, 4.0)),
+            'priceToBook': market_cap / equity,
+            'returnOnEquity': net_income / equity,
+            'debtToEquity': total_debt / equity * 100,
+            'grossMargins': gross_margin,
+            'profitMargins': profit_margin,
+            'revenueGrowth': float(rng.normal(0.07, 0.15)),
+            'earningsGrowth': earnings_growth,
+            'beta': float(np.clip(rng.normal(1.0, 0.4), -0.5, 3.0)),
+            'dividendYield': float(rng.uniform(0.005, 0.06)) if rng.random() < 0.5 else None,
+            'averageVolume': int(self._volumes(ticker, 63).mean()),
+            'recommendationMean': analyst_mean,
+            'recommendationKey': next(key for limit, key in RATINGS if analyst_mean <= limit),
+            'targetMeanPrice': price * float(rng.uniform(0.8, 1.4)),
+        }
+        # Drop optional fields (never identity/price) to mimic Yahoo gaps
+        for key in list(info):
+            if key not in ('longName', 'sector', 'industry', 'currentPrice') and rng.random() < self.missing_rate:
+                del info[key]
+        return {k: v for k, v in info.items() if v is not None}
+
+    def generate_quote(self, ticker):
+        """
+        Returns a multi-symbol quote item (Yahoo v7 field names) consistent with generate_info and the price history.
+        """
+        info = self.generate_info(ticker)
+        closes = self._closes(ticker)
+        session_close = closes.index[-1].tz_localize('US/Eastern') + pd.Timedelta(hours=16)
+        quote = {
+            'symbol': ticker,
+            'regularMarketPrice': info['currentPrice'],
+            'regularMarketTime': int(session_close.timestamp()),
+            'regularMarketVolume': float(self._volumes(ticker).iloc[-1]),
+            'averageDailyVolume3Month': info.get('averageVolume')
+        }
+        for key in ('fiftyTwoWeekHigh', 'fiftyTwoWeekLow', 'marketCap', 'trailingPE', 'forwardPE', 'priceToBook'):
+            quote[key] = info.get(key)
+        return {k: v for k, v in quote.items() if v is not None}
+
+    def fetch_quote_infos(self, tickers):
+        results = {}
+        for i in range(0, len(tickers), QUOTE_BATCH_SIZE):
+            chunk = tickers[i:i + QUOTE_BATCH_SIZE]
+            try:
+                self._request()
+            except (SyntheticUpstreamError, CircuitOpenError) as e:
+                self.logger.error(f"Synthetic quote batch failed for {len(chunk)} tickers: {e}")
+                continue
+            results.update({t: self.generate_quote(t) for t in chunk})
+        return results
+
+    def fetch_metrics(self, ticker, latest_rsi=None, quote=None):
+        try:
+            if latest_rsi is None:
+                self._request()
+                latest_rsi = compute_rsi(self._closes(ticker, PERIOD_DAYS['1mo']).to_frame(ticker))[ticker]
+            self._request()
+            info = self.generate_info(ticker)
+            if quote:
+                info.update(quote)
+            return build_metrics(ticker, info, latest_rsi, self.logger)
+        except Exception as e:
+            self.logger.error(f"Synthetic fetch failed for {ticker}: {e}")
+            return {}
+
+    def fetch_close_panel(self, tickers, period='1mo'):
+        try:
+            self._request()
+        except (SyntheticUpstreamError, CircuitOpenError) as e:
+            self.logger.error(f"Synthetic panel failed for {len(tickers)} tickers: {e}")
+            return pd.DataFrame(columns=tickers, dtype=float)
+        days = PERIOD_DAYS.get(period, 252)
+        return pd.DataFrame({t: self._closes(t, days) for t in tickers})
+
+    def fetch_histories(self, tickers, period='1mo'):
+        try:
+            self._request()
+        except (SyntheticUpstreamError, CircuitOpenError) as e:
+            self.logger.error(f"Synthetic panel failed for {len(tickers)} tickers: {e}")
+            return {t: [] for t in tickers}
+        days = PERIOD_DAYS.get(period, 252)
+        return {t: history_to_list(self._closes(t, days), self._volumes(t, days)) for t in tickers}
+
+    def fetch_history(self, ticker, period='1y'):
+        try:
+            self._request()
+            return history_to_list(self._closes(ticker, PERIOD_DAYS.get(period, 252)))
+        except (SyntheticUpstreamError, CircuitOpenError) as e:
+            self.logger.error(f"Synthetic history failed for {ticker}: {e}")
+            return []
+
+# Test: ingestion (fetch) and scoring throughput without network
+if __name__ == "__main__":
+    import argparse
+    from processor import process_stock
+    parser = argparse.ArgumentParser(description="Synthetic provider throughput check")
+    parser.add_argument('--count', type=int, default=10000)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.01)
+    args = parser.parse_args()
+    provider = SyntheticProvider(latency=args.latency, error_rate=args.error_rate)
+    tickers = synthetic_tickers(args.count)
+    start = time.perf_counter()
+    metrics = {}
+    for i in range(0, len(tickers), 50):
+        metrics.update(provider.fetch_metrics_many(tickers[i:i + 50]))
+    fetch_time = time.perf_counter() - start
+    ok = [m for m in metrics.values() if m]
+    start = time.perf_counter()
+    for m in ok:
+        process_stock(m)
+    score_time = time.perf_counter() - start
+    print(f"Fetched {len(ok)}/{len(tickers)} in {fetch_time:.2f}s ({len(tickers) / fetch_time:.0f}/s), "
+          f"scored in {score_time:.2f}s ({len(ok) / score_time:.0f}/s), {provider.stats['requests']} simulated requests")
@@ -0,0 +1,228 @@
+import logging
+import os
+import threading
+import time
+
+RATE_LIMITED = 'rate_limited'
+NOT_FOUND = 'not_found'
+TRANSIENT = 'transient'
+
+RATE_LIMIT_MARKERS = ('429', 'too many requests', 'rate limit')
+NOT_FOUND_MARKERS = ('404', 'not found', 'no data found', 'delisted', 'no timezone found')
+DEFAULT_MAX_CONCURRENCY = int(os.getenv('FETCH_WORKERS', 4))
+
+def classify_error(exc):
+    """
+    Classifies an upstream failure as RATE_LIMITED, NOT_FOUND or TRANSIENT.
+    Checks yfinance exception types by name (version-tolerant), HTTP status codes, then message text.
+    """
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    if 'YFRateLimitError' in names:
+        return RATE_LIMITED
+    if names & {'YFTickerMissingError', 'YFPricesMissingError', 'YFTzMissingError'}:
+        return NOT_FOUND
+    status = getattr(getattr(exc, 'response', None), 'status_code', None) or getattr(exc, 'status_code', None)
+    if status == 429:
+        return RATE_LIMITED
+    if status == 404:
+        return NOT_FOUND
+    message = str(exc).lower()
+    if any(marker in message for marker in RATE_LIMIT_MARKERS):
+        return RATE_LIMITED
+    if any(marker in message for marker in NOT_FOUND_MARKERS):
+        return NOT_FOUND
+    return TRANSIENT
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of calling upstream while the circuit breaker is open.
+    """
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive rate-limit failures; rejects calls for `cooldown` seconds,
+    then lets a single probe through (half-open). A successful probe closes it, a throttled one reopens it.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, threshold=5, cooldown=300):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.consecutive_throttles = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def allow(self):
+        """
+        Returns True if a request may go upstream now.
+        """
+        with self.lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self.probe_in_flight = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            if self.state != self.CLOSED:
+                self.logger.info("Circuit breaker closed after successful probe.")
+            self.state = self.CLOSED
+            self.consecutive_throttles = 0
+            self.probe_in_flight = False
+
+    def record_throttle(self):
+        with self.lock:
+            self.consecutive_throttles += 1
+            if self.state == self.HALF_OPEN or self.consecutive_throttles >= self.threshold:
+                if self.state != self.OPEN:
+                    self.logger.warning(f"Circuit breaker opened after {self.consecutive_throttles} consecutive rate limits; cooling down {self.cooldown}s.")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.probe_in_flight = False
+
+    def record_other(self):
+        """
+        Non-throttle outcomes (not-found/transient) release a half-open probe without changing state.
+        """
+        with self.lock:
+            self.probe_in_flight = False
+
+    def retry_after(self):
+        """
+        Seconds until the breaker will allow a probe (0 if closed).
+        """
+        with self.lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+class AdaptiveController:
+    """
+    Additive-increase/multiplicative-decrease control of upstream concurrency and inter-request delay.
+    Each clean success window (one success per allowed slot) raises the limit by `increase` and shrinks the delay;
+    each rate limit multiplies the limit by `decrease`, doubles the delay and feeds the circuit breaker.
+    """
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, min_concurrency=1, initial_concurrency=None,
+                 min_delay=0.0, max_delay=60.0, base_delay=1.0, increase=1, decrease=0.5, breaker=None):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(initial_concurrency or max(min_concurrency, max_concurrency // 2))
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.base_delay = base_delay
+        self.delay = min_delay
+        self.increase = increase
+        self.decrease = decrease
+        self.breaker = breaker or CircuitBreaker()
+        self.in_flight = 0
+        self.window_successes = 0
+        self.counts = {'success': 0, RATE_LIMITED: 0, NOT_FOUND: 0, TRANSIENT: 0, 'rejected': 0}
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Blocks until an upstream slot is free, then waits out the current delay.
+        Raises CircuitOpenError if the breaker is open.
+        """
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            if not self.breaker.allow():
+                self.counts['rejected'] += 1
+                raise CircuitOpenError(f"Upstream circuit open; retry in {self.breaker.retry_after():.0f}s")
+            self.in_flight += 1
+            delay = self.delay
+        if delay:
+            time.sleep(delay)
+
+    def release(self, outcome):
+        """
+        Records the outcome of a request started with acquire() ('success' or a classify_error result).
+        """
+        with self.condition:
+            self.in_flight -= 1
+            self.counts[outcome] += 1
+            if outcome == 'success':
+                self.breaker.record_success()
+                self.window_successes += 1
+                if self.window_successes >= int(self.limit):
+                    self.window_successes = 0
+                    self.limit = min(self.max_concurrency, self.limit + self.increase)
+                    self.delay = max(self.min_delay, self.delay / 2 if self.delay > self.base_delay / 8 else 0.0)
+            elif outcome == RATE_LIMITED:
+                self.breaker.record_throttle()
+                self.window_successes = 0
+                self.limit = max(self.min_concurrency, self.limit * self.decrease)
+                self.delay = min(self.max_delay, max(self.base_delay, self.delay * 2))
+            else:
+                self.breaker.record_other()
+            self.condition.notify_all()
+
+    def call(self, fn):
+        """
+        Runs fn() under the controller, classifying any exception before re-raising it.
+        """
+        self.acquire()
+        try:
+            result = fn()
+        except Exception as e:
+            self.release(classify_error(e))
+            raise
+        self.release('success')
+        return result
+
+    def state(self):
+        """
+        Returns a snapshot of the controller and breaker for status displays/logs.
+        """
+        with self.condition:
+            return {
+                'concurrency_limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'delay_s': round(self.delay, 2),
+                'breaker': self.breaker.state,
+                'breaker_retry_after_s': round(self.breaker.retry_after(), 1),
+                'counts': dict(self.counts)
+            }
+
+_shared_controller = None
+_shared_controller_lock = threading.Lock()
+
+def get_shared_controller():
+    """
+    Returns the process-wide AdaptiveController so every fetch path backs off together.
+    """
+    global _shared_controller
+    with _shared_controller_lock:
+        if _shared_controller is None:
+            _shared_controller = AdaptiveController()
+        return _shared_controller
+
+# Test: AIMD backoff and the circuit breaker against SyntheticProvider's scheduled 429s (no network)
+if __name__ == "__main__":
+    # Imported from the module (not __main__) so the provider catches the same CircuitOpenError
+    from throttle import AdaptiveController, CircuitBreaker
+    from synthetic import SyntheticProvider
+    breaker = CircuitBreaker(threshold=3, cooldown=0.2)
+    controller = AdaptiveController(max_concurrency=8, initial_concurrency=8, base_delay=0.01, max_delay=1.0, breaker=breaker)
+    provider = SyntheticProvider(throttle_schedule=lambda request: request <= 3, controller=controller)
+    for i in range(3):
+        limit, delay = controller.limit, controller.delay
+        assert provider.fetch_history('SYN1') == [], "Throttled request returned data"
+        assert controller.limit == max(1, limit / 2), f"Limit {limit} -> {controller.limit}, expected halving"
+        assert controller.delay == max(0.01, delay * 2), f"Delay {delay} -> {controller.delay}, expected doubling"
+        assert breaker.state == (breaker.OPEN if i == 2 else breaker.CLOSED), f"Breaker {breaker.state} after {i+1} rate limits"
+    assert provider.fetch_history('SYN1') == [] and controller.counts['rejected'] == 1, "Open breaker let a call through"
+    assert provider.stats['requests'] == 3, "Rejected call reached upstream"
+    time.sleep(breaker.cooldown)
+    assert provider.fetch_history('SYN1'), "Half-open probe failed"
+    assert breaker.state == breaker.CLOSED and breaker.consecutive_throttles == 0, "Successful probe did not close the breaker"
+    print(f"Throttle checks passed: {controller.state()}")
@@ -0,0 +1,346 @@
+from collections import OrderedDict
+import threading
+
+import numpy as np
+import pandas as pd
+
+from indicators import INDICATOR_KEYS
+from metrics_schema import MISSING_TEXT, NUMERIC_FIELDS, TEXT_FIELDS, to_float
+from processor import ScoreMatrix, get_cap_category, process_universe, scoring_column
+
+GROUPS = {'sector': 'Sector', 'industry': 'Industry'}  # Categorical groups read from text fields; 'cap' is derived
+PASSTHROUGH_FIELDS = ('fundamentals_timestamp', 'fetch_timestamp', 'fetch_id')
+SCORE_CACHE_SIZE = 16  # Configs whose scores LiveUniverse keeps up to date
+CHANGE_LOG_SIZE = 256  # Patches remembered for incremental rescoring; older cached scores are recomputed in full
+
+def _frozen(array):
+    array.setflags(write=False)
+    return array
+
+class UniverseStore:
+    """
+    Read-only struct-of-arrays copy of the loaded universe, built once per data version and shared by every session
+    (see get_live_universe in QuanticScreen.py), so memory stays flat as sessions are added:
+    - frame: one float64 column per NUMERIC_FIELDS metric (NaN when missing), a zero-copy DataFrame over read-only
+      arrays that process_universe/process_configs score directly.
+    - rows: ticker -> row index; text: TEXT_FIELDS as tuples (e.g. for search).
+    - codes/categories: int16 categorical codes and their labels for 'sector', 'industry' and 'cap' (cap category).
+    Metrics records are rebuilt on demand (record) only for the rows a page renders.
+    Scoring columns and the query indexes (sorted_index, postings; see query.py) are built lazily, once per store.
+    Stores are never modified; patched returns a new store with some rows replaced (see LiveUniverse).
+    """
+    def __init__(self, columns, text, extra, version):
+        self.version = version
+        self.columns = {field: _frozen(values) for field, values in columns.items()}
+        self.frame = pd.DataFrame(self.columns, copy=False)
+        self.text = {field: tuple(values) for field, values in text.items()}
+        self.extra = {field: tuple(values) for field, values in extra.items()}
+        self.rows = {}
+        for i, ticker in enumerate(self.text['Ticker']):
+            self.rows.setdefault(ticker, i)
+        labels = {group: self.text[field] for group, field in GROUPS.items()}
+        labels['cap'] = [get_cap_category(value) for value in self.columns['Market Cap']]
+        self.codes = {}
+        self.categories = {}
+        for group, values in labels.items():
+            codes, categories = pd.factorize(pd.Series(values, dtype=object))
+            self.codes[group] = _frozen(codes.astype(np.int16 if len(categories) < 2 ** 15 else np.int32))
+            self.categories[group] = tuple(categories)
+        self._indexes = {}  # Lazily built, read-only: ('score', field), ('sorted', field), ('postings', group), 'matrix'
+
+    @classmethod
+    def from_records(cls, metrics_list, version):
+        """
+        Builds a store from a list of metrics records (e.g. db.get_all_latest_metrics plus indicators).
+        """
+        return cls(
+            {field: np.array([m.get(field) for m in metrics_list], dtype=float) for field in NUMERIC_FIELDS},
+            {field: [str(m.get(field, MISSING_TEXT)) for m in metrics_list] for field in TEXT_FIELDS},
+            {field: [m.get(field) for m in metrics_list] for field in PASSTHROUGH_FIELDS},
+            version
+        )
+
+    def patched(self, records, version):
+        """
+        Returns (store, rows): a new store with records (dict of ticker -> metrics record) applied, and the sorted
+        array of changed row indices. Known tickers are overwritten in place of their row, new tickers are appended.
+        Indicator fields missing from a record keep the row's values (they come from stored histories, not ingest).
+        """
+        columns = {field: values.copy() for field, values in self.columns.items()}
+        text = {field: list(values) for field, values in self.text.items()}
+        extra = {field: list(values) for field, values in self.extra.items()}
+        rows = []
+        appended = []
+        for ticker, record in records.items():
+            row = self.rows.get(ticker)
+            if row is None:
+                appended.append(record)
+                continue
+            rows.append(row)
+            for field in NUMERIC_FIELDS:
+                value = to_float(record.get(field))
+                if value == value or field not in INDICATOR_KEYS:
+                    columns[field][row] = value
+            for field in TEXT_FIELDS:
+                text[field][row] = str(record.get(field, MISSING_TEXT))
+            for field in PASSTHROUGH_FIELDS:
+                extra[field][row] = record.get(field)
+        if appended:
+            rows.extend(range(len(self), len(self) + len(appended)))
+            for field in NUMERIC_FIELDS:
+                columns[field] = np.concatenate([columns[field], [to_float(r.get(field)) for r in appended]])
+            for field in TEXT_FIELDS:
+                text[field].extend(str(r.get(field, MISSING_TEXT)) for r in appended)
+            for field in PASSTHROUGH_FIELDS:
+                extra[field].extend(r.get(field) for r in appended)
+        return UniverseStore(columns, text, extra, version), np.array(sorted(rows), dtype=np.intp)
+
+    def __len__(self):
+        return len(self.text['Ticker'])
+
+    def scoring_column(self, field):
+        """
+        Scoring values of a metric (missing values per MISSING_POLICY, as get_float), e.g. for dataset filters.
+        Read-only, built once per store.
+        """
+        key = ('score', field)
+        if key not in self._indexes:
+            self._indexes[key] = _frozen(np.array(scoring_column(self.frame, field), dtype=float))
+        return self._indexes[key]
+
+    def sorted_index(self, field):
+        """
+        Range index of a metric: (order, values, valid) with order the row indices sorting its scoring values ascending
+        (stable; NaN last), values the sorted values and valid the count of non-NaN values, so a range predicate is
+        two np.searchsorted calls over values[:valid].
+        """
+        key = ('sorted', field)
+        if key not in self._indexes:
+            column = self.scoring_column(field)
+            order = np.argsort(column, kind='stable')
+            self._indexes[key] = (_frozen(order), _frozen(column[order]), int(len(column) - np.isnan(column).sum()))
+        return self._indexes[key]
+
+    def postings(self, group):
+        """
+        Category index of a group ('sector', 'industry' or 'cap'): for each code (see categories), the sorted row
+        indices with that label.
+        """
+        key = ('postings', group)
+        if key not in self._indexes:
+            codes = self.codes[group]
+            order = np.argsort(codes, kind='stable')
+            bounds = np.cumsum(np.bincount(codes, minlength=len(self.categories[group])))[:-1]
+            self._indexes[key] = tuple(_frozen(rows) for rows in np.split(order, bounds))
+        return self._indexes[key]
+
+    def score_matrix(self):
+        """
+        ScoreMatrix of the store's frame (normalized metric and flag matrices), e.g. to rescore edited configs
+        with matrix products. Built once per store.
+        """
+        if 'matrix' not in self._indexes:
+            self._indexes['matrix'] = ScoreMatrix(self.frame)
+        return self._indexes['matrix']
+
+    def labels(self, group):
+        """
+        Label of every row for a group ('sector', 'industry' or 'cap'), e.g. for RankIndex groupings.
+        """
+        categories = self.categories[group]
+        return [categories[code] for code in self.codes[group]]
+
+    def label_mask(self, group, label):
+        """
+        Boolean row mask of the rows whose group label equals label (all False for an unknown label).
+        """
+        categories = self.categories[group]
+        if label not in categories:
+            return np.zeros(len(self), dtype=bool)
+        return self.codes[group] == categories.index(label)
+
+    def ticker_mask(self, tickers):
+        """
+        Boolean row mask of the given tickers (unknown tickers are ignored).
+        """
+        mask = np.zeros(len(self), dtype=bool)
+        mask[[self.rows[t] for t in tickers if t in self.rows]] = True
+        return mask
+
+    def record(self, row):
+        """
+        Metrics record (see metrics_schema.metrics_record) of one row.
+        """
+        record = {field: values[row] for field, values in self.text.items()}
+        record.update({field: float(values[row]) for field, values in self.columns.items()})
+        record.update({field: values[row] for field, values in self.extra.items()})
+        return record
+
+    def nbytes(self):
+        """
+        Approximate memory held by the numeric columns and categorical codes.
+        """
+        return sum(v.nbytes for v in self.columns.values()) + sum(v.nbytes for v in self.codes.values())
+
+def rescore_rows(scored, store, rows, plan):
+    """
+    Brings process_universe output over an earlier version of store (scored with plan) up to date by rescoring only
+    the changed rows (see UniverseStore.patched); rows past the end of scored are appended.
+    """
+    fresh = process_universe(store.frame.iloc[rows], plan=plan)
+    existing = rows < len(scored)
+    columns = {}
+    for column in scored.columns:
+        values = np.concatenate([scored[column].to_numpy(), fresh[column].to_numpy()[~existing]])
+        values[rows[existing]] = fresh[column].to_numpy()[existing]
+        columns[column] = values
+    return pd.DataFrame(columns, index=store.frame.index)
+
+class LiveUniverse:
+    """
+    Process-wide UniverseStore kept current from ingest change events instead of full reloads.
+    on_change (subscribed to db.save_metrics via db.subscribe_metrics) only queues the saved record per ticker;
+    the next current() applies everything queued as one patch and bumps the version ('<name>:<generation>').
+    scores(plan) keeps the last SCORE_CACHE_SIZE configs' process_universe output and rescores only the rows
+    patched since each was computed.
+    The loader (a full load of metrics records) runs on first use and when current() is given a DB state showing
+    writes that did not arrive as events (e.g. from another process, or deleted tickers).
+    """
+    def __init__(self, loader, name='db'):
+        self.loader = loader
+        self.name = name
+        self.lock = threading.RLock()
+        self.pending = {}
+        self.store = None
+        self.generation = 0
+        self.reloaded_at = 0  # Generation of the last full load
+        self.changes = OrderedDict()  # Generation -> rows patched by it (last CHANGE_LOG_SIZE)
+        self.newest_fetch_id = 0
+        self.score_cache = OrderedDict()  # Plan key -> (generation, scored)
+        self.stats = {'reloads': 0, 'patches': 0, 'patched_rows': 0, 'rescored_rows': 0}
+
+    def on_change(self, ticker, record):
+        with self.lock:
+            self.pending[ticker] = record
+            self.newest_fetch_id = max(self.newest_fetch_id, record.get('fetch_id') or 0)
+
+    def _reload(self):
+        metrics_list = self.loader()
+        self.generation += 1
+        self.reloaded_at = self.generation
+        self.store = UniverseStore.from_records(metrics_list, f"{self.name}:{self.generation}")
+        self.newest_fetch_id = max([self.newest_fetch_id] + [m.get('fetch_id') or 0 for m in metrics_list])
+        self.changes.clear()
+        self.stats['reloads'] += 1
+
+    def current(self, db_state=None):
+        """
+        Returns the current UniverseStore after applying queued changes.
+        db_state: optional (ticker count, newest fetch id) from db.get_metrics_version (may be slightly stale); a newer
+        fetch id than any seen, or a different ticker count at the same fetch id, triggers a full reload.
+        """
+        with self.lock:
+            if self.store is None:
+                self._reload()
+            if self.pending:
+                records, self.pending = self.pending, {}
+                self.generation += 1
+                self.store, rows = self.store.patched(records, f"{self.name}:{self.generation}")
+                self.changes[self.generation] = rows
+                while len(self.changes) > CHANGE_LOG_SIZE:
+                    self.changes.popitem(last=False)
+                self.stats['patches'] += 1
+                self.stats['patched_rows'] += len(rows)
+            if db_state is not None:
+                count, newest = db_state
+                if newest > self.newest_fetch_id or (newest == self.newest_fetch_id and count != len(self.store)):
+                    self._reload()
+            return self.store
+
+    def scores(self, plan, db_state=None):
+        """
+        Returns (store, scored): the current store and process_universe output of plan over it, shared by every
+        session using the same config. Callers must not modify scored.
+        """
+        with self.lock:
+            store = self.current(db_state)
+            generation, scored = self.score_cache.get(plan.key, (None, None))
+            if generation != self.generation:
+                since = range(generation + 1, self.generation + 1) if generation is not None else ()
+                if generation is None or generation < self.reloaded_at or any(g not in self.changes for g in since):
+                    scored = process_universe(store.frame, plan=plan)
+                else:
+                    rows = np.unique(np.concatenate([self.changes[g] for g in since]))
+                    scored = rescore_rows(scored, store, rows, plan)
+                    self.stats['rescored_rows'] += len(rows)
+                self.score_cache[plan.key] = (self.generation, scored)
+            self.score_cache.move_to_end(plan.key)
+            while len(self.score_cache) > SCORE_CACHE_SIZE:
+                self.score_cache.popitem(last=False)
+            return store, scored
+
+# Test: store records round-trip, masks match per-dict filters, sessions share the store's memory
+if __name__ == "__main__":
+    import time
+    import tracemalloc
+    from processor import compile_config, get_float, process_universe, score_universe, universe_results
+    from synthetic import SyntheticProvider, synthetic_tickers
+    universe = [m for m in SyntheticProvider(missing_rate=0.1).fetch_metrics_many(synthetic_tickers(2000)).values() if m]
+    start = time.perf_counter()
+    store = UniverseStore.from_records(universe, 'test')
+    build_time = time.perf_counter() - start
+    for i in (0, 7, len(universe) - 1):
+        record = store.record(i)
+        assert all(record[k] == universe[i][k] or (record[k] != record[k] and universe[i][k] != universe[i][k])
+                   for k in NUMERIC_FIELDS + TEXT_FIELDS)
+    assert (store.scoring_column('Market Cap') > 10e9).tolist() == [get_float(m, 'Market Cap') > 10e9 for m in universe]
+    sector = universe[0]['Sector']
+    assert store.label_mask('sector', sector).tolist() == [m['Sector'] == sector for m in universe]
+    assert store.labels('cap') == [get_cap_category(m['Market Cap']) for m in universe]
+
+    plan = compile_config()
+    scored = process_universe(store.frame, plan=plan)
+    expected = score_universe(universe, plan=plan)
+    rows = np.argsort(-scored['final_score'].to_numpy(), kind='stable')[:100]
+    def key(result):
+        return result['base_score'], result['final_score'], result['flag_mask'], result['factor_boosts'], result['cap_category']
+    top = universe_results([store.record(i) for i in rows], scored.iloc[rows], plan)
+    assert [key(r) for r in top] == [key(expected[i]) for i in rows]
+
+    tracemalloc.start()
+    sessions = [score_universe(universe, plan=plan) for _ in range(5)]  # Per-session result dicts
+    per_session_lists = tracemalloc.get_traced_memory()[0] / len(sessions)
+    tracemalloc.stop()
+    tracemalloc.start()
+    for _ in range(5):  # A session with its own config: score columns plus records for the 100 rendered rows
+        scored = process_universe(store.frame, plan=plan)
+        sessions.append(universe_results([store.record(i) for i in rows], scored.iloc[rows], plan))
+    per_session_store = tracemalloc.get_traced_memory()[0] / 5
+    tracemalloc.stop()
+    print(f"Store for {len(store)} tickers: built in {build_time * 1000:.0f}ms, {store.nbytes() / 1e6:.2f}MB columns; "
+          f"per session: full result dicts {per_session_lists / 1e6:.2f}MB vs scores over the shared store "
+          f"{per_session_store / 1e6:.2f}MB")
+
+    # Incremental ingest: patched rows rescored in place match a full rescore; patch vs full reload timing
+    live = LiveUniverse(lambda: universe, name='test')
+    live.scores(plan)
+    changed = {}
+    for i in range(0, len(universe), 97):
+        record = dict(universe[i], **{'P/E': universe[i]['P/E'] * 0.5, 'Current Price': universe[i]['Current Price'] * 1.1})
+        changed[record['Ticker']] = record
+    new = dict(universe[1], Ticker='NEW1')
+    changed['NEW1'] = new
+    start = time.perf_counter()
+    for ticker, record in changed.items():
+        live.on_change(ticker, record)
+    store, scored = live.scores(plan)
+    patch_time = time.perf_counter() - start
+    full = process_universe(store.frame, plan=plan)
+    assert len(store) == len(universe) + 1 and store.record(store.rows['NEW1'])['Company Name'] == new['Company Name']
+    assert scored.equals(full), "Incremental rescoring differs from a full rescore"
+    start = time.perf_counter()
+    UniverseStore.from_records([changed.get(m['Ticker'], m) for m in universe] + [new], 'reload')
+    process_universe(store.frame, plan=plan)
+    reload_time = time.perf_counter() - start
+    print(f"{len(changed)} changed tickers: patch + rescore {patch_time * 1000:.1f}ms vs rebuild + full rescore "
+          f"{reload_time * 1000:.1f}ms (excluding the DB reload); stats {live.stats}")